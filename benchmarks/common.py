@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import random
+import datetime
+import platform
+import statistics
+import subprocess
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"),
+)
+
+import sqlalchemy
+from flask import Flask
+from sqlalchemy import Column, DateTime, Float, Integer, String, insert, select, func
+
+from flask_crud_api.models import BaseModel
+
+
+class BenchBook(BaseModel):
+    """与 tests/models.Book 结构一致的压测模型"""
+
+    __tablename__ = "bench_books"
+
+    uid = Column(Integer(), comment="用户ID")
+    name = Column(String(255), comment="书名")
+    publish = Column(DateTime, comment="发布时间")
+    price = Column(Float(asdecimal=True), comment="价格")
+
+
+def create_app(db_url, **config):
+    from flask_crud_api.api import CrudApi
+
+    app = Flask(__name__)
+    app.config["FLASK_CRUD_API_DB_URL"] = db_url
+    app.config.update(config)
+    CrudApi(app)
+    return app
+
+
+def seed(engine, size, chunk=10000, seed_value=20250101):
+    """批量写入 size 行数据，已有相同行数时直接复用"""
+    table = BenchBook.__table__
+    table.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        count = conn.execute(select(func.count()).select_from(table)).scalar()
+    if count == size:
+        return False
+
+    rnd = random.Random(seed_value)
+    start = datetime.datetime(2020, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(table.delete())
+        for offset in range(0, size, chunk):
+            rows = []
+            for idx in range(offset, min(offset + chunk, size)):
+                publish = start + datetime.timedelta(minutes=idx)
+                rows.append(
+                    {
+                        "uid": rnd.randint(1, 1000),
+                        "name": f"book-{idx}",
+                        "publish": publish,
+                        "price": round(rnd.uniform(1, 200), 2),
+                        "create_time": publish,
+                        "update_time": publish,
+                        "state": 1,
+                    }
+                )
+            conn.execute(insert(table), rows)
+    return True
+
+
+def cleanup(engine, size):
+    """删除压测过程中新建的数据，保证下次运行可以复用种子数据"""
+    table = BenchBook.__table__
+    with engine.begin() as conn:
+        conn.execute(table.delete().where(table.c.pk > size))
+
+
+def measure(func, repeat=50, warmup=3, number=1):
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+
+    samples.sort()
+    mean = statistics.mean(samples)
+    return {
+        "mean_ms": round(mean * 1000, 4),
+        "min_ms": round(samples[0] * 1000, 4),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 4),
+        "p95_ms": round(
+            samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 4
+        ),
+        "ops_per_sec": round(1 / mean, 2) if mean else None,
+        "repeat": repeat,
+    }
+
+
+def meta():
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        revision = ""
+    return {
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "platform": platform.platform(),
+        "revision": revision,
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def save(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta(), "results": results}, f, indent=2)
+
+
+def compare(results, baseline_path, threshold):
+    """与基线对比，mean 超过基线 (1 + threshold) 倍视为回归"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    for group, cases in results.items():
+        for case, current in cases.items():
+            base = baseline.get(group, {}).get(case)
+            if not base:
+                continue
+            ratio = current["mean_ms"] / base["mean_ms"] if base["mean_ms"] else 1
+            current["baseline_mean_ms"] = base["mean_ms"]
+            current["ratio"] = round(ratio, 3)
+            if ratio > 1 + threshold:
+                regressions.append(
+                    (group, case, base["mean_ms"], current["mean_ms"], ratio)
+                )
+    return regressions
+
+
+def print_results(results):
+    for group, cases in results.items():
+        print(f"== {group}")
+        for case, stats in cases.items():
+            ratio = f"  x{stats['ratio']}" if "ratio" in stats else ""
+            print(
+                f"  {case:<32} mean {stats['mean_ms']:>10.3f} ms"
+                f"  p95 {stats['p95_ms']:>10.3f} ms{ratio}"
+            )
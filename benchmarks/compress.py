@@ -0,0 +1,77 @@
+"""响应压缩基准测试: 不同压缩级别下 gzip / deflate 的 CPU 耗时与节省的字节数
+
+python benchmarks/compress.py --rows 30 500 --levels 1 3 6 9 --output compress.json
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+
+from flask import Blueprint
+
+from common import BenchBook, create_app, measure, print_results, save, seed
+
+
+def make_payloads(db_dir, rows):
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import CommonView
+
+    path = os.path.join(db_dir, f"crud_api_compress_{rows}.db")
+    app = create_app(f"sqlite:///{path}")
+    seed(app.extensions["flask_crud_api"].engine, rows)
+
+    class BookView(CommonView):
+        model = BenchBook
+
+    bp = Blueprint("bench", __name__, url_prefix="/bench")
+    Router(bp).add_url_rule("/book", view_cls=BookView)
+    app.register_blueprint(bp)
+
+    client = app.test_client()
+    payloads = {}
+    for name in ("records", "columnar"):
+        response = client.get(f"/bench/book?__page_disable&__format={name}")
+        assert response.status_code == 200, response.data
+        payloads[name] = response.data
+    app.extensions["flask_crud_api"].engine.dispose()
+    return payloads
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[30, 500])
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 3, 6, 9])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--db-dir", default=tempfile.gettempdir())
+    parser.add_argument("--output", default="compress.json")
+    args = parser.parse_args(argv)
+
+    from flask_crud_api.compress import Compression
+
+    results = {}
+    for rows in args.rows:
+        for name, data in make_payloads(args.db_dir, rows).items():
+            group = results.setdefault(f"{name}_{rows}", {})
+            for encoding in Compression.encodings:
+                for level in args.levels:
+                    compression = Compression(level=level)
+                    stats = measure(
+                        lambda: compression.compress(data, encoding), args.repeat
+                    )
+                    size = len(compression.compress(data, encoding))
+                    stats["bytes"] = len(data)
+                    stats["compressed_bytes"] = size
+                    stats["compression_ratio"] = round(size / len(data), 3)
+                    stats["saved_bytes_per_ms"] = round(
+                        (len(data) - size) / stats["mean_ms"], 1
+                    )
+                    group[f"{encoding}_{level}"] = stats
+
+    print_results(results)
+    save(args.output, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
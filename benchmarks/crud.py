@@ -0,0 +1,196 @@
+"""CRUD 热路径基准测试
+
+python benchmarks/crud.py --sizes 10000 100000 --output bench.json
+python benchmarks/crud.py --sizes 10000 --baseline bench.json --threshold 0.2
+"""
+
+import os
+import sys
+import random
+import argparse
+import tempfile
+
+from flask import Blueprint
+
+from common import (
+    BenchBook,
+    cleanup,
+    compare,
+    create_app,
+    measure,
+    print_results,
+    save,
+    seed,
+)
+
+
+def make_app(db_path):
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import CommonView, CommonDetailView
+
+    app = create_app(f"sqlite:///{db_path}")
+
+    class BookView(CommonView):
+        model = BenchBook
+
+        view_order_fields = (
+            ("__order_pk", "desc"),
+            ("__order_publish", "desc"),
+            ("__order_price", "asc"),
+        )
+        view_filter_fields = (
+            ("name", "regexp"),
+            ("uid", "="),
+            ("publish", "between"),
+        )
+
+    class BookDetailView(CommonDetailView):
+        model = BenchBook
+
+    bp = Blueprint("bench", __name__, url_prefix="/bench")
+    router = Router(bp)
+    router.add_url_rule("/book", view_cls=BookView)
+    router.add_url_rule("/book/<int:pk>", view_cls=BookDetailView)
+    app.register_blueprint(bp)
+    return app
+
+
+def http_cases(app, size, repeat):
+    client = app.test_client()
+    rnd = random.Random(size)
+    last_page = max(1, size // 30)
+
+    def get(url):
+        def run():
+            response = client.get(url)
+            assert response.status_code == 200, response.data
+
+        return run
+
+    def retrieve():
+        response = client.get(f"/bench/book/{rnd.randint(1, size)}")
+        assert response.status_code == 200
+
+    created = []
+
+    def create():
+        response = client.post(
+            "/bench/book",
+            data={
+                "uid": 1,
+                "name": "bench",
+                "publish": "2025-01-01 00:00:00",
+                "price": 9.9,
+            },
+        )
+        created.append(response.get_json()["data"]["result"][0]["pk"])
+
+    def update():
+        response = client.put(
+            f"/bench/book/{rnd.randint(1, size)}", data={"price": 1.5}
+        )
+        assert response.status_code == 200
+
+    def delete():
+        response = client.delete(f"/bench/book/{created.pop()}")
+        assert response.status_code == 200
+
+    cases = {
+        "list_default": get("/bench/book"),
+        "list_filter_eq": get("/bench/book?uid=7"),
+        "list_filter_regexp": get("/bench/book?name=book-12"),
+        "list_filter_between": get(
+            "/bench/book?publish=2020-01-02 00:00:00,2020-01-03 00:00:00"
+        ),
+        "list_order_publish": get("/bench/book?__order_publish=desc"),
+        "list_order_price": get("/bench/book?__order_price=asc"),
+        "list_page_middle": get(f"/bench/book?__page={last_page // 2}"),
+        "list_page_last": get(f"/bench/book?__page={last_page}"),
+        "list_page_size_max": get("/bench/book?__page_size=30&__order_pk=desc"),
+        "retrieve": retrieve,
+        "create": create,
+        "update": update,
+        "delete": delete,
+    }
+    return {name: measure(func, repeat=repeat) for name, func in cases.items()}
+
+
+def layer_cases(app, size, repeat):
+    from flask_crud_api.orm import Orm, Serializer
+
+    orm = Orm()
+
+    class View:
+        serializer_hooks = ()
+
+    serializer = Serializer(View())
+    results = {}
+    with app.test_request_context():
+        app.preprocess_request()
+        page = orm.get_queryset(BenchBook).limit(30)
+        big_page = orm.get_queryset(BenchBook).limit(500)
+        count = orm.get_queryset_count(BenchBook)
+        rows = orm.execute_all(page)
+        big_rows = orm.execute_all(big_page)
+        data = {
+            "uid": "1",
+            "name": "bench",
+            "publish": "2025-01-01 00:00:00",
+            "price": "9.9",
+        }
+
+        results["orm_execute_all_30"] = measure(lambda: orm.execute_all(page), repeat)
+        results["orm_execute_all_500"] = measure(
+            lambda: orm.execute_all(big_page), repeat
+        )
+        results["orm_count"] = measure(lambda: orm.execute_all(count), repeat)
+        results["serializer_to_30"] = measure(
+            lambda: serializer.to_serializer(rows, size), repeat
+        )
+        results["serializer_to_500"] = measure(
+            lambda: serializer.to_serializer(big_rows, size), repeat
+        )
+        results["serializer_from"] = measure(
+            lambda: serializer.from_serializer(BenchBook, data), repeat, number=100
+        )
+        app.do_teardown_request()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000])
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--db-dir", default=tempfile.gettempdir())
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for size in args.sizes:
+        db_path = os.path.join(args.db_dir, f"crud_api_bench_{size}.db")
+        app = make_app(db_path)
+        from flask_crud_api.api import engine
+
+        seed(engine, size)
+        results[f"http_{size}"] = http_cases(app, size, args.repeat)
+        results[f"layer_{size}"] = layer_cases(app, size, args.repeat)
+        cleanup(engine, size)
+        engine.dispose()
+
+    regressions = []
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold)
+    print_results(results)
+    save(args.output, results)
+
+    for group, case, base, current, ratio in regressions:
+        print(
+            f"REGRESSION {group}.{case}: {base:.3f} ms -> {current:.3f} ms (x{ratio:.2f})"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
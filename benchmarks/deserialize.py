@@ -0,0 +1,77 @@
+"""反序列化基准测试: 原有 from_serializer 与按模型编译的 Deserializer 对比
+
+python benchmarks/deserialize.py --repeat 50 --output deserialize.json
+"""
+
+import sys
+import argparse
+import inspect
+
+from sqlalchemy import DateTime as SaDateTime
+
+from common import BenchBook, measure, print_results, save
+
+payloads = {
+    "form": {
+        "uid": "12",
+        "name": "book-12",
+        "publish": "2024-05-01 08:30:00",
+        "price": "19.90",
+    },
+    "json": {
+        "uid": 12,
+        "name": "book-12",
+        "publish": "2024-05-01T08:30:00",
+        "price": 19.9,
+    },
+}
+
+
+def legacy_from_serializer(model, serializer):
+    """改造前的 Serializer.from_serializer"""
+    from flask_crud_api import utils
+
+    if inspect.isclass(model):
+        model = model()
+
+    columns = model.metadata.tables.get(model.__tablename__).columns
+    column_types = {column.key: column.type for column in columns}
+    for key, value in serializer.items():
+        if key in column_types:
+            setattr(model, key, value)
+            if isinstance(column_types[key], SaDateTime):
+                setattr(model, key, utils.str2datetime(value))
+    return model
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--number", type=int, default=1000)
+    parser.add_argument("--output", default="deserialize.json")
+    args = parser.parse_args(argv)
+
+    from flask_crud_api.orm import Deserializer
+
+    results = {"legacy": {}, "compiled": {}}
+    # 原实现只支持 "%Y-%m-%d %H:%M:%S" 格式的时间
+    results["legacy"]["form"] = measure(
+        lambda: legacy_from_serializer(BenchBook, payloads["form"]),
+        args.repeat,
+        number=args.number,
+    )
+    deserializer = Deserializer.for_model(BenchBook)
+    for name, payload in payloads.items():
+        results["compiled"][name] = measure(
+            lambda: deserializer.load(BenchBook(), payload),
+            args.repeat,
+            number=args.number,
+        )
+
+    print_results(results)
+    save(args.output, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
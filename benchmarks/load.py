@@ -0,0 +1,222 @@
+"""并发压测：逐步提高并发数，统计吞吐量、延迟分位数与错误率
+
+python benchmarks/load.py --server threads --concurrency 1 10 50 100 200
+python benchmarks/load.py --server gevent --mix list=60,retrieve=30,create=5,update=5
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+import urllib.parse
+
+from common import meta
+
+actions = ("list", "retrieve", "create", "update")
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, weight = item.split("=")
+        if name not in actions:
+            raise SystemExit(f"unknown action {name}, choose from {actions}")
+        mix[name] = float(weight)
+    return mix
+
+
+class Worker(threading.Thread):
+
+    def __init__(self, host, port, mix, size, deadline, seed):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.size = size
+        self.deadline = deadline
+        self.rnd = random.Random(seed)
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.latencies = []
+        self.errors = 0
+        self.conn = None
+
+    def request(self, method, url, body=None):
+        headers = {}
+        if body is not None:
+            body = urllib.parse.urlencode(body)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            self.conn.request(method, url, body=body, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+            if response.will_close:
+                self.conn.close()
+                self.conn = None
+            return response.status
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            return None
+
+    def call(self, action):
+        if action == "list":
+            page = self.rnd.randint(1, 20)
+            return self.request("GET", f"/bench/book?__page={page}")
+        if action == "retrieve":
+            return self.request("GET", f"/bench/book/{self.rnd.randint(1, self.size)}")
+        if action == "create":
+            return self.request(
+                "POST",
+                "/bench/book",
+                {
+                    "uid": 1,
+                    "name": "load",
+                    "publish": "2025-01-01 00:00:00",
+                    "price": 1,
+                },
+            )
+        return self.request(
+            "PUT", f"/bench/book/{self.rnd.randint(1, self.size)}", {"price": 2}
+        )
+
+    def run(self):
+        while time.perf_counter() < self.deadline:
+            action = self.rnd.choices(self.names, self.weights)[0]
+            start = time.perf_counter()
+            status = self.call(action)
+            self.latencies.append(time.perf_counter() - start)
+            if status != 200:
+                self.errors += 1
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def run_level(host, port, mix, size, concurrency, duration):
+    deadline = time.perf_counter() + duration
+    workers = [
+        Worker(host, port, mix, size, deadline, seed=idx) for idx in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(lat for worker in workers for lat in worker.latencies)
+    errors = sum(worker.errors for worker in workers)
+    total = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if total else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3) if total else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if total else None,
+        "error_rate": round(errors / total, 4) if total else None,
+    }
+
+
+def saturation(levels, gain=0.05):
+    """吞吐量提升不足 gain 时的并发数视为饱和点"""
+    for prev, current in zip(levels, levels[1:]):
+        if current["throughput_rps"] < prev["throughput_rps"] * (1 + gain):
+            return prev["concurrency"]
+    return None
+
+
+def start_server(args):
+    command = [
+        sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py"),
+        "--server",
+        args.server,
+        "--host",
+        args.host,
+        "--port",
+        str(args.port),
+        "--size",
+        str(args.size),
+        "--db-dir",
+        args.db_dir,
+    ]
+    proc = subprocess.Popen(command)
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("server exited")
+        try:
+            conn = http.client.HTTPConnection(args.host, args.port, timeout=1)
+            conn.request("GET", "/_ready")
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("server did not start")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--server", choices=["threads", "gevent"], default="threads")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7260)
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--db-dir", default=tempfile.gettempdir())
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 10, 50, 100, 200]
+    )
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--mix", default="list=70,retrieve=20,create=5,update=5")
+    parser.add_argument("--output", default="load.json")
+    parser.add_argument(
+        "--no-server", action="store_true", help="Use an already running server."
+    )
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    proc = None if args.no_server else start_server(args)
+    try:
+        levels = []
+        for concurrency in args.concurrency:
+            level = run_level(
+                args.host, args.port, mix, args.size, concurrency, args.duration
+            )
+            levels.append(level)
+            print(
+                f"c={level['concurrency']:<5} rps={level['throughput_rps']:<10} "
+                f"p50={level['p50_ms']}ms p95={level['p95_ms']}ms "
+                f"p99={level['p99_ms']}ms errors={level['error_rate']}",
+                flush=True,
+            )
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    report = {
+        "meta": meta(),
+        "server": args.server,
+        "mix": mix,
+        "levels": levels,
+        "saturation_concurrency": saturation(levels),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"saturation at concurrency {report['saturation_concurrency']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""regexp 过滤基准测试: sqlalchemy 默认 REGEXP 与带缓存、预过滤的 REGEXP 对比
+
+python benchmarks/regexp.py --size 1000000 --output regexp.json
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+
+from sqlalchemy import Index, create_engine, select
+
+from common import BenchBook, measure, print_results, save, seed
+
+patterns = {
+    # 前缀: 使用 name 上的索引做范围查询
+    "prefix": "^book-12345[0-9]",
+    # 必须出现的子串: instr 预过滤
+    "substring": "ok-9999[0-9]$",
+    # 无法提取字面量，只有编译缓存生效
+    "no_literal": "^[a-z]+-[0-9]{3}7$",
+}
+
+
+def run_query(engine, stmt):
+    with engine.connect() as conn:
+        return conn.execute(stmt).all()
+
+
+def cases(engine, accelerated, repeat):
+    from flask_crud_api.regexp import regexp_prefilter
+
+    column = BenchBook.name
+    results = {}
+    for name, pattern in patterns.items():
+        conditions = [BenchBook.state == 1]
+        if accelerated:
+            conditions.extend(regexp_prefilter(column, pattern))
+        conditions.append(column.op("regexp")(pattern))
+        stmt = select(BenchBook.pk).where(*conditions)
+        result = measure(lambda: run_query(engine, stmt), repeat=repeat, warmup=1)
+        result["rows"] = len(run_query(engine, stmt))
+        results[name] = result
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db-dir", default=tempfile.gettempdir())
+    parser.add_argument("--output", default="regexp.json")
+    args = parser.parse_args(argv)
+
+    from flask_crud_api.regexp import register_regexp
+
+    db_url = f"sqlite:///{os.path.join(args.db_dir, f'crud_api_bench_{args.size}.db')}"
+    # sqlalchemy 默认注册的 REGEXP 函数
+    default_engine = create_engine(db_url)
+    seed(default_engine, args.size)
+    index = Index("ix_bench_books_name", BenchBook.name)
+    index.create(default_engine, checkfirst=True)
+
+    engine = create_engine(db_url)
+    register_regexp(engine)
+
+    results = {
+        f"default_{args.size}": cases(default_engine, False, args.repeat),
+        f"accelerated_{args.size}": cases(engine, True, args.repeat),
+    }
+    # 与 crud.py 共用数据文件，测试结束后删除索引
+    index.drop(default_engine)
+    default_engine.dispose()
+    engine.dispose()
+
+    print_results(results)
+    save(args.output, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
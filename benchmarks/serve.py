@@ -0,0 +1,64 @@
+"""启动压测用的 WSGI 服务
+
+python benchmarks/serve.py --server threads --port 7260
+python benchmarks/serve.py --server gevent --port 7260
+"""
+
+import sys
+
+if "gevent" in sys.argv:
+    from gevent import monkey
+
+    monkey.patch_all()
+
+import os
+import argparse
+import tempfile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--server", choices=["threads", "gevent"], default="threads")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7260)
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--db-dir", default=tempfile.gettempdir())
+    args = parser.parse_args(argv)
+
+    from common import seed
+    from crud import make_app
+
+    app = make_app(os.path.join(args.db_dir, f"crud_api_bench_{args.size}.db"))
+    from flask_crud_api.api import engine
+
+    seed(engine, args.size)
+
+    @app.get("/_ready")
+    def _ready():
+        return "ok"
+
+    if args.server == "gevent":
+        from gevent.pywsgi import WSGIServer
+
+        server = WSGIServer((args.host, args.port), app, log=None)
+        print(f"gevent server on {args.host}:{args.port}", flush=True)
+        server.serve_forever()
+    else:
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            # 开启 keep-alive 并关闭访问日志，避免日志输出影响压测结果
+            protocol_version = "HTTP/1.1"
+
+            def log_request(self, *args, **kwargs):
+                pass
+
+        server = make_server(
+            args.host, args.port, app, threaded=True, request_handler=QuietHandler
+        )
+        print(f"threaded server on {args.host}:{args.port}", flush=True)
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
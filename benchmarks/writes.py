@@ -0,0 +1,120 @@
+"""并发写入基准测试: 每个请求单独提交与写入队列合并提交对比
+
+python benchmarks/writes.py --concurrency 1 8 32 64 --writes 50 --output writes.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+from common import BenchBook, create_app, meta
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+class Writer(threading.Thread):
+
+    def __init__(self, app, writes, seed):
+        super().__init__(daemon=True)
+        self.app = app
+        self.writes = writes
+        self.seed = seed
+        self.latencies = []
+        self.errors = {}
+
+    def run(self):
+        from flask_crud_api.orm import Orm
+
+        with self.app.app_context():
+            orm = Orm()
+            for idx in range(self.writes):
+                book = BenchBook(uid=self.seed, name=f"book-{self.seed}-{idx}", price=1)
+                start = time.perf_counter()
+                try:
+                    orm.execute_add(book)
+                except Exception as e:
+                    name = type(e).__name__
+                    self.errors[name] = self.errors.get(name, 0) + 1
+                    continue
+                self.latencies.append(time.perf_counter() - start)
+
+
+def run_level(db_dir, mode, concurrency, writes):
+    path = os.path.join(db_dir, f"crud_api_writes_{mode}.db")
+    if os.path.exists(path):
+        os.remove(path)
+
+    app = create_app(
+        f"sqlite:///{path}",
+        FLASK_CRUD_API_DB_WRITE_QUEUE=mode == "queue",
+        FLASK_CRUD_API_DB_POOL_SIZE=max(5, concurrency),
+    )
+    crud_api = app.extensions["flask_crud_api"]
+    BenchBook.__table__.create(crud_api.engine, checkfirst=True)
+
+    workers = [Writer(app, writes, seed=idx) for idx in range(concurrency)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    if crud_api.writer is not None:
+        crud_api.writer.close()
+    crud_api.engine.dispose()
+
+    latencies = sorted(lat for worker in workers for lat in worker.latencies)
+    errors = {}
+    for worker in workers:
+        for name, count in worker.errors.items():
+            errors[name] = errors.get(name, 0) + count
+    total = len(latencies)
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "writes": total,
+        "throughput_wps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if total else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3) if total else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if total else None,
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--writes", type=int, default=50, help="Writes per thread.")
+    parser.add_argument("--db-dir", default=tempfile.gettempdir())
+    parser.add_argument("--output", default="writes.json")
+    args = parser.parse_args(argv)
+
+    levels = []
+    for concurrency in args.concurrency:
+        for mode in ("direct", "queue"):
+            level = run_level(args.db_dir, mode, concurrency, args.writes)
+            levels.append(level)
+            print(
+                f"{mode:<7} c={level['concurrency']:<5} "
+                f"wps={level['throughput_wps']:<10} "
+                f"p50={level['p50_ms']}ms p95={level['p95_ms']}ms "
+                f"p99={level['p99_ms']}ms errors={level['errors']}",
+                flush=True,
+            )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta(), "levels": levels}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
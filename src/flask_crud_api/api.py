@@ -1,27 +1,105 @@
 import dataclasses
 import datetime
 import decimal
+import json
 import os
 import uuid
 from datetime import date
 
-from flask import Blueprint, Flask, g
+import click
+from flask import Blueprint, Flask, current_app, g
+from flask.cli import AppGroup
 from flask.json.provider import DefaultJSONProvider
-from sqlalchemy import Engine, create_engine
+from sqlalchemy import Engine, create_engine, make_url
 from sqlalchemy.orm import Session, sessionmaker
 
+from flask_crud_api.profile import StartupProfile, import_profile
+from flask_crud_api.regexp import register_regexp
+
 engine: Engine
 
 session_factory: Session
 
+# 分片数据库，未配置 FLASK_CRUD_API_DB_SHARDS 时为 None
+shards = None
+
 CONFIG_KEY_PREFIX = "FLASK_CRUD_API"
 DEFAULT_CONFIG = {
     f"{CONFIG_KEY_PREFIX}_DB_URL": "sqlite:///main.db",
     f"{CONFIG_KEY_PREFIX}_DB_DEBUG": False,
+    # 连接池参数，None 时使用 sqlalchemy 默认值
+    f"{CONFIG_KEY_PREFIX}_DB_POOL_SIZE": None,
+    f"{CONFIG_KEY_PREFIX}_DB_MAX_OVERFLOW": None,
+    f"{CONFIG_KEY_PREFIX}_DB_POOL_TIMEOUT": None,
+    # gevent 部署: 会话按协程隔离，连接池在协程间排队等待
+    f"{CONFIG_KEY_PREFIX}_DB_GEVENT": False,
+    # 按模型 __bind_key__ 使用的其他数据库: {"bind key": "db url"}
+    f"{CONFIG_KEY_PREFIX}_DB_BINDS": None,
+    # 写入队列: 并发的单行新增、更新由写线程合并为小批次提交，缓解 SQLite 写锁争用
+    f"{CONFIG_KEY_PREFIX}_DB_WRITE_QUEUE": False,
+    f"{CONFIG_KEY_PREFIX}_DB_WRITE_QUEUE_BATCH": 64,
+    f"{CONFIG_KEY_PREFIX}_DB_WRITE_QUEUE_WAIT": 0.002,
+    f"{CONFIG_KEY_PREFIX}_DB_WRITE_QUEUE_TIMEOUT": 30,
+    # 合并相同的并发只读查询，其他请求等待第一个请求的结果，超过 TIMEOUT 秒后自行查询
+    f"{CONFIG_KEY_PREFIX}_DB_COALESCE": False,
+    f"{CONFIG_KEY_PREFIX}_DB_COALESCE_TIMEOUT": 5,
+    # 分片数据库地址列表，声明了 __shard_key__ 的模型按分片键分布到这些数据库
+    f"{CONFIG_KEY_PREFIX}_DB_SHARDS": None,
     f"{CONFIG_KEY_PREFIX}_OPEN_DOC_API": False,
+    # 建表模式: always 每次启动 create_all; fingerprint 表结构指纹一致时跳过; never 不建表
+    f"{CONFIG_KEY_PREFIX}_DB_CREATE_TABLES": "always",
+    # 延迟到执行 flask db 命令时才导入 flask_migrate
+    f"{CONFIG_KEY_PREFIX}_DB_MIGRATE_LAZY": True,
+    f"{CONFIG_KEY_PREFIX}_STARTUP_PROFILE": False,
+    # 视图注册时的索引检查: False 关闭; report 仅报告; create 自动创建缺失索引
+    f"{CONFIG_KEY_PREFIX}_DB_AUTO_INDEX": False,
+    # 请求级 SQL 统计，开启后输出 Server-Timing 响应头并提供 /_debug/requests 接口
+    f"{CONFIG_KEY_PREFIX}_SQL_INSTRUMENT": False,
+    f"{CONFIG_KEY_PREFIX}_SQL_INSTRUMENT_BUFFER": 100,
+    f"{CONFIG_KEY_PREFIX}_SQL_REPEAT_THRESHOLD": 3,
+    # Prometheus 指标接口，多进程部署时通过共享目录汇总各进程数据
+    f"{CONFIG_KEY_PREFIX}_METRICS": False,
+    f"{CONFIG_KEY_PREFIX}_METRICS_PATH": "/metrics",
+    f"{CONFIG_KEY_PREFIX}_METRICS_DIR": None,
+    # 响应压缩: 按 Accept-Encoding 使用 gzip / deflate，小于 MIN_SIZE 字节的响应不压缩，
+    # 流式响应累积 FLUSH_SIZE 字节后输出一次
+    f"{CONFIG_KEY_PREFIX}_COMPRESS": False,
+    f"{CONFIG_KEY_PREFIX}_COMPRESS_LEVEL": 6,
+    f"{CONFIG_KEY_PREFIX}_COMPRESS_MIN_SIZE": 1024,
+    f"{CONFIG_KEY_PREFIX}_COMPRESS_FLUSH_SIZE": 8192,
+    # SSE 变更推送: 每个订阅者的队列长度及心跳间隔(秒)
+    f"{CONFIG_KEY_PREFIX}_STREAM": False,
+    f"{CONFIG_KEY_PREFIX}_STREAM_QUEUE_SIZE": 100,
+    f"{CONFIG_KEY_PREFIX}_STREAM_HEARTBEAT": 15,
 }
 
 
+def app_crud_api(app):
+    """应用注册的 CrudApi，未初始化时抛出异常"""
+    crud_api = app.extensions.get("flask_crud_api")
+    if crud_api is None:
+        raise Exception(
+            "flask-crud-api is not initialized for this app, "
+            "call CrudApi(app) before registering views"
+        )
+    return crud_api
+
+
+def current_crud_api():
+    """当前应用上下文中的 CrudApi，不在应用上下文中时返回 None"""
+    try:
+        return current_app.extensions.get("flask_crud_api")
+    except RuntimeError:
+        return None
+
+
+def _is_memory_db(db_url):
+    url = make_url(db_url)
+    return url.get_backend_name() == "sqlite" and (
+        url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+    )
+
+
 def _default(o):
     if isinstance(o, date):
         return datetime.datetime.strftime(o, "%Y-%m-%d %H:%M:%S")
@@ -40,23 +118,40 @@ def _default(o):
 
 class InitializeRequest:
 
-    def __init__(self, app: Flask):
+    def __init__(self, app: Flask, instrument=None, session_factory=None):
         self.app = app
+        self.instrument = instrument
+        self._session_factory = session_factory
         self.app.before_request_funcs.setdefault(None, []).insert(
             0, self.before_request
         )
+        if self.instrument is not None:
+            self.app.after_request(self.instrument.after_request)
         self.app.teardown_request(self.teardown_request)
 
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            return session_factory
+        return self._session_factory
+
     def before_request(self):
-        setattr(g, "session", session_factory())
+        setattr(g, "session", self.session_factory())
+        if self.instrument is not None:
+            setattr(g, "_crud_api_stats", self.instrument.start_request())
 
     def teardown_request(self, exception):
+        if self.instrument is not None:
+            self.instrument.finish_request(g.pop("_crud_api_stats", None))
+
         try:
             if hasattr(g, "session"):
                 session = getattr(g, "session")
                 if hasattr(session, "close"):
                     session.close()
                     del session
+            if hasattr(self.session_factory, "remove"):
+                self.session_factory.remove()
         except Exception as e:
             print(e)
 
@@ -65,9 +160,40 @@ class APIFlaskJSONProvider(DefaultJSONProvider):
     default = staticmethod(_default)
 
 
+class _LazyMigrateGroup(click.Group):
+    """占位的 flask db 命令组，被调用时才初始化 Flask-Migrate"""
+
+    def __init__(self, crud_api, name="db"):
+        super().__init__(name, help="Perform database migrations.")
+        self.crud_api = crud_api
+        self._group = None
+
+    def _load(self):
+        if self._group is None:
+            self._group = self.crud_api.init_migrate()
+        return self._group
+
+    def list_commands(self, ctx):
+        return self._load().list_commands(ctx)
+
+    def get_command(self, ctx, cmd_name):
+        return self._load().get_command(ctx, cmd_name)
+
+
 class CrudApi:
 
     def __init__(self, app=None):
+        self.startup_profile = StartupProfile()
+        self.engine = None
+        self.engines = {}
+        self.session_factory = None
+        self.shards = None
+        self.writer = None
+        self.coalescer = None
+        self.instrument = None
+        self.metrics = None
+        self.broker = None
+        self.compression = None
         if app is None:
             return
 
@@ -77,11 +203,24 @@ class CrudApi:
     def init_app(self, app: Flask):
         self.app = app
         app.json = APIFlaskJSONProvider(app)
-
-        self.init_config()
-        self.init_db_tools()
-        self.init_hooks()
-        self.init_api_docs()
+        app.extensions["flask_crud_api"] = self
+
+        profile = self.startup_profile
+        with profile.phase("init_config"):
+            self.init_config()
+        with profile.phase("init_db_tools"):
+            self.init_db_tools()
+        with profile.phase("init_hooks"):
+            self.init_hooks()
+        with profile.phase("init_api_docs"):
+            self.init_api_docs()
+        self.init_cli()
+
+        if self.app.config[f"{CONFIG_KEY_PREFIX}_STARTUP_PROFILE"]:
+            self.app.logger.info(
+                "flask-crud-api startup profile: %s",
+                json.dumps(profile.report(), ensure_ascii=False),
+            )
 
     def init_config(self):
         for k, v in DEFAULT_CONFIG.items():
@@ -89,23 +228,214 @@ class CrudApi:
 
     def init_db_tools(self):
         # sqlalchemy 兼容 flask_migrate
-        global engine, session_factory
-        from flask_migrate import Migrate
+        global engine, session_factory, shards
+
+        from .binds import RoutingSession
+        from .models import Base
+
+        profile = self.startup_profile
+        config = self.app.config
+        with profile.phase("init_db_tools.create_engine"):
+            self.engine = self.create_engine(config[f"{CONFIG_KEY_PREFIX}_DB_URL"])
+            self.engines = {None: self.engine}
+            binds = config[f"{CONFIG_KEY_PREFIX}_DB_BINDS"] or {}
+            for name, bind_url in binds.items():
+                self.engines[name] = self.create_engine(bind_url)
+            self.session_factory = sessionmaker(
+                bind=self.engine,
+                class_=RoutingSession,
+                engines={name: self.engines[name] for name in self.bind_names()},
+            )
+            if config[f"{CONFIG_KEY_PREFIX}_DB_GEVENT"]:
+                from flask_crud_api.pool import greenlet_scoped_session
+
+                self.session_factory = greenlet_scoped_session(self.session_factory)
+
+            self.shards = None
+            shard_urls = config[f"{CONFIG_KEY_PREFIX}_DB_SHARDS"]
+            if shard_urls:
+                from flask_crud_api.shard import ShardSet
+
+                self.shards = ShardSet([self.create_engine(url) for url in shard_urls])
+
+            self.writer = None
+            if config[f"{CONFIG_KEY_PREFIX}_DB_WRITE_QUEUE"]:
+                self.init_writer()
+            self.coalescer = None
+            if config[f"{CONFIG_KEY_PREFIX}_DB_COALESCE"]:
+                from flask_crud_api.coalesce import Coalescer
+
+                self.coalescer = Coalescer(
+                    self.session_factory,
+                    timeout=config[f"{CONFIG_KEY_PREFIX}_DB_COALESCE_TIMEOUT"],
+                )
+
+        # 模块全局变量指向最近初始化的实例，兼容旧版本写法
+        engine, session_factory, shards = self.engine, self.session_factory, self.shards
+
+        create_mode = config[f"{CONFIG_KEY_PREFIX}_DB_CREATE_TABLES"]
+        with profile.phase("init_db_tools.create_tables"):
+            if create_mode in ("always", "fingerprint"):
+                self.create_tables(if_changed=create_mode == "fingerprint")
+            elif create_mode != "never":
+                raise Exception(f"unknown create tables mode: {create_mode}")
+
+        setattr(self.session_factory, "engine", self.engine)
+        setattr(self.session_factory, "metadata", Base.metadata)
+        with profile.phase("init_db_tools.migrate"):
+            if config[f"{CONFIG_KEY_PREFIX}_DB_MIGRATE_LAZY"]:
+                self.app.cli.add_command(_LazyMigrateGroup(self))
+            else:
+                self.init_migrate()
+
+    def init_writer(self):
+        config = self.app.config
+        if _is_memory_db(config[f"{CONFIG_KEY_PREFIX}_DB_URL"]):
+            # 内存 sqlite 的连接按线程隔离，写线程无法看到同一个数据库
+            self.app.logger.warning(
+                "flask-crud-api: write queue is not available for in-memory sqlite"
+            )
+            return
+
+        from flask_crud_api.writer import WriteCoordinator
 
-        from .models import Base, create_tables
+        self.writer = WriteCoordinator(
+            self.session_factory,
+            max_batch=config[f"{CONFIG_KEY_PREFIX}_DB_WRITE_QUEUE_BATCH"],
+            max_wait=config[f"{CONFIG_KEY_PREFIX}_DB_WRITE_QUEUE_WAIT"],
+            timeout=config[f"{CONFIG_KEY_PREFIX}_DB_WRITE_QUEUE_TIMEOUT"],
+        )
 
-        db_url = self.app.config[f"{CONFIG_KEY_PREFIX}_DB_URL"]
-        db_debug = self.app.config[f"{CONFIG_KEY_PREFIX}_DB_DEBUG"]
-        engine = create_engine(db_url, echo=db_debug)
-        session_factory = sessionmaker(bind=engine)
-        create_tables(engine)
+    def create_engine(self, db_url):
+        db_engine = create_engine(db_url, **self.engine_options(db_url))
+        register_regexp(db_engine)
+        return db_engine
+
+    @property
+    def metadata(self):
+        from .models import Base
+
+        return Base.metadata
+
+    @property
+    def metadatas(self):
+        """bind key -> MetaData，默认库的 key 为 None，与 Flask-Migrate 多数据库模板一致"""
+        from .binds import bind_metadatas
+
+        return bind_metadatas(self.metadata, self.bind_names())
+
+    def bind_names(self):
+        return [name for name in self.engines if name is not None]
+
+    def get_engine(self, bind=None):
+        return self.engines[bind]
+
+    def engine_for(self, model):
+        """模型所在的引擎，未声明或未配置 __bind_key__ 时为默认引擎"""
+        from .binds import get_bind_key
+
+        return self.engines.get(get_bind_key(model), self.engine)
+
+    def named_engines(self):
+        """(名称, 引擎)，包括各 bind 与分片，用于指标标签"""
+        for name, db_engine in self.engines.items():
+            yield name or "default", db_engine
+        if self.shards is not None:
+            for idx, shard_engine in enumerate(self.shards.engines):
+                yield f"shard{idx}", shard_engine
+
+    def all_engines(self):
+        return [db_engine for _, db_engine in self.named_engines()]
+
+    def create_tables(self, if_changed=False):
+        """在各 bind 上创建其模型的表，分片模型同时在每个分片上创建"""
+        from .models import create_tables_if_changed
+
+        for name, metadata in self.metadatas.items():
+            if if_changed:
+                create_tables_if_changed(
+                    self.engines[name], metadata, key=name or "default"
+                )
+            else:
+                metadata.create_all(self.engines[name])
+        if self.shards is not None:
+            self.shards.create_tables()
+
+    def engine_options(self, db_url):
+        config = self.app.config
+        options = {"echo": config[f"{CONFIG_KEY_PREFIX}_DB_DEBUG"]}
+        for key in ("pool_size", "max_overflow", "pool_timeout"):
+            value = config[f"{CONFIG_KEY_PREFIX}_DB_{key.upper()}"]
+            if value is not None:
+                options[key] = value
+
+        # 内存 sqlite 依赖 SingletonThreadPool 共享同一连接，不替换连接池
+        if config[f"{CONFIG_KEY_PREFIX}_DB_GEVENT"] and not _is_memory_db(db_url):
+            from flask_crud_api.pool import GreenletQueuePool
+
+            options["poolclass"] = GreenletQueuePool
+        return options
+
+    def init_migrate(self):
+        from flask_migrate import Migrate
 
-        setattr(session_factory, "engine", engine)
-        setattr(session_factory, "metadata", Base.metadata)
-        Migrate().init_app(self.app, session_factory)
+        Migrate().init_app(self.app, self)
+        return self.app.cli.commands["db"]
 
     def init_hooks(self):
-        InitializeRequest(self.app)
+        config = self.app.config
+        sql_instrument = config[f"{CONFIG_KEY_PREFIX}_SQL_INSTRUMENT"]
+        metrics = config[f"{CONFIG_KEY_PREFIX}_METRICS"]
+
+        if sql_instrument or metrics:
+            from flask_crud_api.instrument import SQLInstrument
+
+            self.instrument = SQLInstrument(
+                (
+                    config[f"{CONFIG_KEY_PREFIX}_SQL_INSTRUMENT_BUFFER"]
+                    if sql_instrument
+                    else 0
+                ),
+                config[f"{CONFIG_KEY_PREFIX}_SQL_REPEAT_THRESHOLD"],
+                server_timing=sql_instrument,
+            )
+            for db_engine in self.all_engines():
+                self.instrument.init_engine(db_engine)
+            if sql_instrument:
+                self.instrument.init_debug_api(self.app)
+
+        if metrics:
+            from flask_crud_api.metrics import Metrics
+
+            metrics_dir = config[f"{CONFIG_KEY_PREFIX}_METRICS_DIR"]
+            if metrics_dir:
+                os.makedirs(metrics_dir, exist_ok=True)
+            self.metrics = Metrics(multiprocess_dir=metrics_dir)
+            for name, db_engine in self.named_engines():
+                self.metrics.add_engine(name, db_engine)
+            self.metrics.init_app(self.app, config[f"{CONFIG_KEY_PREFIX}_METRICS_PATH"])
+            self.instrument.observers.append(self.metrics.observe_request)
+
+        if config[f"{CONFIG_KEY_PREFIX}_STREAM"]:
+            from flask_crud_api.events import Broker
+
+            self.broker = Broker(config[f"{CONFIG_KEY_PREFIX}_STREAM_QUEUE_SIZE"])
+            self.broker.init_session_factory(self.session_factory)
+            if self.shards is not None:
+                for shard_factory in self.shards.session_factories:
+                    self.broker.init_session_factory(shard_factory)
+
+        if config[f"{CONFIG_KEY_PREFIX}_COMPRESS"]:
+            from flask_crud_api.compress import Compression
+
+            self.compression = Compression(
+                config[f"{CONFIG_KEY_PREFIX}_COMPRESS_LEVEL"],
+                config[f"{CONFIG_KEY_PREFIX}_COMPRESS_MIN_SIZE"],
+                config[f"{CONFIG_KEY_PREFIX}_COMPRESS_FLUSH_SIZE"],
+            )
+            self.compression.init_app(self.app)
+
+        InitializeRequest(self.app, self.instrument, self.session_factory)
 
     def init_api_docs(self):
         open_api = self.app.config[f"{CONFIG_KEY_PREFIX}_OPEN_DOC_API"]
@@ -136,6 +466,84 @@ class CrudApi:
 
         self.app.register_blueprint(_api_docs)
 
+    def init_cli(self):
+        cli = AppGroup("crud-api", help="flask-crud-api tools.")
+
+        @cli.command("profile")
+        @click.option("--imports", is_flag=True, help="Profile cold import time.")
+        def profile(imports):
+            report = self.startup_profile.report()
+            if imports:
+                report["imports"] = import_profile()
+            click.echo(json.dumps(report, indent=2, ensure_ascii=False))
+
+        @cli.command("indexes")
+        @click.option("--create", is_flag=True, help="Create missing indexes.")
+        @click.option("--migration", is_flag=True, help="Write an Alembic migration.")
+        def indexes(create, migration):
+            from flask_crud_api.indexes import plan_app_indexes
+
+            bind_names = {
+                id(db_engine): name for name, db_engine in self.engines.items()
+            }
+            result = {"missing": [], "fields": []}
+            # 按视图模型所在的 bind 分别检查、创建索引
+            for db_engine, planner in plan_app_indexes(self.app, self.engine_for):
+                bind = bind_names.get(id(db_engine))
+                missing = planner.missing(db_engine)
+                if create:
+                    planner.create(db_engine, missing)
+                if migration and missing:
+                    if bind is None:
+                        path = self.write_index_migration(planner, missing)
+                        click.echo(f"migration: {path}")
+                    else:
+                        click.echo(f"migration: skipped for bind {bind}")
+                result["missing"].extend(plan.name for plan in missing)
+                for item in planner.report(db_engine):
+                    item["bind"] = bind or "default"
+                    result["fields"].append(item)
+            click.echo(json.dumps(result, indent=2, ensure_ascii=False))
+
+        @cli.command("summaries")
+        @click.argument("names", nargs=-1)
+        @click.option("--rebuild", is_flag=True, help="Rebuild summary tables.")
+        def summaries(names, rebuild):
+            from flask_crud_api.orm import session_scope
+            from flask_crud_api.summary import rebuild_summaries, summaries
+
+            if rebuild:
+                with session_scope() as session:
+                    rebuild_summaries(session, names)
+            click.echo(
+                json.dumps(
+                    {
+                        name: summary.table.name
+                        for name, summary in summaries.items()
+                        if not names or name in names
+                    },
+                    indent=2,
+                )
+            )
+
+        self.app.cli.add_command(cli)
+
+    def write_index_migration(self, planner, plans):
+        from alembic.script import ScriptDirectory
+
+        if "migrate" not in self.app.extensions:
+            self.init_migrate()
+        migrate = self.app.extensions["migrate"].migrate
+        script = ScriptDirectory.from_config(migrate.get_config())
+
+        revision = uuid.uuid4().hex[-12:]
+        path = os.path.join(script.versions, f"{revision}_crud_api_indexes.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(
+                planner.render_migration(revision, script.get_current_head(), plans)
+            )
+        return path
+
 
 # 兼容0.0.1版本写法，后续版本中将移除
 SimpleApi = CrudApi
@@ -0,0 +1,74 @@
+from sqlalchemy import MetaData
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.util import find_tables
+
+from flask_crud_api.models import Base
+
+_bind_keys = {}
+_collected = None
+
+
+def get_bind_key(model):
+    return getattr(model, "__bind_key__", None)
+
+
+def bind_keys():
+    """table -> bind key，只包含声明了 __bind_key__ 的模型及其汇总表"""
+    global _bind_keys, _collected
+    from flask_crud_api.summary import summaries
+
+    # 模型、汇总表可能在初始化之后才声明，数量变化时重新收集
+    count = (len(Base.registry.mappers), len(summaries))
+    if count != _collected:
+        _bind_keys = {
+            mapper.local_table: get_bind_key(mapper.class_)
+            for mapper in Base.registry.mappers
+            if get_bind_key(mapper.class_)
+        }
+        # 汇总表与原表在同一个库中，差量随原表的写入一起提交
+        for summary in summaries.values():
+            if get_bind_key(summary.model):
+                _bind_keys[summary.table] = get_bind_key(summary.model)
+        _collected = count
+    return _bind_keys
+
+
+def bind_metadatas(metadata, names):
+    """按 bind 拆分 metadata，未配置的 bind key 归入默认库(None)"""
+    keys = bind_keys()
+    if not any(keys.get(table) in names for table in metadata.tables.values()):
+        return {None: metadata, **{name: MetaData() for name in names}}
+
+    metadatas = {None: MetaData(), **{name: MetaData() for name in names}}
+    for table in metadata.tables.values():
+        key = keys.get(table)
+        table.to_metadata(metadatas[key if key in names else None])
+    return metadatas
+
+
+class RoutingSession(Session):
+    """按语句涉及的模型的 __bind_key__ 选择引擎，未声明或未配置的使用默认引擎"""
+
+    def __init__(self, *args, engines=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.engines = engines or {}
+
+    def get_bind_key(self, mapper=None, clause=None):
+        names = set()
+        if mapper is not None:
+            names.add(get_bind_key(mapper.class_))
+        if clause is not None:
+            keys = bind_keys()
+            for table in find_tables(clause, include_joins=True):
+                names.add(keys.get(table))
+        names = {name if name in self.engines else None for name in names}
+        if len(names) > 1:
+            raise Exception(f"statement touches multiple binds: {names}")
+        return names.pop() if names else None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.engines:
+            engine = self.engines.get(self.get_bind_key(mapper, clause))
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
@@ -0,0 +1,149 @@
+import threading
+import collections
+
+from sqlalchemy import event
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.types import TypeEngine
+
+from flask_crud_api.instrument import record_coalesced
+
+_flushed_key = "crud_api_flushed"
+
+_fetchers = {
+    "scalars": lambda result: result.scalars().all(),
+    "rows": lambda result: result.all(),
+    "scalar": lambda result: result.scalar(),
+}
+
+
+def get_coalescer():
+    from flask_crud_api import api
+
+    crud_api = api.current_crud_api()
+    if crud_api is None:
+        return None
+    return crud_api.coalescer
+
+
+class _Call:
+
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Coalescer:
+    """合并相同的并发只读查询 (single-flight)
+
+    编译后的 SQL 与参数相同的查询同时执行时，只有第一个请求访问数据库，其余请求等待其结果；
+    等待超时或查询出错时各自重新执行。结果在独立会话中查询，每个请求合并(merge)到自己的会话中使用副本。
+    """
+
+    def __init__(self, session_factory, timeout=5):
+        # scoped_session 需要使用其内部的 sessionmaker
+        self.session_factory = getattr(
+            session_factory, "session_factory", session_factory
+        )
+        self.timeout = timeout
+        self.counters = collections.Counter()
+        self._calls = {}
+        self._lock = threading.Lock()
+        event.listen(self.session_factory, "after_flush", self.mark_flushed)
+        event.listen(self.session_factory, "after_commit", self.clear_flushed)
+        event.listen(self.session_factory, "after_rollback", self.clear_flushed)
+
+    @staticmethod
+    def mark_flushed(session, flush_context):
+        session.info[_flushed_key] = True
+
+    @staticmethod
+    def clear_flushed(session):
+        session.info.pop(_flushed_key, None)
+
+    @staticmethod
+    def eligible(session, query, mode):
+        # 会话中有未提交的写入时需要读到自己的修改，不合并
+        if session.info.get(_flushed_key) or session.new or session.dirty:
+            return False
+        if session.deleted:
+            return False
+        if mode != "rows":
+            return True
+        # 多列结果中包含模型实例时无法复制，只合并纯字段查询
+        return all(
+            isinstance(column.get("type"), TypeEngine)
+            for column in query.column_descriptions
+        )
+
+    @staticmethod
+    def make_key(session, query, mode):
+        bind = session.get_bind(clause=query)
+        compiled = query.compile(dialect=bind.dialect)
+        params = sorted(compiled.params.items())
+        return id(bind), mode, str(compiled), repr(params)
+
+    def execute(self, session, query, mode):
+        fetch = _fetchers[mode]
+        if not self.eligible(session, query, mode):
+            return fetch(session.execute(query))
+
+        key = self.make_key(session, query, mode)
+        call, leader = self._join(key)
+        if leader:
+            self._lead(key, call, query, fetch)
+            if call.error is not None:
+                raise call.error
+        elif not call.event.wait(self.timeout) or call.error is not None:
+            self._count("fallback")
+            return fetch(session.execute(query))
+        else:
+            self._count("shared")
+            record_coalesced(1)
+        return self.copy(session, call.result, mode)
+
+    def _join(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def _lead(self, key, call, query, fetch):
+        try:
+            with self.session_factory() as session:
+                call.result = fetch(session.execute(query))
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        self._count("executed")
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    @staticmethod
+    def copy(session, result, mode):
+        """共享结果中的模型实例合并到当前会话，避免多个请求修改同一个对象"""
+        if (
+            mode != "scalars"
+            or not result
+            or sa_inspect(result[0], raiseerr=False) is None
+        ):
+            return result if mode == "scalar" else list(result)
+        return [session.merge(instance, load=False) for instance in result]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executed": self.counters["executed"],
+                "shared": self.counters["shared"],
+                "fallback": self.counters["fallback"],
+                "in_flight": len(self._calls),
+            }
@@ -0,0 +1,133 @@
+import time
+import zlib
+
+from flask import request
+from werkzeug.wsgi import ClosingIterator
+
+# HTTP 中的 deflate 指 zlib 格式
+_wbits = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+
+def parse_accept_encoding(header):
+    """Accept-Encoding -> {编码: q}"""
+    encodings = {}
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[name] = q
+    return encodings
+
+
+class Compression:
+    """按 Accept-Encoding 对响应做 gzip / deflate 压缩，流式响应逐块压缩，不缓冲整个响应体"""
+
+    encodings = ("gzip", "deflate")
+    mimetypes = (
+        "application/json",
+        "application/javascript",
+        "application/xml",
+        "application/x-ndjson",
+        "text/csv",
+        "text/html",
+        "text/plain",
+        "text/xml",
+        "image/svg+xml",
+    )
+    # SSE 需要逐条即时送达，不压缩
+    skip_mimetypes = ("text/event-stream",)
+
+    # 流式响应距上次输出超过该秒数时，即使未达到 flush_size 也立即输出
+    flush_interval = 1.0
+
+    def __init__(self, level=6, min_size=1024, flush_size=8192):
+        self.level = level
+        self.min_size = min_size
+        self.flush_size = flush_size
+
+    def init_app(self, app):
+        app.after_request(self.after_request)
+
+    def negotiate(self, header):
+        accepted = parse_accept_encoding(header)
+        best, best_q = None, 0.0
+        for encoding in self.encodings:
+            q = accepted.get(encoding, accepted.get("*", 0.0))
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def should_compress(self, response):
+        if request.method == "HEAD" or response.status_code in (204, 304):
+            return False
+        if response.status_code < 200 or "Content-Encoding" in response.headers:
+            return False
+        mimetype = response.mimetype or ""
+        if mimetype in self.skip_mimetypes:
+            return False
+        return mimetype in self.mimetypes or mimetype.endswith(("+json", "+xml"))
+
+    def compressor(self, encoding):
+        return zlib.compressobj(self.level, zlib.DEFLATED, _wbits[encoding])
+
+    def compress(self, data, encoding):
+        compressor = self.compressor(encoding)
+        return compressor.compress(data) + compressor.flush()
+
+    def compress_stream(self, iterable, encoding):
+        compressor = self.compressor(encoding)
+        pending, flushed_at = 0, time.monotonic()
+        for chunk in iterable:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if not chunk:
+                continue
+            data = compressor.compress(chunk)
+            pending += len(chunk)
+            # 累积到 flush_size 或等待过久时同步刷新，客户端可以立即解压已收到的数据；
+            # 每块都刷新会让小块的压缩率明显下降
+            now = time.monotonic()
+            if pending >= self.flush_size or now - flushed_at >= self.flush_interval:
+                data += compressor.flush(zlib.Z_SYNC_FLUSH)
+                pending, flushed_at = 0, now
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def after_request(self, response):
+        if not self.should_compress(response):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = self.negotiate(request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            iterable = response.response
+            # 关闭响应时同时关闭原来的可迭代对象 (生成器未开始迭代时也会执行)
+            response.response = ClosingIterator(
+                self.compress_stream(iterable, encoding),
+                getattr(iterable, "close", None),
+            )
+            response.direct_passthrough = False
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(self.compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+        # 压缩后的字节与原响应不同，强 ETag 改为弱 ETag (If-None-Match 使用弱比较)
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
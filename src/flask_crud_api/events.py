@@ -0,0 +1,139 @@
+import time
+import queue
+import logging
+import itertools
+import threading
+
+from sqlalchemy import event
+
+from flask_crud_api.models import State
+
+events_key = "crud_api_events"
+
+logger = logging.getLogger(__name__)
+
+
+def get_broker():
+    from flask_crud_api import api
+
+    crud_api = api.current_crud_api()
+    if crud_api is None:
+        return None
+    return crud_api.broker
+
+
+class Subscription:
+
+    def __init__(self, broker, model, maxsize, match=None):
+        self.broker = broker
+        self.model = model
+        self.match = match
+        self.queue = queue.Queue(maxsize)
+        self.dropped = False
+
+    def accepts(self, data):
+        if self.match is None:
+            return True
+        try:
+            return self.match(data)
+        except Exception:
+            logger.exception("flask-crud-api: stream filter failed")
+            return False
+
+    def get(self, timeout=None):
+        """等待下一个符合过滤条件的事件，超时返回 None
+
+        过滤在订阅者线程中执行，不会增加写入请求的耗时
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.monotonic())
+            try:
+                data = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if self.accepts(data):
+                return data
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """进程内的发布订阅，每个订阅者使用有界队列，队列满(消费过慢)的订阅者会被断开"""
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self.subscriptions = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, model, match=None, maxsize=None):
+        subscription = Subscription(self, model, maxsize or self.maxsize, match=match)
+        with self._lock:
+            self.subscriptions.setdefault(model, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self.subscriptions.get(subscription.model, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+
+    def wants(self, model):
+        return bool(self.subscriptions.get(model))
+
+    def publish(self, model, data):
+        data = dict(data, id=next(self._ids))
+        for subscription in list(self.subscriptions.get(model, ())):
+            # 在写入会话的 after_commit 中执行，单个订阅者出错只断开该订阅者
+            try:
+                subscription.queue.put_nowait(data)
+            except queue.Full:
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+            except Exception:
+                logger.exception("flask-crud-api: failed to publish event")
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+        return data
+
+    def capture(self, session, flush_context):
+        """flush 后记录变更，提交成功后才发布"""
+        events = session.info.setdefault(events_key, [])
+        for action, objs in (
+            ("create", session.new),
+            ("update", session.dirty),
+            ("delete", session.deleted),
+        ):
+            for obj in objs:
+                model = type(obj)
+                if not self.wants(model):
+                    continue
+                name = action
+                if action == "update":
+                    if not session.is_modified(obj):
+                        continue
+                    # 软删除
+                    if getattr(obj, "state", State.Valid) != State.Valid:
+                        name = "delete"
+                events.append(
+                    (model, {"event": name, "pk": obj.pk, "data": obj.to_dict()})
+                )
+
+    def flush_events(self, session):
+        for model, data in session.info.pop(events_key, ()):
+            self.publish(model, data)
+
+    @staticmethod
+    def discard_events(session):
+        session.info.pop(events_key, None)
+
+    def init_session_factory(self, session_factory):
+        # scoped_session 需要监听其内部的 sessionmaker
+        factory = getattr(session_factory, "session_factory", session_factory)
+        event.listen(factory, "after_flush", self.capture)
+        event.listen(factory, "after_commit", self.flush_events)
+        event.listen(factory, "after_rollback", self.discard_events)
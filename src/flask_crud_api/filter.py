@@ -1,10 +1,71 @@
-from flask import request
-from sqlalchemy import Select
+import re
+import json
+
+from flask import request, abort
+from sqlalchemy import Select, and_, bindparam, cast, func, or_, select
+from sqlalchemy import column as sa_column, inspect as sa_inspect, table as sa_table
 from sqlalchemy import DateTime as SaDateTime
-from flask_crud_api.orm import get_delete_key, get_valid_stmt
+from sqlalchemy.dialects.postgresql import JSONB
+from flask_crud_api.orm import get_delete_key, get_session
+from flask_crud_api.models import State
+from flask_crud_api.instrument import record_joins
+from flask_crud_api.fulltext import fts_table_name, is_fulltext_ready, quote_query
+from flask_crud_api.regexp import compile_pattern, regexp_prefilter
 from flask_crud_api import utils
 
 
+def coerce_value(column, value):
+    """将查询参数转换为字段对应的 python 类型，无法转换时返回 400"""
+    try:
+        if isinstance(column.type, SaDateTime):
+            return utils.str2datetime(value)
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            return value
+        if python_type is bool:
+            if value.lower() not in ("1", "0", "true", "false"):
+                raise ValueError(value)
+            return value.lower() in ("1", "true")
+        if python_type is str:
+            return value
+        return python_type(value)
+    except (ValueError, ArithmeticError):
+        return abort(400, f"invalid value for {column.key}: {value}")
+
+
+def parse_in_values(column, args):
+    """支持 ?pk=1,2,3 与 ?pk=1&pk=2 两种写法，去重并保持顺序"""
+    values = []
+    for arg in args:
+        values.extend(value.strip() for value in arg.split(","))
+    return list(
+        dict.fromkeys(coerce_value(column, value) for value in values if value)
+    )
+
+
+def in_condition(column, values, threshold=500):
+    """少量值使用展开的绑定参数; 超过阈值时整个列表作为一个 JSON 参数传入，避免超出数据库参数个数限制"""
+    if len(values) <= threshold:
+        return column.in_(values)
+
+    dialect = get_session().get_bind(mapper=column.class_).dialect.name
+    if dialect in ("sqlite", "postgresql") and all(
+        isinstance(value, (int, str)) and not isinstance(value, bool)
+        for value in values
+    ):
+        if dialect == "sqlite":
+            table = func.json_each(json.dumps(values)).table_valued("value")
+            return column.in_(select(table.c.value))
+        table = func.jsonb_array_elements_text(
+            cast(json.dumps(values), JSONB)
+        ).table_valued("value")
+        return column.in_(select(cast(table.c.value, column.type)))
+
+    # 其他数据库以字面量渲染，不占用绑定参数
+    return column.in_(bindparam(None, values, expanding=True, literal_execute=True))
+
+
 class BaseFilter:
 
     def query_filter(self, stmt: Select, view=None):
@@ -94,6 +155,8 @@ class SearchFilter(BaseFilter):
 
     search_field_name = "view_filter_fields"
     search_model_name = "model"
+    # in 查询超过该数量时改为单个 JSON 参数
+    in_threshold = 500
 
     def get_default_model(self, view):
         if not hasattr(view, self.search_model_name):
@@ -107,32 +170,42 @@ class SearchFilter(BaseFilter):
         fields = getattr(view, self.search_field_name)
         return fields
 
-    def make_conditions(self, model, filter_fields):
+    def make_conditions(self, model, filter_fields, field_prefix=""):
         conditions_args = {}
         conditions_ops = {}
         for field, op in filter_fields:
             if field not in request.args:
                 continue
-            
-            if not hasattr(model, field):
+
+            real_field = field
+            if field_prefix and field.startswith(field_prefix):
+                real_field = field[len(field_prefix) :]
+
+            if not hasattr(model, real_field):
                 continue
 
             conditions_ops[f"_op_{field}"] = op
             if op == "between":
                 start, end = request.args[field].split(",")
-                column = getattr(model, field)
+                column = getattr(model, real_field)
                 if isinstance(column.type, SaDateTime):
                     conditions_args[field] = utils.str2datetime(
                         start
                     ), utils.str2datetime(end)
                 else:
                     conditions_args[field] = start, end
+            elif op == "in":
+                conditions_args[field] = parse_in_values(
+                    getattr(model, real_field), request.args.getlist(field)
+                )
             else:
                 conditions_args[field] = request.args[field]
         return conditions_args, conditions_ops
 
     def make_filter(self, model, filter_fields, field_prefix=""):
-        conditions_args, conditions_ops = self.make_conditions(model, filter_fields)
+        conditions_args, conditions_ops = self.make_conditions(
+            model, filter_fields, field_prefix
+        )
 
         conditions = []
         for field, value in conditions_args.items():
@@ -148,10 +221,28 @@ class SearchFilter(BaseFilter):
             ooo = getattr(model, real_field)
             if op == "between":
                 conditions.append(ooo.between(*value))
+            elif op == "in":
+                conditions.append(in_condition(ooo, value, self.in_threshold))
+            elif op == "regexp":
+                conditions.extend(self.make_regexp(model, ooo, value))
             else:
                 conditions.append(ooo.op(op)(value))
         return conditions
 
+    @staticmethod
+    def make_regexp(model, column, pattern):
+        try:
+            compile_pattern(pattern)
+        except re.error:
+            return abort(400, f"invalid regexp: {pattern}")
+
+        conditions = []
+        # 预过滤条件只对本库注册的 sqlite REGEXP 函数(区分大小写)成立
+        if get_session().get_bind(mapper=model).dialect.name == "sqlite":
+            conditions.extend(regexp_prefilter(column, pattern))
+        conditions.append(column.op("regexp")(pattern))
+        return conditions
+
     def query_filter(self, stmt: Select, view=None):
         if view is None:
             return stmt
@@ -186,22 +277,71 @@ class SearchJoinFilter(SearchFilter):
         join_keys = getattr(view, self.join_model_field_name)
         return join_keys
 
-    def make_join(self, stmt: Select, model, join_models, join_keys):
+    def make_join(self, stmt: Select, model, join_models, join_keys, required=None):
         if not all([join_models, join_keys]):
             return stmt
 
         if len(join_models) != len(join_keys):
             raise Exception("关联条件错误")
 
-        for j_model, j_key in zip(join_models, join_keys):
+        joins = 0
+        for idx, (j_model, j_key) in enumerate(zip(join_models, join_keys)):
+            if required is not None and idx not in required:
+                continue
             left, right = j_key
+            # 软删除条件放在 ON 中，保持外连接语义
+            delete_key = get_delete_key(j_model)
             stmt = stmt.outerjoin(
-                j_model, getattr(j_model, left) == getattr(model, right)
+                j_model,
+                and_(
+                    getattr(j_model, left) == getattr(model, right),
+                    delete_key == State.Valid,
+                ),
             )
-            delete_key = get_delete_key(j_model)
-            stmt = get_valid_stmt(delete_key, stmt)
+            joins += 1
+        record_joins(joins)
         return stmt
 
+    @staticmethod
+    def is_projected(stmt: Select, j_model):
+        return j_model.__table__ in stmt.columns_clause_froms
+
+    @staticmethod
+    def is_unique_key(j_model, key):
+        column = j_model.__table__.c[key]
+        if column.unique or (
+            column.primary_key and len(j_model.__table__.primary_key.columns) == 1
+        ):
+            return True
+        return any(
+            index.unique and [c.name for c in index.columns] == [key]
+            for index in j_model.__table__.indexes
+        )
+
+    def required_joins(self, stmt: Select, view, join_models, join_keys):
+        """按需join: 请求中存在关联过滤条件，或查询需要关联模型的字段"""
+        join_filter_fields = self.get_default_join_filter(view) or ()
+        list_stmt = None
+        required = set()
+        for idx, (j_model, j_key) in enumerate(zip(join_models, join_keys)):
+            fields = join_filter_fields[idx] if idx < len(join_filter_fields) else ()
+            if any(field in request.args for field, _ in fields):
+                required.add(idx)
+                continue
+
+            if self.is_projected(stmt, j_model):
+                required.add(idx)
+                continue
+
+            # 计数查询不返回关联字段，唯一键上的外连接不影响行数，可以省略
+            if self.is_unique_key(j_model, j_key[0]):
+                continue
+            if list_stmt is None:
+                list_stmt = view.get_queryset()
+            if self.is_projected(list_stmt, j_model):
+                required.add(idx)
+        return required
+
     def get_default_join_filter(self, view):
         if not hasattr(view, self.search_join_field_name):
             return None
@@ -232,8 +372,8 @@ class SearchJoinFilter(SearchFilter):
             return stmt
 
         model = self.get_default_model(view)
-        # TODO: 按需进行join
-        stmt = self.make_join(stmt, model, join_models, join_keys)
+        required = self.required_joins(stmt, view, join_models, join_keys)
+        stmt = self.make_join(stmt, model, join_models, join_keys, required)
 
         join_filter_fields = self.get_default_join_filter(view)
         if not join_filter_fields:
@@ -243,3 +383,60 @@ class SearchJoinFilter(SearchFilter):
         stmt = stmt.where(*_filter)
 
         return stmt
+
+
+class FullTextFilter(BaseFilter):
+    """__q 全文检索: sqlite 使用 FTS5 MATCH 并按相关度排序，其他数据库退化为 LIKE"""
+
+    search_param = "__q"
+    search_field_name = "view_fulltext_fields"
+
+    def query_filter(self, stmt: Select, view=None):
+        if view is None:
+            return stmt
+
+        fields = getattr(view, self.search_field_name, None)
+        q = request.args.get(self.search_param, "").strip()
+        if not fields or not q:
+            return stmt
+
+        model = view.model
+        engine = get_session().get_bind(mapper=model)
+        tokenize = getattr(view, "view_fulltext_tokenize", "unicode61")
+        # trigram 分词无法匹配少于 3 个字符的词
+        if is_fulltext_ready(engine, model.__tablename__) and (
+            tokenize != "trigram" or min(len(token) for token in q.split()) >= 3
+        ):
+            return self.match(stmt, model, fields, q)
+        return self.like(stmt, model, fields, q)
+
+    @staticmethod
+    def match(stmt: Select, model, fields, q):
+        name = fts_table_name(model.__tablename__)
+        fts = sa_table(
+            name, sa_column("rowid"), sa_column("rank"), sa_column(name)
+        )
+        pk = sa_inspect(model).primary_key[0]
+        stmt = stmt.join(fts, fts.c.rowid == pk).where(
+            fts.c[name].op("MATCH")(quote_query(q))
+        )
+        # 计数查询以及已指定排序时不按相关度排序
+        if stmt.get_execution_options().get("crud_api_count"):
+            return stmt
+        if stmt._order_by_clauses:
+            return stmt
+        return stmt.order_by(fts.c.rank)
+
+    @staticmethod
+    def like(stmt: Select, model, fields, q):
+        conditions = []
+        for token in q.split():
+            conditions.append(
+                or_(
+                    *[
+                        getattr(model, field).icontains(token, autoescape=True)
+                        for field in fields
+                    ]
+                )
+            )
+        return stmt.where(and_(*conditions))
@@ -0,0 +1,100 @@
+import weakref
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+
+# engine -> 已建好全文索引的表名集合
+_ready = weakref.WeakKeyDictionary()
+
+
+def is_fulltext_ready(engine, tablename):
+    return tablename in _ready.get(engine, ())
+
+
+def fts_table_name(tablename):
+    return f"{tablename}_fts"
+
+
+def quote_query(q):
+    """每个词作为短语加引号，避免用户输入被解析为 FTS5 查询语法，多个词之间为 AND"""
+    return " ".join('"{}"'.format(token.replace('"', '""')) for token in q.split())
+
+
+def _fts_sql(model, fields, tokenize):
+    tablename = model.__tablename__
+    name = fts_table_name(tablename)
+    pk = inspect(model).primary_key[0].name
+    columns = ", ".join(fields)
+    new_values = ", ".join(f"new.{field}" for field in fields)
+    old_values = ", ".join(f"old.{field}" for field in fields)
+    # external content 表: 只保存倒排索引，内容从原表读取，通过触发器保持同步
+    return [
+        f"CREATE VIRTUAL TABLE {name} USING fts5({columns}, "
+        f"content='{tablename}', content_rowid='{pk}', tokenize='{tokenize}')",
+        f"CREATE TRIGGER {name}_ai AFTER INSERT ON {tablename} BEGIN "
+        f"INSERT INTO {name}(rowid, {columns}) VALUES (new.{pk}, {new_values}); END",
+        f"CREATE TRIGGER {name}_ad AFTER DELETE ON {tablename} BEGIN "
+        f"INSERT INTO {name}({name}, rowid, {columns}) "
+        f"VALUES ('delete', old.{pk}, {old_values}); END",
+        f"CREATE TRIGGER {name}_au AFTER UPDATE ON {tablename} BEGIN "
+        f"INSERT INTO {name}({name}, rowid, {columns}) "
+        f"VALUES ('delete', old.{pk}, {old_values}); "
+        f"INSERT INTO {name}(rowid, {columns}) VALUES (new.{pk}, {new_values}); END",
+        f"INSERT INTO {name}({name}) VALUES ('rebuild')",
+    ]
+
+
+def create_fulltext_index(engine, model, fields, tokenize="unicode61"):
+    """创建 FTS5 索引表及同步触发器，字段变化时重建；返回是否可用"""
+    tablename = model.__tablename__
+    ready = _ready.setdefault(engine, set())
+    if engine.dialect.name != "sqlite":
+        return False
+    if tablename in ready:
+        return True
+
+    name = fts_table_name(tablename)
+    try:
+        with engine.begin() as conn:
+            if not inspect(conn).has_table(tablename):
+                return False
+
+            existing = [
+                row[1] for row in conn.execute(text(f"PRAGMA table_info({name})")).all()
+            ]
+            if existing != list(fields):
+                for trigger in ("ai", "ad", "au"):
+                    conn.execute(text(f"DROP TRIGGER IF EXISTS {name}_{trigger}"))
+                conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                for sql in _fts_sql(model, fields, tokenize):
+                    conn.execute(text(sql))
+    except OperationalError:
+        # sqlite 未编译 FTS5 或分词器不可用
+        return False
+
+    ready.add(tablename)
+    return True
+
+
+def provision_view_fulltext(app, view_cls):
+    """视图注册时为声明的全文检索字段建立索引"""
+    fields = getattr(view_cls, "view_fulltext_fields", None)
+    if not fields or getattr(view_cls, "model", None) is None:
+        return False
+
+    from flask_crud_api import api
+
+    engine = api.app_crud_api(app).engine_for(view_cls.model)
+    created = create_fulltext_index(
+        engine,
+        view_cls.model,
+        fields,
+        getattr(view_cls, "view_fulltext_tokenize", "unicode61"),
+    )
+    if not created and engine.dialect.name == "sqlite":
+        app.logger.warning(
+            "flask-crud-api: full-text index for %s is not available, "
+            "falling back to LIKE",
+            view_cls.model.__tablename__,
+        )
+    return created
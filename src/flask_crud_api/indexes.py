@@ -0,0 +1,408 @@
+import datetime
+import hashlib
+import dataclasses
+import typing as t
+
+from sqlalchemy import Index, MetaData, inspect, text
+
+from flask_crud_api.models import State
+
+# 支持部分索引(WHERE state = 1)的数据库
+partial_index_dialects = {"sqlite", "postgresql"}
+
+# 能够利用 B-Tree 索引的过滤操作符
+indexable_ops = {"=", "==", "!=", "<>", "<", ">", "<=", ">=", "between", "in", "is"}
+
+valid_where = f"state = {State.Valid}"
+
+
+@dataclasses.dataclass()
+class PlannedIndex:
+
+    table: str
+    columns: t.Tuple[str, ...]
+    partial: bool = False
+    reasons: t.List[str] = dataclasses.field(default_factory=list)
+    # 查询包含软删除数据(如增量同步)，索引不能以 state 为前缀或限定 state
+    all_states: bool = False
+
+    @property
+    def name(self):
+        name = f"ix_{self.table}_{'_'.join(self.columns)}"
+        if self.partial:
+            name = f"{name}_valid"
+        # postgresql 标识符最长63个字符
+        if len(name) > 63:
+            digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+            name = f"{name[:54]}_{digest}"
+        return name
+
+    @property
+    def key_columns(self):
+        # 部分索引 WHERE state = 1 等价于以 state 为前缀的组合索引
+        if self.partial:
+            return ("state",) + self.columns
+        return self.columns
+
+
+@dataclasses.dataclass()
+class DeclaredField:
+
+    view: str
+    table: str
+    field: str
+    kind: str
+    op: t.Optional[str] = None
+    index: t.Optional[PlannedIndex] = None
+    primary: bool = False
+    reason: str = ""
+
+
+class IndexPlanner:
+    """根据视图中声明的过滤、排序、关联字段规划索引"""
+
+    filter_field_name = "view_filter_fields"
+    order_field_name = "view_order_fields"
+    order_field_prefix = "__order_"
+    join_model_name = "view_join_model"
+    join_model_field_name = "view_join_model_key"
+    join_filter_field_name = "view_join_filter_fields"
+    changes_field_name = "changes_field"
+
+    def __init__(self, dialect_name):
+        self.dialect_name = dialect_name
+        self.partial = dialect_name in partial_index_dialects
+        self.plans: t.Dict[t.Tuple, PlannedIndex] = {}
+        self.fields: t.List[DeclaredField] = []
+        self.views = set()
+        self._detached = {}
+
+    def collect_app(self, app):
+        for view in list(app.view_functions.values()):
+            view_class = getattr(view, "view_class", None)
+            if getattr(view_class, "model", None) is not None:
+                self.collect(view_class)
+        return self
+
+    def collect(self, view_cls):
+        if view_cls in self.views:
+            return self
+        self.views.add(view_cls)
+
+        model = view_cls.model
+        for field, op in getattr(view_cls, self.filter_field_name, None) or ():
+            self.plan_filter(view_cls, model, field, op)
+
+        for field, _ in getattr(view_cls, self.order_field_name, None) or ():
+            if field.startswith(self.order_field_prefix):
+                field = field[len(self.order_field_prefix) :]
+            self.plan_order(view_cls, model, field)
+
+        join_models = getattr(view_cls, self.join_model_name, None) or ()
+        join_keys = getattr(view_cls, self.join_model_field_name, None) or ()
+        for j_model, (left, _) in zip(join_models, join_keys):
+            self.plan_join(view_cls, j_model, left)
+
+        join_filters = getattr(view_cls, self.join_filter_field_name, None) or ()
+        for j_model, join_filter in zip(join_models, join_filters):
+            for field, op in join_filter:
+                self.plan_filter(view_cls, j_model, field, op, prefix="__join_")
+
+        changes_field = getattr(view_cls, self.changes_field_name, None)
+        if changes_field:
+            self.plan_changes(view_cls, model, changes_field)
+
+        return self
+
+    def _add(self, table, columns, reason, all_states=False):
+        partial = self.partial and "state" in table.columns and not all_states
+        if not partial and "state" in table.columns and not all_states:
+            columns = ("state",) + tuple(columns)
+        key = (table.name, tuple(columns), partial)
+        if key not in self.plans:
+            self.plans[key] = PlannedIndex(
+                table.name, tuple(columns), partial, all_states=all_states
+            )
+        plan = self.plans[key]
+        plan.reasons.append(reason)
+        return plan
+
+    def _declare(self, view_cls, table, field, kind, op=None):
+        declared = DeclaredField(view_cls.__name__, table.name, field, kind, op)
+        self.fields.append(declared)
+        return declared
+
+    def plan_filter(self, view_cls, model, field, op, prefix=""):
+        if prefix and field.startswith(prefix):
+            field = field[len(prefix) :]
+        table = model.__table__
+        declared = self._declare(view_cls, table, field, "filter", op)
+        if field not in table.columns:
+            declared.reason = "not a column"
+            return
+        if op not in indexable_ops:
+            declared.reason = f"operator {op!r} can not use an index"
+            return
+        if table.c[field].primary_key:
+            declared.primary = True
+            return
+        declared.index = self._add(
+            table, (field,), f"{view_cls.__name__} filter {field}"
+        )
+
+    def plan_order(self, view_cls, model, field):
+        table = model.__table__
+        declared = self._declare(view_cls, table, field, "order")
+        if field not in table.columns:
+            declared.reason = "not a column"
+            return
+        if table.c[field].primary_key:
+            declared.primary = True
+            return
+        declared.index = self._add(
+            table, (field, "pk"), f"{view_cls.__name__} order {field}"
+        )
+
+    def plan_join(self, view_cls, j_model, field):
+        table = j_model.__table__
+        declared = self._declare(view_cls, table, field, "join")
+        if field not in table.columns:
+            declared.reason = "not a column"
+            return
+        if table.c[field].primary_key:
+            declared.primary = True
+            return
+        declared.index = self._add(table, (field,), f"{view_cls.__name__} join {field}")
+
+    def plan_changes(self, view_cls, model, field):
+        table = model.__table__
+        declared = self._declare(view_cls, table, field, "changes")
+        if field not in table.columns:
+            declared.reason = "not a column"
+            return
+        declared.index = self._add(
+            table, (field, "pk"), f"{view_cls.__name__} changes", all_states=True
+        )
+
+    def existing_indexes(self, engine=None):
+        """模型元数据及数据库中已有的索引，统一为以 state 为前缀的列序列"""
+        existing: t.Dict[str, t.List[t.Tuple[str, ...]]] = {}
+        tables = {}
+        for view_cls in self.views:
+            models = [
+                view_cls.model,
+                *(getattr(view_cls, self.join_model_name, None) or ()),
+            ]
+            for model in models:
+                tables[model.__table__.name] = model.__table__
+
+        inspector = inspect(engine) if engine is not None else None
+        for name, table in tables.items():
+            indexes = existing.setdefault(name, [])
+            indexes.append(tuple(column.name for column in table.primary_key.columns))
+            for column in table.columns:
+                if column.unique:
+                    indexes.append((column.name,))
+
+            # 指定了数据库时以库中实际存在的索引为准
+            if inspector is not None and inspector.has_table(name):
+                for index in inspector.get_indexes(name):
+                    columns = tuple(c for c in index["column_names"] if c)
+                    options = index.get("dialect_options", {})
+                    if index["name"].endswith("_valid") or any(
+                        k.endswith("_where") for k in options
+                    ):
+                        columns = ("state",) + columns
+                    indexes.append(columns)
+                continue
+
+            for index in table.indexes:
+                columns = tuple(column.name for column in index.columns)
+                if any(
+                    v is not None
+                    for k, v in index.dialect_kwargs.items()
+                    if k.endswith("_where")
+                ):
+                    columns = ("state",) + columns
+                indexes.append(columns)
+            for column in table.columns:
+                if column.index:
+                    indexes.append((column.name,))
+        return existing
+
+    @staticmethod
+    def _covered(plan, indexes):
+        # 以 (state, 查询列) 或查询列开头的索引即可避免全表扫描
+        column = [c for c in plan.key_columns if c != "state"][0]
+        prefixes = [(column,)] if plan.all_states else [("state", column), (column,)]
+        return any(
+            columns[: len(prefix)] == prefix
+            for prefix in prefixes
+            for columns in indexes
+        )
+
+    def missing(self, engine=None):
+        existing = self.existing_indexes(engine)
+        return [
+            plan
+            for plan in self.plans.values()
+            if not self._covered(plan, existing.get(plan.table, []))
+        ]
+
+    def report(self, engine=None):
+        existing = self.existing_indexes(engine)
+        result = []
+        for declared in self.fields:
+            indexed = declared.primary or (
+                declared.index is not None
+                and self._covered(declared.index, existing.get(declared.table, []))
+            )
+            result.append(
+                {
+                    "view": declared.view,
+                    "table": declared.table,
+                    "field": declared.field,
+                    "kind": declared.kind,
+                    "op": declared.op,
+                    "indexed": indexed,
+                    "proposed": declared.index.name if declared.index else None,
+                    "reason": declared.reason,
+                }
+            )
+        return result
+
+    def unindexed(self, engine=None):
+        return [item for item in self.report(engine) if not item["indexed"]]
+
+    def _table(self, name):
+        for view_cls in self.views:
+            models = [
+                view_cls.model,
+                *(getattr(view_cls, self.join_model_name, None) or ()),
+            ]
+            for model in models:
+                if model.__table__.name == name:
+                    return model.__table__
+        raise Exception(f"table {name} not found")
+
+    def to_index(self, plan: PlannedIndex):
+        table = self._table(plan.table)
+        for index in table.indexes:
+            if index.name == plan.name:
+                return index
+
+        # 在复制的表上创建 Index，不修改模型的元数据(表结构指纹、迁移自动生成不受影响)
+        detached = self._detached.get(plan.table)
+        if detached is None:
+            detached = self._detached[plan.table] = table.to_metadata(MetaData())
+
+        kwargs = {}
+        if plan.partial:
+            kwargs[f"{self.dialect_name}_where"] = text(valid_where)
+        return Index(
+            plan.name, *[detached.c[column] for column in plan.columns], **kwargs
+        )
+
+    def create(self, engine, plans=None):
+        if plans is None:
+            plans = self.missing(engine)
+        for plan in plans:
+            self.to_index(plan).create(engine, checkfirst=True)
+        return plans
+
+    def render_migration(self, revision, down_revision=None, plans=None):
+        if plans is None:
+            plans = list(self.plans.values())
+
+        upgrade, downgrade = [], []
+        for plan in plans:
+            where = ""
+            if plan.partial:
+                where = (
+                    f", sqlite_where=sa.text({valid_where!r})"
+                    f", postgresql_where=sa.text({valid_where!r})"
+                )
+            upgrade.append(
+                f"    op.create_index({plan.name!r}, {plan.table!r}, "
+                f"{list(plan.columns)!r}, unique=False{where})"
+            )
+            downgrade.append(
+                f"    op.drop_index({plan.name!r}, table_name={plan.table!r})"
+            )
+
+        return _migration_template.format(
+            revision=revision,
+            down_revision=down_revision,
+            create_date=datetime.datetime.now(),
+            upgrade="\n".join(upgrade) or "    pass",
+            downgrade="\n".join(reversed(downgrade)) or "    pass",
+        )
+
+
+_migration_template = '''"""crud-api indexes
+
+Revision ID: {revision}
+Revises: {down_revision}
+Create Date: {create_date}
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = {revision!r}
+down_revision = {down_revision!r}
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+{upgrade}
+
+
+def downgrade():
+{downgrade}
+'''
+
+
+def plan_app_indexes(app, engine_for):
+    """按视图模型所在的引擎分组规划索引: [(engine, IndexPlanner)]"""
+    planners = {}
+    for view in list(app.view_functions.values()):
+        view_class = getattr(view, "view_class", None)
+        model = getattr(view_class, "model", None)
+        if model is None:
+            continue
+        engine = engine_for(model)
+        if engine not in planners:
+            planners[engine] = IndexPlanner(engine.dialect.name)
+        planners[engine].collect(view_class)
+    return list(planners.items())
+
+
+def provision_view_indexes(app, view_cls):
+    """视图注册时按配置检查/创建索引"""
+    from flask_crud_api import api
+
+    mode = app.config.get(f"{api.CONFIG_KEY_PREFIX}_DB_AUTO_INDEX")
+    if not mode or getattr(view_cls, "model", None) is None:
+        return None
+
+    engine = api.app_crud_api(app).engine_for(view_cls.model)
+    planner = IndexPlanner(engine.dialect.name).collect(view_cls)
+    if mode == "create":
+        planner.create(engine)
+    elif mode != "report":
+        raise Exception(f"unknown auto index mode: {mode}")
+
+    for item in planner.unindexed(engine):
+        app.logger.warning(
+            "flask-crud-api: %s %s %s.%s is not indexed %s",
+            item["view"],
+            item["kind"],
+            item["table"],
+            item["field"],
+            item["reason"] or f"(proposed {item['proposed']})",
+        )
+    return planner
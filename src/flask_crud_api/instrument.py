@@ -0,0 +1,199 @@
+import time
+import collections
+import contextvars
+
+from flask import Blueprint, request
+from sqlalchemy import event
+
+from flask_crud_api.response import ok_response
+
+# 当前请求的统计信息，未开启统计或不在请求中时为 None
+_current_stats = contextvars.ContextVar("flask_crud_api_request_stats", default=None)
+
+
+def current_stats():
+    return _current_stats.get()
+
+
+def record_rows(count):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.rows += count
+
+
+def record_joins(count):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.joins += count
+
+
+def child_context():
+    """复制当前上下文供其他线程使用，返回 (context, stats)
+
+    开启统计时 context 中使用独立的 RequestStats，线程结束后由调用方合并，避免多个线程同时修改同一个对象
+    """
+    context = contextvars.copy_context()
+    parent = _current_stats.get()
+    if parent is None:
+        return context, None
+    stats = RequestStats(parent.method, parent.path, parent.endpoint)
+    context.run(_current_stats.set, stats)
+    return context, stats
+
+
+def record_coalesced(count):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.coalesced += count
+
+
+class RequestStats:
+
+    __slots__ = (
+        "method",
+        "path",
+        "endpoint",
+        "status",
+        "start",
+        "duration",
+        "statements",
+        "db_time",
+        "serialize_time",
+        "rows",
+        "joins",
+        "coalesced",
+        "queries",
+    )
+
+    def __init__(self, method, path, endpoint):
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint
+        self.status = None
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.statements = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.rows = 0
+        self.joins = 0
+        # 共享了其他请求查询结果的次数
+        self.coalesced = 0
+        self.queries = collections.Counter()
+
+    def record_statement(self, statement, elapsed):
+        self.statements += 1
+        self.db_time += elapsed
+        self.queries[statement] += 1
+
+    def merge(self, other):
+        self.statements += other.statements
+        self.db_time += other.db_time
+        self.rows += other.rows
+        self.joins += other.joins
+        self.coalesced += other.coalesced
+        self.queries.update(other.queries)
+
+    def repeated(self, threshold):
+        # 相同 SQL 重复执行多次，通常是逐行查询导致的 N+1
+        return [
+            {"statement": statement[:500], "count": count}
+            for statement, count in self.queries.most_common()
+            if count >= threshold
+        ]
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.statements} statements, '
+            f'{self.rows} rows, {self.joins} joins", total;dur={self.elapsed() * 1000:.2f}'
+        )
+
+    def to_dict(self, threshold):
+        return {
+            "method": self.method,
+            "path": self.path,
+            "endpoint": self.endpoint,
+            "status": self.status,
+            "duration_ms": round(self.duration * 1000, 3),
+            "statements": self.statements,
+            "db_time_ms": round(self.db_time * 1000, 3),
+            "serialize_time_ms": round(self.serialize_time * 1000, 3),
+            "rows": self.rows,
+            "joins": self.joins,
+            "coalesced": self.coalesced,
+            "repeated": self.repeated(threshold),
+        }
+
+
+class SQLInstrument:
+    """统计每个请求的 SQL 执行次数、耗时、行数以及重复语句"""
+
+    debug_prefix = "/_debug"
+
+    def __init__(self, buffer_size=100, repeat_threshold=3, server_timing=True):
+        self.repeat_threshold = repeat_threshold
+        self.server_timing = server_timing
+        self.buffer = collections.deque(maxlen=buffer_size)
+        # 请求结束时回调，参数为 RequestStats
+        self.observers = []
+
+    def init_engine(self, engine):
+        event.listen(engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self.after_cursor_execute)
+
+    def init_debug_api(self, app):
+        _debug = Blueprint("_debug", __name__, url_prefix=self.debug_prefix)
+
+        @_debug.get("/requests")
+        def __requests():
+            return ok_response(
+                [
+                    stats.to_dict(self.repeat_threshold)
+                    for stats in reversed(self.buffer)
+                ]
+            )
+
+        app.register_blueprint(_debug)
+
+    @staticmethod
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        if context is not None and _current_stats.get() is not None:
+            context._crud_api_start = time.perf_counter()
+
+    @staticmethod
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_stats.get()
+        if stats is None or not hasattr(context, "_crud_api_start"):
+            return
+        stats.record_statement(statement, time.perf_counter() - context._crud_api_start)
+
+    def start_request(self):
+        if request.path.startswith(self.debug_prefix):
+            return None
+        stats = RequestStats(request.method, request.path, request.endpoint)
+        return _current_stats.set(stats)
+
+    def after_request(self, response):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.status = response.status_code
+            if self.server_timing:
+                response.headers.add("Server-Timing", stats.server_timing())
+        return response
+
+    def finish_request(self, token):
+        if token is None:
+            return
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.duration = stats.elapsed()
+            if self.buffer.maxlen:
+                self.buffer.append(stats)
+            for observer in self.observers:
+                observer(stats)
+        _current_stats.reset(token)
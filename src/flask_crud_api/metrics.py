@@ -0,0 +1,401 @@
+import os
+import sys
+import json
+import time
+import atexit
+import bisect
+import weakref
+import threading
+import contextlib
+
+from flask import Response
+
+default_buckets = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+histogram_help = {
+    "request_duration_seconds": "Request latency by endpoint.",
+    "db_duration_seconds": "Database time per request by endpoint.",
+    "serialize_duration_seconds": "Serialization time per request by endpoint.",
+}
+
+metric_prefix = "flask_crud_api_"
+file_prefix = "crud_api_metrics_"
+# 已退出 worker 的计数器与直方图合并到该文件，保证汇总后的 _total / _count 不会减少
+dead_file = f"{file_prefix}dead.json"
+lock_file = "crud_api_metrics.lock"
+
+
+def _pid_alive(pid):
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _greenlet_patched():
+    if "gevent" not in sys.modules:
+        return False
+    from gevent import monkey
+
+    return monkey.is_module_patched("threading")
+
+
+def _load_snapshot(data):
+    """快照文件内容 -> (histograms, counters, gauges)"""
+
+    def key(name, labels):
+        return name, tuple(tuple(label) for label in labels)
+
+    histograms = {
+        key(name, labels): values for name, labels, values in data["histograms"]
+    }
+    counters = {key(name, labels): value for name, labels, value in data["counters"]}
+    gauges = [key(name, labels) + (value,) for name, labels, value in data["gauges"]]
+    return histograms, counters, gauges
+
+
+def _dump_snapshot(histograms, counters, gauges=()):
+    return {
+        "histograms": [
+            [name, labels, values] for (name, labels), values in histograms.items()
+        ],
+        "counters": [
+            [name, labels, value] for (name, labels), value in counters.items()
+        ],
+        "gauges": [[name, labels, value] for name, labels, value in gauges],
+    }
+
+
+def _write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _flush_loop(ref, interval):
+    # 只持有弱引用，Metrics 被回收后线程退出
+    while True:
+        time.sleep(interval)
+        metrics = ref()
+        if metrics is None:
+            return
+        if metrics._dirty:
+            metrics.flush()
+        del metrics
+
+
+def _flush_at_exit(ref):
+    metrics = ref()
+    if metrics is not None and metrics._dirty and metrics._flusher_pid == os.getpid():
+        metrics.flush()
+
+
+class _Shard:
+
+    __slots__ = ("histograms", "counters")
+
+    def __init__(self):
+        # (name, labels) -> [bucket_0, ..., bucket_inf, sum]
+        self.histograms = {}
+        # (name, labels) -> value
+        self.counters = {}
+
+    def merge(self, other):
+        for key, values in list(other.histograms.items()):
+            merged = self.histograms.setdefault(key, [0] * len(values))
+            for idx, value in enumerate(values):
+                merged[idx] += value
+        for key, value in list(other.counters.items()):
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+class _Owner:
+    """保存在线程局部变量中，线程结束时被回收，触发分片合并"""
+
+    __slots__ = ("shard", "__weakref__")
+
+    def __init__(self, shard):
+        self.shard = shard
+
+
+class Metrics:
+    """按线程分片的直方图，写入时无锁，抓取时合并所有分片及其他进程的快照
+
+    线程结束后其分片合并到基础分片中，分片数量不会随短生命周期的线程增长
+    """
+
+    def __init__(
+        self, buckets=default_buckets, multiprocess_dir=None, flush_interval=1.0
+    ):
+        self.buckets = tuple(buckets)
+        self.multiprocess_dir = multiprocess_dir
+        self.flush_interval = flush_interval
+        self.engines = {}
+        self._shards = []
+        # 分片合并可能在垃圾回收时触发，使用可重入锁
+        self._shards_lock = threading.RLock()
+        self._local = threading.local()
+        # 有未写入快照文件的数据；后台线程定期写入，空闲的 worker 也不会遗漏最后的数据
+        self._dirty = False
+        self._flusher_pid = None
+        # 已结束线程的数据，gevent 下所有协程运行在同一线程且不会被抢占，直接共用
+        self._base = _Shard()
+        self._shards.append(self._base)
+        self._single = _greenlet_patched()
+
+    def _shard(self):
+        if self._single:
+            return self._base
+        owner = getattr(self._local, "owner", None)
+        if owner is None:
+            owner = self._local.owner = _Owner(_Shard())
+            with self._shards_lock:
+                self._shards.append(owner.shard)
+            weakref.finalize(owner, self._retire, owner.shard)
+        return owner.shard
+
+    def _retire(self, shard):
+        with self._shards_lock:
+            self._base.merge(shard)
+            self._shards.remove(shard)
+
+    def observe(self, name, labels, value):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        values = histograms.get(key)
+        if values is None:
+            values = histograms[key] = [0] * (len(self.buckets) + 2)
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def inc(self, name, labels=(), value=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe_request(self, stats):
+        labels = (("endpoint", stats.endpoint or "none"), ("method", stats.method))
+        self.observe("request_duration_seconds", labels, stats.duration)
+        self.observe("db_duration_seconds", labels, stats.db_time)
+        self.observe("serialize_duration_seconds", labels, stats.serialize_time)
+        self.inc("requests_total", labels + (("status", str(stats.status)),))
+        if stats.coalesced:
+            self.inc("coalesced_reads_total", labels, stats.coalesced)
+
+        if self.multiprocess_dir:
+            self._dirty = True
+            if self._flusher_pid != os.getpid():
+                self._start_flusher()
+
+    def _start_flusher(self):
+        # fork 出的 worker 不会继承父进程的线程，每个进程在首次记录时启动
+        with self._shards_lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(
+            target=_flush_loop,
+            args=(weakref.ref(self), self.flush_interval),
+            name="crud_api_metrics_flush",
+            daemon=True,
+        ).start()
+        atexit.register(_flush_at_exit, weakref.ref(self))
+
+    def snapshot(self):
+        total = _Shard()
+        # 加锁避免与线程结束时的合并同时进行，重复或遗漏计数
+        with self._shards_lock:
+            for shard in list(self._shards):
+                total.merge(shard)
+        return total.histograms, total.counters
+
+    def _path(self, pid):
+        return os.path.join(self.multiprocess_dir, f"{file_prefix}{pid}.json")
+
+    def flush(self):
+        self._dirty = False
+        histograms, counters = self.snapshot()
+        data = _dump_snapshot(histograms, counters, self.gauges())
+        _write_json(self._path(os.getpid()), data)
+
+    @contextlib.contextmanager
+    def _dir_lock(self):
+        import fcntl
+
+        with open(os.path.join(self.multiprocess_dir, lock_file), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _retire_worker(self, filename):
+        """已退出 worker 的计数器、直方图合并到 dead_file 后删除其快照，连接池等 gauge 丢弃"""
+        path = os.path.join(self.multiprocess_dir, filename)
+        archive = os.path.join(self.multiprocess_dir, dead_file)
+        # 多个 worker 同时抓取时只有一个合并，避免重复计数
+        with self._dir_lock():
+            try:
+                with open(path, encoding="utf-8") as f:
+                    dead = _load_snapshot(json.load(f))
+            except FileNotFoundError:
+                return
+            except ValueError:
+                dead = None
+
+            if dead is not None:
+                total = _Shard()
+                try:
+                    with open(archive, encoding="utf-8") as f:
+                        total.histograms, total.counters, _ = _load_snapshot(
+                            json.load(f)
+                        )
+                except (OSError, ValueError):
+                    pass
+                retired = _Shard()
+                retired.histograms, retired.counters, _ = dead
+                total.merge(retired)
+                _write_json(archive, _dump_snapshot(total.histograms, total.counters))
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def collect(self):
+        """合并本进程与共享目录中其他进程的数据"""
+        histograms, counters = self.snapshot()
+        gauges = list(self.gauges())
+        if not self.multiprocess_dir:
+            return histograms, counters, gauges
+
+        own = f"{file_prefix}{os.getpid()}.json"
+        files = []
+        for filename in os.listdir(self.multiprocess_dir):
+            if not filename.startswith(file_prefix) or not filename.endswith(".json"):
+                continue
+            pid = filename[len(file_prefix) : -len(".json")]
+            if pid.isdigit() and filename != own and not _pid_alive(int(pid)):
+                self._retire_worker(filename)
+            else:
+                files.append(filename)
+
+        total = _Shard()
+        total.histograms, total.counters = histograms, counters
+        # 合并已退出的 worker 后再读取 dead_file
+        if dead_file not in files:
+            files.append(dead_file)
+        for filename in files:
+            if filename == own:
+                continue
+            try:
+                with open(
+                    os.path.join(self.multiprocess_dir, filename), encoding="utf-8"
+                ) as f:
+                    other = _Shard()
+                    other.histograms, other.counters, other_gauges = _load_snapshot(
+                        json.load(f)
+                    )
+            except (OSError, ValueError):
+                continue
+            total.merge(other)
+            gauges.extend(other_gauges)
+        return histograms, counters, gauges
+
+    def add_engine(self, name, engine):
+        self.engines[name] = engine
+
+    def gauges(self):
+        pid = str(os.getpid())
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            labels = (("bind", name), ("pid", pid))
+            for gauge in ("size", "checkedin", "checkedout", "overflow"):
+                value = getattr(pool, gauge, None)
+                if callable(value):
+                    try:
+                        value = value()
+                    except (NotImplementedError, AttributeError):
+                        continue
+                if not isinstance(value, int):
+                    continue
+                yield f"pool_{gauge}", labels, value
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        items = list(labels) + list(extra)
+        if not items:
+            return ""
+        text = ",".join(
+            '{}="{}"'.format(
+                key,
+                str(value)
+                .replace("\\", "\\\\")
+                .replace('"', '\\"')
+                .replace("\n", "\\n"),
+            )
+            for key, value in items
+        )
+        return "{" + text + "}"
+
+    def render(self):
+        histograms, counters, gauges = self.collect()
+        lines = []
+
+        for name in sorted({name for name, _ in histograms}):
+            full = f"{metric_prefix}{name}"
+            lines.append(f"# HELP {full} {histogram_help.get(name, name)}")
+            lines.append(f"# TYPE {full} histogram")
+            for (_name, labels), values in sorted(histograms.items()):
+                if _name != name:
+                    continue
+                cumulative = 0
+                for bucket, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                    cumulative += count
+                    le = bucket if bucket == "+Inf" else repr(float(bucket))
+                    lines.append(
+                        f"{full}_bucket{self._labels(labels, (('le', le),))} {cumulative}"
+                    )
+                lines.append(f"{full}_sum{self._labels(labels)} {values[-1]}")
+                lines.append(f"{full}_count{self._labels(labels)} {cumulative}")
+
+        for name in sorted({name for name, _ in counters}):
+            full = f"{metric_prefix}{name}"
+            lines.append(f"# TYPE {full} counter")
+            for (_name, labels), value in sorted(counters.items()):
+                if _name == name:
+                    lines.append(f"{full}{self._labels(labels)} {value}")
+
+        for name in sorted({name for name, _, _ in gauges}):
+            full = f"{metric_prefix}{name}"
+            lines.append(f"# TYPE {full} gauge")
+            for _name, labels, value in gauges:
+                if _name == name:
+                    lines.append(f"{full}{self._labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def init_app(self, app, path):
+        def __metrics():
+            return Response(self.render(), mimetype="text/plain; version=0.0.4")
+
+        app.add_url_rule(path, "_crud_api_metrics", __metrics)
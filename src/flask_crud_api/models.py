@@ -1,11 +1,23 @@
 import datetime
+import hashlib
 
-from sqlalchemy import Column, Integer, DateTime
+from sqlalchemy import Column, Integer, DateTime, String, MetaData, Table
+from sqlalchemy import inspect, select
 from sqlalchemy.orm import declarative_base
 
 
 Base = declarative_base()
 
+# 框架内部使用的表，不参与业务模型的 create_all / 迁移
+schema_metadata = MetaData()
+schema_table = Table(
+    "crud_api_schema",
+    schema_metadata,
+    Column("key", String(64), primary_key=True, comment="元数据标识"),
+    Column("fingerprint", String(64), nullable=False, comment="表结构指纹"),
+    Column("update_time", DateTime, comment="更新时间"),
+)
+
 
 class State:
     Valid = 1
@@ -49,3 +61,60 @@ class BaseModel(Base):
 # 创建数据库表
 def create_tables(engine):
     Base.metadata.create_all(engine)
+
+
+def schema_fingerprint(metadata, dialect):
+    """根据表、字段、索引定义计算表结构指纹"""
+    parts = []
+    for name in sorted(metadata.tables):
+        table = metadata.tables[name]
+        parts.append(f"table:{name}")
+        for column in table.columns:
+            parts.append(
+                "column:{}:{}:{}:{}:{}".format(
+                    column.name,
+                    column.type.compile(dialect=dialect),
+                    column.nullable,
+                    column.primary_key,
+                    column.unique,
+                )
+            )
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            parts.append(
+                "index:{}:{}:{}:{}".format(
+                    index.name,
+                    index.unique,
+                    ",".join(column.name for column in index.columns),
+                    sorted((k, str(v)) for k, v in index.dialect_kwargs.items()),
+                )
+            )
+        for fk in sorted(table.foreign_keys, key=lambda f: f.target_fullname):
+            parts.append(f"fk:{fk.parent.name}:{fk.target_fullname}")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def create_tables_if_changed(engine, metadata=None, key="default"):
+    """表结构指纹与库中记录一致时跳过 create_all，返回是否执行了建表"""
+    if metadata is None:
+        metadata = Base.metadata
+
+    fingerprint = schema_fingerprint(metadata, engine.dialect)
+    with engine.begin() as conn:
+        if inspect(conn).has_table(schema_table.name):
+            stored = conn.execute(
+                select(schema_table.c.fingerprint).where(schema_table.c.key == key)
+            ).scalar()
+            if stored == fingerprint:
+                return False
+
+        metadata.create_all(conn)
+        schema_metadata.create_all(conn)
+        conn.execute(schema_table.delete().where(schema_table.c.key == key))
+        conn.execute(
+            schema_table.insert().values(
+                key=key,
+                fingerprint=fingerprint,
+                update_time=datetime.datetime.now(),
+            )
+        )
+    return True
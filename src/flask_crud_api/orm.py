@@ -1,25 +1,94 @@
 import http
+import time
+import decimal
 import datetime
 import inspect
-from flask import g, abort
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from flask import g, abort, current_app
 from sqlalchemy import DateTime as SaDateTime
+from sqlalchemy import Numeric as SaNumeric
 from sqlalchemy.engine import row
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import ONETOMANY, Session, selectinload
 from sqlalchemy import select, Select
-from sqlalchemy import func
+from sqlalchemy import false, func, literal_column, tuple_, update
 
-from flask_crud_api import utils
-from flask_crud_api.models import State, orm_default_exclude
+from flask_crud_api.coalesce import get_coalescer
+from flask_crud_api.instrument import current_stats, record_rows
+from flask_crud_api.models import BaseModel, State, orm_default_exclude
 from flask_crud_api.response import ok_response
+from flask_crud_api.shard import get_shards, shard_key
+from flask_crud_api.writer import get_writer
+
+
+def get_session_factory():
+    """当前应用的会话工厂，不在应用上下文中时使用最近初始化的 CrudApi"""
+    from flask_crud_api import api
+
+    crud_api = api.current_crud_api()
+    if crud_api is not None:
+        return crud_api.session_factory
+    return api.session_factory
 
 
 def get_session() -> Session:
     try:
         return g.session
-    except RuntimeError:
-        from api import session_factory
+    except (RuntimeError, AttributeError):
+        # 不在请求上下文中(任务、命令行等)
+        return get_session_factory()()
+
+
+@contextmanager
+def session_scope():
+    """请求上下文之外使用的会话，正常退出时提交，异常时回滚，最终归还连接"""
+    session_factory = get_session_factory()
+    session = session_factory()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+        if hasattr(session_factory, "remove"):
+            session_factory.remove()
+
+
+def batch_hook(func=None, *, parallel=False):
+    """标记整页执行的序列化钩子 hook(results, instances, exclude)，返回 None 时视为原地修改"""
+
+    def decorator(func):
+        func.batch = True
+        func.parallel = parallel
+        return func
+
+    if func is None:
+        return decorator
+    return decorator(func)
+
+
+def is_batch_hook(hook):
+    return getattr(hook, "batch", False)
+
+
+_hook_executors = {}
+_hook_executors_lock = threading.Lock()
 
-        return session_factory()
+
+def _hook_executor(workers):
+    executor = _hook_executors.get(workers)
+    if executor is None:
+        with _hook_executors_lock:
+            executor = _hook_executors.get(workers)
+            if executor is None:
+                executor = _hook_executors[workers] = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="crud_api_hook"
+                )
+    return executor
 
 
 def get_valid_stmt(key, stmt: Select) -> Select:
@@ -40,6 +109,82 @@ def get_delete_key(model_class):
     return delete_key
 
 
+def nested_tree(paths, max_depth=None):
+    """("books", "books.tags") -> {"books": {"tags": {}}}"""
+    tree = {}
+    for path in paths:
+        names = path.split(".")
+        if max_depth is not None and len(names) > max_depth:
+            raise Exception(f"nested path too deep: {path} (max depth {max_depth})")
+        node = tree
+        for name in names:
+            node = node.setdefault(name, {})
+    return tree
+
+
+def view_nested_tree(view):
+    """视图声明的嵌套关系树，超过 view_nested_depth 层时抛出异常"""
+    return nested_tree(
+        getattr(view, "view_nested", None) or (),
+        getattr(view, "view_nested_depth", None),
+    )
+
+
+def nested_limit_criteria(relationship, limit):
+    """一对多关系每个父对象只加载前 limit 个子对象，不支持的关系返回 None
+
+    child.pk IN (SELECT pk FROM child AS c WHERE c.fk = child.fk ORDER BY ... LIMIT n)
+    """
+    if relationship.direction is not ONETOMANY or relationship.secondary is not None:
+        return None
+    target = relationship.mapper.class_
+    table = target.__table__
+    alias = table.alias()
+    where = [
+        alias.c[remote.key] == remote for _, remote in relationship.local_remote_pairs
+    ]
+    if hasattr(target, "state"):
+        where.append(alias.c.state == State.Valid)
+    order_by = [
+        alias.c[column.key]
+        for column in relationship.order_by or ()
+        if getattr(column, "table", None) is table
+    ] or [alias.c.pk]
+    subquery = select(alias.c.pk).where(*where).order_by(*order_by).limit(limit)
+    return target.pk.in_(subquery.correlate(table))
+
+
+def get_nested_options(model_class, tree, parent=None, limit=None):
+    """按嵌套声明生成 selectinload 选项，每个关系每页只额外执行一次查询
+
+    limit 不为空时一对多关系在 SQL 中限制每个父对象的子对象数量
+    """
+    options = []
+    for name, children in tree.items():
+        relationship = sa_inspect(model_class).relationships.get(name)
+        if relationship is None:
+            raise Exception(f"{model_class.__name__} has no relationship {name}")
+
+        attr = getattr(model_class, name)
+        target = relationship.mapper.class_
+        criteria = []
+        if hasattr(target, "state"):
+            criteria.append(target.state == State.Valid)
+        if limit is not None:
+            limit_criteria = nested_limit_criteria(relationship, limit)
+            if limit_criteria is not None:
+                criteria.append(limit_criteria)
+        if criteria:
+            attr = attr.and_(*criteria)
+        loader = selectinload(attr) if parent is None else parent.selectinload(attr)
+
+        if children:
+            options.extend(get_nested_options(target, children, loader, limit))
+        else:
+            options.append(loader)
+    return options
+
+
 class Orm:
 
     def get_queryset(self, *model_class) -> Select:
@@ -52,31 +197,80 @@ class Orm:
         stmt = select(func.count(model_class[0].pk))
         delete_key = get_delete_key(model_class[0])
         stmt = get_valid_stmt(delete_key, stmt)
+        # 供过滤器区分计数查询，例如计数时不需要排序
+        return stmt.execution_options(crud_api_count=True)
+
+    def get_queryset_columns(self, model_class, *columns) -> Select:
+        stmt = select(*columns).select_from(model_class)
+        delete_key = get_delete_key(model_class)
+        stmt = get_valid_stmt(delete_key, stmt)
         return stmt
 
-    def execute_all(self, query: Select, scalers=True):
+    @staticmethod
+    def get_shards(obj=None, query=None):
+        """涉及分片模型时返回 (ShardSet, model)，否则返回 (None, None)"""
+        shards = get_shards()
+        if shards is None:
+            return None, None
+        if obj is not None:
+            return (shards, type(obj)) if shard_key(type(obj)) else (None, None)
+        model = shards.statement_model(query)
+        return (shards, model) if model is not None else (None, None)
+
+    @staticmethod
+    def execute_read(query: Select, mode):
+        """只读查询，mode 为 scalars / rows / scalar；开启 DB_COALESCE 时合并相同的并发查询"""
+        coalescer = get_coalescer()
         with get_session() as session:
-            if scalers:
+            if coalescer is not None:
+                return coalescer.execute(session, query, mode)
+            if mode == "scalars":
                 return session.execute(query).scalars().all()
-            else:
+            if mode == "rows":
                 return session.execute(query).all()
+            return session.execute(query).scalar()
+
+    def execute_all(self, query: Select, scalers=True):
+        shards, model = self.get_shards(query=query)
+        if shards is not None:
+            result = shards.execute_all(model, query, scalers)
+        else:
+            result = self.execute_read(query, "scalars" if scalers else "rows")
+        record_rows(len(result))
+        return result
 
     def execute_one_or_none(self, query: Select, none_raise=False, scalers=True):
-        with get_session() as session:
-            if scalers:
-                queryset = session.execute(query).scalars().one_or_none()
-            else:
-                queryset = session.execute(query).one_or_none()
-            if none_raise and not queryset:
-                raise abort(http.HTTPStatus.NOT_FOUND)
-            return queryset
+        shards, model = self.get_shards(query=query)
+        if shards is not None:
+            queryset = shards.execute_one_or_none(model, query, scalers)
+        else:
+            with get_session() as session:
+                if scalers:
+                    queryset = session.execute(query).scalars().one_or_none()
+                else:
+                    queryset = session.execute(query).one_or_none()
+        record_rows(0 if queryset is None else 1)
+        if none_raise and not queryset:
+            raise abort(http.HTTPStatus.NOT_FOUND)
+        return queryset
 
     def execute_add_all(self, objs):
+        shards, _ = self.get_shards(obj=objs[0]) if objs else (None, None)
+        if shards is not None:
+            shards.add_all(objs)
+            return
         with get_session() as session:
             session.add_all(objs)
             session.commit()
 
     def execute_add(self, obj):
+        shards, _ = self.get_shards(obj=obj)
+        if shards is not None:
+            shards.add_all([obj], refresh=True)
+            return obj
+        writer = get_writer()
+        if writer is not None:
+            return writer.add(obj)
         with get_session() as session:
             session.add(obj)
             session.commit()
@@ -84,15 +278,266 @@ class Orm:
         return obj
 
     def execute_delete(self, obj):
+        setattr(obj, "state", State.Invalid)
+        setattr(obj, "delete_time", datetime.datetime.now())
+        shards, _ = self.get_shards(obj=obj)
+        if shards is not None:
+            shards.add_all([obj])
+            return
+        writer = get_writer()
+        if writer is not None:
+            writer.add(obj)
+            return
         with get_session() as session:
-            setattr(obj, "state", State.Invalid)
-            setattr(obj, "delete_time", datetime.datetime.now())
             session.add(obj)
             session.commit()
 
-    def count(self, query: Select):
+    def execute_upsert(self, model_class, keys, rows, revive=False, chunk_size=500):
+        """按唯一键 INSERT ... ON CONFLICT DO UPDATE，返回 (created, updated, skipped)
+
+        revive 为 False 时不修改已软删除的数据，计为 skipped。新增、更新的数量由 RETURNING 得出；
+        模型有汇总表或变更推送订阅者时同时写入汇总差量、记录变更事件
+        """
+        from flask_crud_api.events import events_key, get_broker
+        from flask_crud_api.summary import apply_deltas, summaries
+
+        if self.get_shards(query=select(model_class))[0] is not None:
+            raise Exception("upsert is not supported for sharded models")
+
+        table = model_class.__table__
+        key_columns = [table.c[key] for key in keys]
+        targets = [
+            summary
+            for summary in summaries.values()
+            if issubclass(model_class, summary.model)
+        ]
+        broker = get_broker()
+        publish = broker is not None and broker.wants(model_class)
+        created = updated = skipped = 0
+        deltas = {}
         with get_session() as session:
-            return session.execute(query).scalar()
+            dialect = session.get_bind(clause=table).dialect
+            if dialect.name == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            elif dialect.name == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                raise Exception(f"upsert is not supported on {dialect.name}")
+            if not dialect.insert_returning:
+                raise Exception("upsert requires RETURNING (SQLite 3.35+)")
+
+            if dialect.name == "sqlite":
+                # 先获取写锁，之后到提交前不会有其他写入；新增的主键一定大于当前最大值
+                session.execute(update(table).where(false()).values(pk=table.c.pk))
+                max_pk = session.execute(select(func.max(table.c.pk))).scalar() or 0
+                is_created = literal_column(f"{table.c.pk.name} > {int(max_pk)}")
+            else:
+                # 新插入的行 xmax 为 0
+                is_created = literal_column("xmax = 0")
+            is_created = is_created.label("crud_api_created")
+
+            for offset in range(0, len(rows), chunk_size):
+                chunk = rows[offset : offset + chunk_size]
+                previous = {}
+                if targets or publish:
+                    # 汇总差量需要更新前的值，PostgreSQL 锁定这些行直到提交
+                    key_values = [tuple(row[key] for key in keys) for row in chunk]
+                    condition = (
+                        key_columns[0].in_([values[0] for values in key_values])
+                        if len(keys) == 1
+                        else tuple_(*key_columns).in_(key_values)
+                    )
+                    query = select(table).where(condition)
+                    if dialect.name == "postgresql":
+                        query = query.with_for_update()
+                    for item in session.execute(query).mappings():
+                        previous[tuple(item[key] for key in keys)] = dict(item)
+
+                # 同一条语句中的行需要相同的字段
+                groups = {}
+                for row in chunk:
+                    groups.setdefault(tuple(sorted(row)), []).append(row)
+                for columns, group in groups.items():
+                    stmt = dialect_insert(table).values(group)
+                    set_ = {
+                        column: stmt.excluded[column]
+                        for column in columns
+                        if column not in keys and column != "create_time"
+                    }
+                    if revive:
+                        set_["state"] = State.Valid
+                        set_["delete_time"] = None
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=key_columns,
+                        set_=set_,
+                        where=None if revive else table.c.state == State.Valid,
+                    ).returning(*table.columns, is_created)
+
+                    returned = session.execute(stmt).mappings().all()
+                    skipped += len(group) - len(returned)
+                    for item in returned:
+                        item = dict(item)
+                        new = item.pop("crud_api_created")
+                        old = previous.get(tuple(item[key] for key in keys))
+                        if new:
+                            created += 1
+                        else:
+                            updated += 1
+                        for summary in targets:
+                            if not new and old is not None:
+                                contribution = summary.contribution(old)
+                                summary.add_delta(deltas, contribution, -1)
+                            summary.add_delta(deltas, summary.contribution(item))
+                        if publish:
+                            instance = model_class(**item)
+                            session.info.setdefault(events_key, []).append(
+                                (
+                                    model_class,
+                                    {
+                                        "event": "create" if new else "update",
+                                        "pk": item["pk"],
+                                        "data": instance.to_dict(),
+                                    },
+                                )
+                            )
+            apply_deltas(session, deltas)
+            session.commit()
+        return created, updated, skipped
+
+    def count(self, query: Select):
+        shards, model = self.get_shards(query=query)
+        if shards is not None:
+            return shards.count(model, query)
+        return self.execute_read(query, "scalar")
+
+
+def _coerce_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.lower() in ("1", "0", "true", "false"):
+        return value.lower() in ("1", "true")
+    raise ValueError(value)
+
+
+def _coerce_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    if not isinstance(value, str):
+        raise ValueError(value)
+    # fromisoformat 兼容 "%Y-%m-%d %H:%M:%S"，并支持 T 分隔与微秒
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.datetime.fromisoformat(value)
+
+
+def _coerce_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    if not isinstance(value, str):
+        raise ValueError(value)
+    return datetime.date.fromisoformat(value)
+
+
+def _coerce_decimal(value):
+    if isinstance(value, decimal.Decimal):
+        return value
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(value)
+    return decimal.Decimal(str(value))
+
+
+def _coerce_str(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool) or not isinstance(value, (int, float, decimal.Decimal)):
+        raise ValueError(value)
+    return str(value)
+
+
+def _coerce_int(value):
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(value)
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(value)
+    return int(value)
+
+
+def _coerce_float(value):
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(value)
+    return float(value)
+
+
+def column_coercer(column):
+    """按字段类型选择转换函数，无法确定类型时原样返回"""
+    column_type = column.type
+    if isinstance(column_type, SaDateTime):
+        return _coerce_datetime
+    if isinstance(column_type, SaNumeric) and column_type.asdecimal:
+        return _coerce_decimal
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        return None
+    return {
+        bool: _coerce_bool,
+        int: _coerce_int,
+        float: _coerce_float,
+        decimal.Decimal: _coerce_decimal,
+        str: _coerce_str,
+        datetime.datetime: _coerce_datetime,
+        datetime.date: _coerce_date,
+    }.get(python_type)
+
+
+class Deserializer:
+    """按模型编译一次的反序列化器，每个字段对应一个类型转换函数"""
+
+    readonly_fields = frozenset(
+        ("pk", "create_time", "update_time", "delete_time", "state")
+    )
+    _compiled = {}
+
+    def __init__(self, model_class):
+        self.model_class = model_class
+        # key -> (转换函数, 是否文本字段)
+        self.fields = {}
+        for column in model_class.__table__.columns:
+            coercer = column_coercer(column)
+            self.fields[column.key] = (coercer, coercer is _coerce_str)
+
+    @classmethod
+    def for_model(cls, model_class):
+        deserializer = cls._compiled.get(model_class)
+        if deserializer is None:
+            deserializer = cls._compiled[model_class] = cls(model_class)
+        return deserializer
+
+    def load(self, instance, data, strict=False):
+        """只读字段返回 400；strict 时未知字段返回 400，否则忽略未知字段"""
+        fields = self.fields
+        for key, value in data.items():
+            field = fields.get(key)
+            if field is None:
+                if strict:
+                    return abort(400, f"unknown field: {key}")
+                continue
+            if key in self.readonly_fields:
+                return abort(400, f"readonly field: {key}")
+
+            coercer, is_text = field
+            # 表单中的空字符串视为空值
+            if value is None or (value == "" and not is_text):
+                value = None
+            elif coercer is not None:
+                try:
+                    value = coercer(value)
+                except (TypeError, ValueError, ArithmeticError):
+                    return abort(400, f"invalid value for {key}: {value}")
+            setattr(instance, key, value)
+        return instance
 
 
 class Serializer:
@@ -107,16 +552,21 @@ class Serializer:
         if inspect.isclass(model):
             model = model()
 
-        columns = model.metadata.tables.get(model.__tablename__).columns
-        column_types = {column.key: column.type for column in columns}
-        for key, value in serializer.items():
-            if key in column_types:
-                setattr(model, key, value)
-                if isinstance(column_types[key], SaDateTime):
-                    setattr(model, key, utils.str2datetime(value))
-        return model
+        strict = getattr(self.view, "serializer_strict", False)
+        return Deserializer.for_model(type(model)).load(model, serializer, strict)
 
     def to_serializer(self, query, count=1, hooks=None, exclude=None):
+        stats = current_stats()
+        if stats is None:
+            return self._to_serializer(query, count, hooks, exclude)
+
+        start = time.perf_counter()
+        try:
+            return self._to_serializer(query, count, hooks, exclude)
+        finally:
+            stats.serialize_time += time.perf_counter() - start
+
+    def _to_serializer(self, query, count=1, hooks=None, exclude=None):
         if hooks is None:
             hooks = self.view.serializer_hooks
 
@@ -126,6 +576,14 @@ class Serializer:
         if not isinstance(query, (list, tuple)):
             query = [query]
 
+        nested = view_nested_tree(self.view)
+
+        columnar = self.get_format() == "columnar"
+        if columnar and not hooks and not nested:
+            data = self._to_columnar(query, exclude)
+            if data is not None:
+                return ok_response({"count": count, **data})
+
         result = []
         for _query in query:
             if isinstance(_query, (row.Row)):
@@ -134,12 +592,20 @@ class Serializer:
                     _dict[_dict_] = self._instance_2_dict(_dict[_dict_], exclude)
             else:
                 _dict = self._instance_2_dict(_query, exclude)
-
-            for hook in hooks:
-                _dict = hook(_dict, exclude)
-
+                if nested:
+                    self._nested_2_dict(_query, _dict, nested, exclude)
             result.append(_dict)
 
+        for group in self._hook_groups(hooks):
+            if len(group) > 1:
+                result = self._run_parallel_hooks(group, result, query, exclude)
+            elif is_batch_hook(group[0]):
+                result = self._run_batch_hook(group[0], result, query, exclude)
+            else:
+                result = [group[0](_dict, exclude) for _dict in result]
+
+        if columnar:
+            return ok_response({"count": count, **self._records_2_columnar(result)})
         return ok_response(
             {
                 "count": count,
@@ -147,6 +613,125 @@ class Serializer:
             }
         )
 
+    def get_format(self):
+        get_format = getattr(self.view, "get_serializer_format", None)
+        return "records" if get_format is None else get_format()
+
+    def model_columns(self, exclude=None):
+        """columnar 格式可直接输出的字段，模型覆盖了 to_dict 时为 None"""
+        if exclude is None:
+            exclude = orm_default_exclude
+
+        model = getattr(self.view, "model", None)
+        if model is None or getattr(model, "to_dict", None) is not BaseModel.to_dict:
+            return None
+        return [
+            column.name
+            for column in model.__table__.columns
+            if column.name not in exclude
+        ]
+
+    def _to_columnar(self, query, exclude=None):
+        # 不构建每行的字典，直接按字段输出行数据，无法直接输出时返回 None
+        if exclude is None:
+            exclude = orm_default_exclude
+
+        columns = self.model_columns(exclude)
+        if query and all(isinstance(item, row.Row) for item in query):
+            if any(hasattr(value, "_sa_instance_state") for value in query[0]):
+                return None
+            # 与 _instance_2_dict 一致，排除 state、delete_time 等字段
+            fields = query[0]._fields
+            index = [idx for idx, key in enumerate(fields) if key not in exclude]
+            return {
+                "columns": [fields[idx] for idx in index],
+                "rows": [[item[idx] for idx in index] for item in query],
+            }
+        if columns is None:
+            return None
+        model = self.view.model
+        if any(type(item) is not model for item in query):
+            return None
+        return {
+            "columns": columns,
+            "rows": [[getattr(item, column) for column in columns] for item in query],
+        }
+
+    @staticmethod
+    def _records_2_columnar(result):
+        # 钩子可能增加字段，按出现顺序合并所有行的字段
+        columns = list(dict.fromkeys(key for item in result for key in item))
+        return {
+            "columns": columns,
+            "rows": [[item.get(column) for column in columns] for item in result],
+        }
+
+    @staticmethod
+    def _hook_groups(hooks):
+        # 相邻的 parallel 批量钩子合并为一组并发执行，其余钩子按声明顺序逐个执行
+        groups = []
+        for hook in hooks:
+            if (
+                groups
+                and getattr(hook, "parallel", False)
+                and getattr(groups[-1][-1], "parallel", False)
+            ):
+                groups[-1].append(hook)
+            else:
+                groups.append([hook])
+        return groups
+
+    @staticmethod
+    def _run_batch_hook(hook, result, instances, exclude):
+        _result = hook(result, instances, exclude)
+        return result if _result is None else _result
+
+    def _run_parallel_hooks(self, hooks, result, instances, exclude):
+        workers = getattr(self.view, "serializer_hook_workers", 0)
+        if workers <= 1:
+            for hook in hooks:
+                result = self._run_batch_hook(hook, result, instances, exclude)
+            return result
+
+        app = current_app._get_current_object()
+
+        def run(hook):
+            # 工作线程中没有请求上下文，get_session 会退回到独立的会话
+            with app.app_context():
+                return hook(result, instances, exclude)
+
+        executor = _hook_executor(workers)
+        for _result in list(executor.map(run, hooks)):
+            if _result is not None and _result is not result:
+                raise Exception("parallel batch hooks must modify results in place")
+        return result
+
+    def _nested_2_dict(self, instance, _dict, tree, exclude=None):
+        limit = getattr(self.view, "view_nested_limit", None)
+        unloaded = sa_inspect(instance).unloaded
+        for name, children in tree.items():
+            # 未预加载的关系(如新增、更新后返回的实例)不触发懒加载
+            if name in unloaded:
+                continue
+
+            value = getattr(instance, name)
+            if value is None:
+                _dict[name] = None
+                continue
+            if not isinstance(value, (list, tuple, set)):
+                _dict[name] = self._instance_2_dict(value, exclude)
+                if children:
+                    self._nested_2_dict(value, _dict[name], children, exclude)
+                continue
+
+            items = []
+            for child in list(value)[:limit]:
+                child_dict = self._instance_2_dict(child, exclude)
+                if children:
+                    self._nested_2_dict(child, child_dict, children, exclude)
+                items.append(child_dict)
+            _dict[name] = items
+
     def _instance_2_dict(self, query, exclude=None):
         if exclude is None:
             exclude = orm_default_exclude
@@ -0,0 +1,55 @@
+from sqlalchemy.orm import scoped_session
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.util import queue as sqla_queue
+
+
+class GreenletQueue:
+    """基于 gevent.queue 的连接队列，连接耗尽时在协程间排队等待而不是阻塞线程"""
+
+    def __init__(self, maxsize=0, use_lifo=False):
+        from gevent import queue
+
+        self.maxsize = maxsize
+        self.use_lifo = use_lifo
+        queue_class = queue.LifoQueue if use_lifo else queue.Queue
+        self._queue = queue_class(maxsize if maxsize > 0 else None)
+
+    def empty(self):
+        return self._queue.empty()
+
+    def full(self):
+        return self._queue.full()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def put(self, item, block=True, timeout=None):
+        from gevent import queue
+
+        try:
+            self._queue.put(item, block, timeout)
+        except queue.Full:
+            raise sqla_queue.Full()
+
+    def get(self, block=True, timeout=None):
+        from gevent import queue
+
+        try:
+            return self._queue.get(block, timeout)
+        except queue.Empty:
+            raise sqla_queue.Empty()
+
+
+class GreenletQueuePool(QueuePool):
+    """gevent 下的有界连接池，超过 pool_size + max_overflow 的请求按顺序等待 timeout 秒"""
+
+    _queue_class = GreenletQueue
+
+
+def greenlet_scoped_session(session_factory):
+    """按协程隔离的会话，协程结束时会话随 gevent.local 一起释放"""
+    from gevent.local import local
+
+    session = scoped_session(session_factory)
+    session.registry.registry = local()
+    return session
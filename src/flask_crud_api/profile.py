@@ -0,0 +1,83 @@
+import os
+import re
+import sys
+import json
+import time
+import subprocess
+from contextlib import contextmanager
+
+# 重量级的可选依赖，只有在真正用到时才应该被导入
+optional_modules = ("openpyxl", "flask_migrate", "alembic")
+
+_import_time_re = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$")
+
+
+class StartupProfile:
+
+    def __init__(self):
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, (time.perf_counter() - start) * 1000))
+
+    def report(self):
+        # 带 "." 的为子阶段，已包含在父阶段耗时中
+        total = sum(ms for name, ms in self.phases if "." not in name)
+        return {
+            "total_ms": round(total, 3),
+            "phases": [{"name": name, "ms": round(ms, 3)} for name, ms in self.phases],
+            "loaded_optional_modules": [
+                module for module in optional_modules if module in sys.modules
+            ],
+        }
+
+
+def import_profile(module="flask_crud_api.view", top=15):
+    """在干净的子进程中以 -X importtime 导入模块，统计冷启动导入耗时(微秒)"""
+    env = dict(
+        os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path)
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+
+    entries = []
+    total = 0
+    for line in proc.stderr.splitlines():
+        match = _import_time_re.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, _, name = match.groups()
+        entries.append(
+            {
+                "module": name,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            }
+        )
+        if name == module:
+            total = int(cumulative_us)
+
+    entries.sort(key=lambda entry: entry["cumulative_us"], reverse=True)
+    return {
+        "module": module,
+        "total_us": total,
+        "optional_modules": [
+            entry["module"] for entry in entries if entry["module"] in optional_modules
+        ],
+        "top": entries[:top],
+    }
+
+
+if __name__ == "__main__":
+    _module = sys.argv[1] if len(sys.argv) > 1 else "flask_crud_api.view"
+    print(json.dumps(import_profile(_module), indent=2))
@@ -0,0 +1,99 @@
+import re
+import sys
+import functools
+
+from sqlalchemy import String, and_, event, func
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # python < 3.11
+    import sre_parse
+
+# 已编译正则的缓存上限
+pattern_cache_size = 256
+
+
+@functools.lru_cache(maxsize=pattern_cache_size)
+def compile_pattern(pattern):
+    return re.compile(pattern)
+
+
+def sqlite_regexp(pattern, value):
+    if value is None:
+        return None
+    return compile_pattern(pattern).search(value) is not None
+
+
+def register_regexp(engine):
+    """替换 sqlite 默认的 REGEXP 函数，复用已编译的正则，需在建立第一个连接前调用"""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function("regexp", 2, sqlite_regexp, deterministic=True)
+
+
+def _literal_runs(items):
+    """顶层连续的字面量片段，返回 [(起始位置, 文本)]"""
+    runs = []
+    start, chars = None, []
+    for idx, (op, av) in enumerate(items):
+        if op is sre_parse.LITERAL:
+            if start is None:
+                start = idx
+            chars.append(chr(av))
+            continue
+        if chars:
+            runs.append((start, "".join(chars)))
+        start, chars = None, []
+    if chars:
+        runs.append((start, "".join(chars)))
+    return runs
+
+
+def regexp_hints(pattern):
+    """从正则中提取必须出现的字面量: (前缀, 最长子串)，无法提取时为 None"""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return None, None
+
+    flags = parsed.state.flags
+    if flags & (re.IGNORECASE | re.VERBOSE):
+        return None, None
+
+    items = list(parsed)
+    # 顶层存在分支 (a|b) 时 parse 结果为单个 BRANCH，不会产生字面量片段
+    runs = _literal_runs(items)
+    if not runs:
+        return None, None
+
+    prefix = None
+    anchored = (
+        items
+        and items[0][0] is sre_parse.AT
+        and items[0][1] in (sre_parse.AT_BEGINNING, sre_parse.AT_BEGINNING_STRING)
+    )
+    # 多行模式下 ^ 可以匹配任意行首
+    if anchored and not flags & re.MULTILINE and runs[0][0] == 1:
+        prefix = runs[0][1]
+
+    substring = max((text for _, text in runs), key=len)
+    return prefix, substring
+
+
+def regexp_prefilter(column, pattern):
+    """生成可以在 sqlite 中直接计算的预过滤条件，使大部分行无需执行正则"""
+    if not isinstance(column.type, String):
+        return []
+
+    prefix, substring = regexp_hints(pattern)
+    conditions = []
+    if prefix and ord(prefix[-1]) < sys.maxunicode:
+        # 范围条件按二进制排序比较，可以使用字段上的索引
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        conditions.append(and_(column >= prefix, column < upper))
+    if substring and substring != prefix and len(substring) > 1:
+        conditions.append(func.instr(column, substring) > 0)
+    return conditions
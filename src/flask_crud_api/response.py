@@ -12,3 +12,11 @@ def ok_response(data, msg="ok"):
 
 def bad_response(data, msg="bad"):
     return _response(data, msg, 400)
+
+
+def decode_columnar(data):
+    """将 columnar 格式的响应 (或其中的 data) 还原为每行一个字典的列表"""
+    if "data" in data and isinstance(data["data"], dict):
+        data = data["data"]
+    columns = data["columns"]
+    return [dict(zip(columns, row)) for row in data["rows"]]
@@ -3,6 +3,9 @@ import http
 from flask import Flask, Blueprint, request, current_app, abort
 from collections import UserDict
 
+from flask_crud_api.fulltext import provision_view_fulltext
+from flask_crud_api.indexes import provision_view_indexes
+
 
 def is_extra_action(attr):
     return hasattr(attr, "mapping") and isinstance(attr.mapping, MethodMapper)
@@ -104,6 +107,19 @@ class Router:
                 provide_automatic_options,
                 **options,
             )
+        self.provision(view_cls)
+
+    def provision(self, view_cls):
+        # 蓝图需要等到注册到应用时才能拿到配置与数据库
+        if isinstance(self._app, Blueprint):
+            self._app.record_once(lambda state: self._provision(state.app, view_cls))
+        else:
+            self._provision(self._app, view_cls)
+
+    @staticmethod
+    def _provision(app, view_cls):
+        provision_view_indexes(app, view_cls)
+        provision_view_fulltext(app, view_cls)
 
     def get_actions_routers(self, view_cls):
         actions = view_cls.get_extra_actions()
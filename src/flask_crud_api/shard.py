@@ -0,0 +1,318 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import abort
+from sqlalchemy import BigInteger, Column, MetaData, String, Table
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BindParameter, UnaryExpression
+from sqlalchemy.sql.util import find_tables
+
+from flask_crud_api.instrument import child_context, current_stats
+from flask_crud_api.models import Base
+
+# 每个分片上的主键序列，主键 = 序列值 * 分片数 + 分片序号
+shard_metadata = MetaData()
+shard_sequence_table = Table(
+    "crud_api_shard_sequence",
+    shard_metadata,
+    Column("name", String(255), primary_key=True, comment="表名"),
+    Column("value", BigInteger, nullable=False, comment="当前序列值"),
+)
+
+
+def get_shards():
+    from flask_crud_api import api
+
+    crud_api = api.current_crud_api()
+    if crud_api is not None:
+        return crud_api.shards
+    return api.shards
+
+
+def shard_key(model):
+    return getattr(model, "__shard_key__", None)
+
+
+def sharded_models():
+    """table -> model，只包含声明了 __shard_key__ 的模型"""
+    return {
+        mapper.local_table: mapper.class_
+        for mapper in Base.registry.mappers
+        if shard_key(mapper.class_)
+    }
+
+
+def _sort_key(value):
+    # 与 SQLite 一致: 升序时 NULL 在前
+    return (value is not None, value)
+
+
+def merge_results(results, order_by, offset=None, limit=None):
+    """合并各分片已排序的结果，按排序条件重新排序后截取分页"""
+    rows = [row for result in results for row in result]
+    # 稳定排序，从最后一个排序条件开始依次排序
+    for clause in reversed(order_by):
+        desc = (
+            isinstance(clause, UnaryExpression) and clause.modifier is operators.desc_op
+        )
+        element = clause.element if isinstance(clause, UnaryExpression) else clause
+        key = getattr(element, "key", None) or getattr(element, "name", None)
+        if key is None:
+            return abort(400, f"can not merge order by {clause} across shards")
+        rows.sort(key=lambda row: _sort_key(getattr(row, key)), reverse=desc)
+
+    start = offset or 0
+    end = None if limit is None else start + limit
+    return rows[start:end]
+
+
+class ShardSet:
+    """按模型的 __shard_key__ 将数据分布到多个数据库
+
+    class Book(BaseModel):
+        __shard_key__ = "uid"
+    """
+
+    def __init__(self, engines):
+        self.engines = list(engines)
+        if not self.engines:
+            raise Exception("shards can not be empty")
+        self.session_factories = [sessionmaker(bind=engine) for engine in self.engines]
+        self._executor = None
+        self._models = None
+        self._mapper_count = 0
+
+    def __len__(self):
+        return len(self.engines)
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=len(self), thread_name_prefix="crud_api_shard"
+            )
+        return self._executor
+
+    def models(self):
+        # 模型可能在初始化之后才导入，映射数量变化时重新收集
+        count = len(Base.registry.mappers)
+        if self._models is None or count != self._mapper_count:
+            self._models = sharded_models()
+            self._mapper_count = count
+        return self._models
+
+    def statement_model(self, stmt):
+        models = self.models()
+        if not models:
+            return None
+        for table in find_tables(stmt, include_joins=True):
+            if table in models:
+                return models[table]
+        return None
+
+    def shard_for(self, model, value):
+        column = model.__table__.c[shard_key(model)]
+        try:
+            if column.type.python_type is int:
+                value = int(value)
+        except (NotImplementedError, TypeError, ValueError):
+            pass
+        if isinstance(value, int):
+            return value % len(self)
+        return zlib.crc32(str(value).encode("utf-8")) % len(self)
+
+    def shard_of_pk(self, pk):
+        """主键所在分片，主键不是整数时返回 None"""
+        try:
+            return int(pk) % len(self)
+        except (TypeError, ValueError):
+            return None
+
+    def shard_of_instance(self, obj):
+        # 已存在的数据按主键定位，新数据按分片键定位
+        name = f"{type(obj).__name__}.{shard_key(type(obj))}"
+        value = getattr(obj, shard_key(type(obj)))
+        if obj.pk is not None:
+            idx = self.shard_of_pk(obj.pk)
+            if value is not None and self.shard_for(type(obj), value) != idx:
+                return abort(409, f"{name} can not be moved to another shard")
+            return idx
+        if value is None:
+            return abort(400, f"{name} is required")
+        return self.shard_for(type(obj), value)
+
+    def target_shards(self, model, stmt):
+        """从 where 中顶层 AND 的分片键或主键等值、IN 条件推断目标分片"""
+        whereclause = stmt.whereclause
+        if whereclause is None:
+            return list(range(len(self)))
+
+        clauses = [whereclause]
+        if getattr(whereclause, "operator", None) is operators.and_:
+            clauses = list(whereclause.clauses)
+
+        table = model.__table__
+        targets = None
+        for clause in clauses:
+            left = getattr(clause, "left", None)
+            right = getattr(clause, "right", None)
+            if getattr(left, "table", None) is not table:
+                continue
+            if not isinstance(right, BindParameter):
+                continue
+            if clause.operator is operators.eq:
+                values = [right.effective_value]
+            elif clause.operator is operators.in_op:
+                values = list(right.effective_value or ())
+            else:
+                continue
+
+            if left.name == shard_key(model):
+                shards = {self.shard_for(model, value) for value in values}
+            elif left.name == "pk":
+                shards = {self.shard_of_pk(value) for value in values}
+                # 无法按主键定位时查询所有分片，由数据库比较决定是否匹配
+                if None in shards:
+                    continue
+            else:
+                continue
+            targets = shards if targets is None else targets & shards
+        if targets is None:
+            return list(range(len(self)))
+        return sorted(targets)
+
+    def scatter(self, shards, func):
+        """在各分片上并发执行 func(session)，按分片顺序返回结果"""
+        if len(shards) == 1:
+            return [self._run(shards[0], func)]
+        # 复制上下文，每个工作线程使用独立的统计对象，完成后合并到当前请求
+        futures, children = [], []
+        for idx in shards:
+            context, stats = child_context()
+            if stats is not None:
+                children.append(stats)
+            futures.append(self.executor.submit(context.run, self._run, idx, func))
+        try:
+            return [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.exception()
+            parent = current_stats()
+            for stats in children:
+                parent.merge(stats)
+
+    def _run(self, idx, func):
+        with self.session_factories[idx]() as session:
+            return func(session)
+
+    def execute_all(self, model, stmt, scalers=True):
+        shards = self.target_shards(model, stmt)
+        if len(shards) > 1 and stmt._group_by_clauses:
+            return abort(400, "group by across shards is not supported")
+
+        if stmt.get_execution_options().get("crud_api_count"):
+            counts = self.scatter(
+                shards, lambda session: session.execute(stmt).scalar()
+            )
+            return [sum(count or 0 for count in counts)]
+
+        limit, offset = stmt._limit, stmt._offset
+        if len(shards) > 1 and offset:
+            # 每个分片都需要返回前 offset + limit 行才能正确合并
+            stmt = stmt.offset(None)
+            if limit is not None:
+                stmt = stmt.limit(offset + limit)
+
+        def run(session):
+            result = session.execute(stmt)
+            return result.scalars().all() if scalers else result.all()
+
+        results = self.scatter(shards, run)
+        if len(shards) == 1:
+            return results[0]
+        return merge_results(results, stmt._order_by_clauses, offset, limit)
+
+    def execute_one_or_none(self, model, stmt, scalers=True):
+        shards = self.target_shards(model, stmt)
+
+        def run(session):
+            result = session.execute(stmt)
+            return result.scalars().one_or_none() if scalers else result.one_or_none()
+
+        for result in self.scatter(shards, run):
+            if result is not None:
+                return result
+        return None
+
+    def count(self, model, stmt):
+        shards = self.target_shards(model, stmt)
+        counts = self.scatter(shards, lambda session: session.execute(stmt).scalar())
+        return sum(count or 0 for count in counts)
+
+    @staticmethod
+    def ensure_sequence(session, name):
+        """序列行不存在时插入，并发插入时忽略主键冲突"""
+        table = shard_sequence_table
+        dialect = session.get_bind().dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            dialect_insert = None
+
+        if dialect_insert is not None:
+            stmt = dialect_insert(table).values(name=name, value=0)
+            session.execute(stmt.on_conflict_do_nothing(index_elements=["name"]))
+            return
+        try:
+            with session.begin_nested():
+                session.execute(insert(table).values(name=name, value=0))
+        except IntegrityError:
+            pass
+
+    def next_pk(self, session, idx, model):
+        table = shard_sequence_table
+        name = model.__tablename__
+        result = session.execute(
+            update(table).where(table.c.name == name).values(value=table.c.value + 1)
+        )
+        if not result.rowcount:
+            self.ensure_sequence(session, name)
+            session.execute(
+                update(table)
+                .where(table.c.name == name)
+                .values(value=table.c.value + 1)
+            )
+        # 同一事务中 update 之后读取，其他写入在事务提交前无法修改该行
+        value = session.execute(
+            select(table.c.value).where(table.c.name == name)
+        ).scalar()
+        return value * len(self) + idx
+
+    def add_all(self, objs, refresh=False):
+        groups = {}
+        for obj in objs:
+            groups.setdefault(self.shard_of_instance(obj), []).append(obj)
+
+        # 每个分片独立提交，不保证跨分片的原子性
+        for idx, items in groups.items():
+            with self.session_factories[idx]() as session:
+                for obj in items:
+                    if obj.pk is None:
+                        obj.pk = self.next_pk(session, idx, type(obj))
+                session.add_all(items)
+                session.commit()
+                if refresh:
+                    for obj in items:
+                        session.refresh(obj)
+        return objs
+
+    def create_tables(self):
+        tables = list(self.models())
+        for engine in self.engines:
+            Base.metadata.create_all(engine, tables=tables)
+            shard_metadata.create_all(engine)
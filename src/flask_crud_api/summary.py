@@ -0,0 +1,259 @@
+from sqlalchemy import Column, Integer, Table, delete, event, func, insert, select
+from sqlalchemy import update
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session, attributes
+
+from flask_crud_api.models import Base, State
+
+summary_table_prefix = "crud_api_summary_"
+
+# name -> Summary
+summaries = {}
+
+
+def _noop(target, value, oldvalue, initiator):
+    return value
+
+
+class Summary:
+    """按分组字段增量维护的计数与求和，随写入在同一事务中更新，读取时为单行查询
+
+    Summary("book_by_user", Book, group_by=("uid",), sums=("price",))
+    """
+
+    def __init__(self, name, model, group_by, sums=()):
+        if name in summaries:
+            raise Exception(f"summary {name} already exists")
+
+        self.name = name
+        self.model = model
+        self.group_by = tuple(group_by)
+        self.sums = tuple(sums)
+        self.fields = self.group_by + self.sums + ("state",)
+
+        model_table = model.__table__
+        self.table = Table(
+            f"{summary_table_prefix}{name}",
+            Base.metadata,
+            *[
+                Column(field, model_table.c[field].type, primary_key=True)
+                for field in self.group_by
+            ],
+            Column("count", Integer, nullable=False, default=0),
+            *[Column(f"sum_{field}", model_table.c[field].type) for field in self.sums],
+        )
+
+        # 修改前加载旧值，保证更新时可以计算差量
+        for field in self.fields:
+            event.listen(
+                getattr(model, field), "set", _noop, retval=True, active_history=True
+            )
+
+        summaries[name] = self
+        _listen()
+
+    def contribution(self, values):
+        """一行数据对汇总表的贡献: (分组键, [count, sum...])，无效数据或分组键为空时为 None"""
+        if values.get("state", State.Valid) != State.Valid:
+            return None
+        key = tuple(values[field] for field in self.group_by)
+        if any(value is None for value in key):
+            return None
+        return key, [1] + [values[field] or 0 for field in self.sums]
+
+    def current_values(self, obj):
+        return {field: getattr(obj, field) for field in self.fields}
+
+    def previous_values(self, obj):
+        values = {}
+        for field in self.fields:
+            history = attributes.get_history(obj, field)
+            if history.deleted:
+                values[field] = history.deleted[0]
+            elif history.unchanged:
+                values[field] = history.unchanged[0]
+            else:
+                values[field] = getattr(obj, field)
+        return values
+
+    def add_delta(self, deltas, contribution, sign=1):
+        if contribution is None:
+            return
+        key, values = contribution
+        delta = deltas.setdefault((self.name, key), [0] * len(values))
+        for idx, value in enumerate(values):
+            delta[idx] = delta[idx] + value * sign
+
+    def collect(self, session, deltas):
+        def add(contribution, sign):
+            self.add_delta(deltas, contribution, sign)
+
+        for obj in session.new:
+            if isinstance(obj, self.model):
+                add(self.contribution(self.current_values(obj)), 1)
+        for obj in session.dirty:
+            if isinstance(obj, self.model) and session.is_modified(obj):
+                add(self.contribution(self.previous_values(obj)), -1)
+                add(self.contribution(self.current_values(obj)), 1)
+        for obj in session.deleted:
+            if isinstance(obj, self.model):
+                add(self.contribution(self.previous_values(obj)), -1)
+
+    def apply(self, connection, key, delta):
+        table = self.table
+        row = dict(zip(self.group_by, key))
+        row["count"] = delta[0]
+        for field, value in zip(self.sums, delta[1:]):
+            row[f"sum_{field}"] = value
+
+        stmt = self.upsert(connection.dialect.name, row)
+        if stmt is not None:
+            connection.execute(stmt)
+            return
+
+        values = {"count": table.c["count"] + delta[0]}
+        for field, value in zip(self.sums, delta[1:]):
+            column = table.c[f"sum_{field}"]
+            values[column.name] = func.coalesce(column, 0) + value
+        where = [table.c[field] == value for field, value in zip(self.group_by, key)]
+        result = connection.execute(update(table).where(*where).values(values))
+        if not result.rowcount:
+            connection.execute(insert(table).values(row))
+
+    def upsert(self, dialect, row):
+        table = self.table
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+            stmt = dialect_insert(table).values(row)
+            return stmt.on_conflict_do_update(
+                index_elements=[table.c[field] for field in self.group_by],
+                set_=self._excluded_values(stmt.excluded),
+            )
+        if dialect in ("mysql", "mariadb"):
+            from sqlalchemy.dialects.mysql import insert as dialect_insert
+
+            stmt = dialect_insert(table).values(row)
+            return stmt.on_duplicate_key_update(self._excluded_values(stmt.inserted))
+        return None
+
+    def _excluded_values(self, excluded):
+        table = self.table
+        values = {"count": table.c["count"] + excluded["count"]}
+        for field in self.sums:
+            name = f"sum_{field}"
+            values[name] = func.coalesce(table.c[name], 0) + excluded[name]
+        return values
+
+    def rebuild(self, session):
+        """按原表重新计算汇总数据，用于修复绕过 ORM 写入造成的偏差"""
+        model = self.model
+        columns = [getattr(model, field) for field in self.group_by]
+        stmt = (
+            select(
+                *columns,
+                func.count(),
+                *[func.sum(getattr(model, field)) for field in self.sums],
+            )
+            .where(
+                model.state == State.Valid, *[column.is_not(None) for column in columns]
+            )
+            .group_by(*columns)
+        )
+        session.execute(delete(self.table))
+        session.execute(
+            insert(self.table).from_select(
+                [*self.group_by, "count", *[f"sum_{field}" for field in self.sums]],
+                stmt,
+            )
+        )
+
+    def get(self, session=None, **key):
+        """单行读取，不存在的分组返回 0"""
+        if session is None:
+            from flask_crud_api.orm import get_session
+
+            session = get_session()
+
+        table = self.table
+        stmt = select(table).where(
+            *[table.c[field] == key[field] for field in self.group_by]
+        )
+        row = session.execute(stmt).mappings().one_or_none()
+        if row is None:
+            result = {field: key[field] for field in self.group_by}
+            result["count"] = 0
+            result.update({f"sum_{field}": 0 for field in self.sums})
+            return result
+        return dict(row)
+
+
+def apply_deltas(session, deltas):
+    """在会话当前事务中写入汇总差量: {(name, 分组键): [count, sum...]}"""
+    connections = {}
+    for (name, key), delta in deltas.items():
+        if not any(value for value in delta):
+            continue
+        summary = summaries[name]
+        # 使用原表模型所在的 bind，与原表的写入在同一个事务中
+        connection = connections.get(summary.model)
+        if connection is None:
+            connection = connections[summary.model] = session.connection(
+                bind_arguments={"mapper": sa_inspect(summary.model)}
+            )
+        summary.apply(connection, key, delta)
+
+
+def _after_flush(session, flush_context):
+    deltas = {}
+    for summary in summaries.values():
+        summary.collect(session, deltas)
+    apply_deltas(session, deltas)
+
+
+def _after_bulk_insert(orm_execute_state):
+    # session.execute(insert(Model), [{...}, ...]) 不经过 flush
+    if not orm_execute_state.is_insert or not isinstance(
+        orm_execute_state.parameters, list
+    ):
+        return None
+
+    mapper = orm_execute_state.bind_mapper
+    targets = [
+        summary
+        for summary in summaries.values()
+        if mapper is not None and mapper.class_ is summary.model
+    ]
+    if not targets:
+        return None
+
+    result = orm_execute_state.invoke_statement()
+    deltas = {}
+    for summary in targets:
+        for params in orm_execute_state.parameters:
+            values = {field: params.get(field) for field in summary.fields}
+            values["state"] = params.get("state", State.Valid)
+            summary.add_delta(deltas, summary.contribution(values))
+
+    apply_deltas(orm_execute_state.session, deltas)
+    return result
+
+
+def _listen():
+    if event.contains(Session, "after_flush", _after_flush):
+        return
+    event.listen(Session, "after_flush", _after_flush)
+    event.listen(Session, "do_orm_execute", _after_bulk_insert)
+
+
+def rebuild_summaries(session, names=None):
+    rebuilt = []
+    for name, summary in summaries.items():
+        if names and name not in names:
+            continue
+        summary.rebuild(session)
+        rebuilt.append(name)
+    return rebuilt
@@ -1,11 +1,8 @@
 import os
+import json
+import base64
 import datetime
 
-import openpyxl
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font
-from openpyxl.styles import NamedStyle, Font, Border, Side
-
 
 def str2datetime(strs, format="%Y-%m-%d %H:%M:%S"):
     return datetime.datetime.strptime(strs, format)
@@ -15,14 +12,33 @@ def datetime2str(_datetime, format="%Y-%m-%d %H:%M:%S"):
     return _datetime.strftime(format)
 
 
+def encode_cursor(*values):
+    """将 (时间, 主键) 等值编码为不透明的游标字符串"""
+    data = [
+        value.isoformat() if isinstance(value, datetime.datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    return json.loads(raw.decode("utf-8"))
+
+
 class Excel:
     def __init__(self, filename, headers=None, width=15):
         self.filename = filename
         self.headers = headers
         self.width = width
-        self.wb: openpyxl.Workbook = None
+        self.wb: "openpyxl.Workbook" = None
         if self.headers is None:
             self.headers = []
+
+        # openpyxl 仅在导出/导入时才需要，延迟导入以加快启动
+        from openpyxl.styles import NamedStyle, Font, Border, Side
+
         self.highlight = NamedStyle(name="highlight")
         self.highlight.font = Font(bold=False, size=13.5, color="000000")
         bd = Side(style="thin", color="000000")
@@ -31,17 +47,23 @@ class Excel:
 
     @classmethod
     def from_write_excel(cls, filename, headers, width=15):
+        import openpyxl
+
         obj = cls(filename, headers, width)
         obj.wb = openpyxl.Workbook()
         return obj
 
     @classmethod
     def from_read_excel(cls, filename):
+        import openpyxl
+
         obj = cls(filename)
         obj.wb = openpyxl.load_workbook(filename)
         return obj
 
     def write(self, lines):
+        from openpyxl.utils import get_column_letter
+
         sheet = self.wb.active
         for idx in range(len(self.headers)):
             sheet.column_dimensions[get_column_letter(idx + 1)].width = self.width
@@ -1,13 +1,22 @@
+import re
 import inspect
+import datetime
+import operator
 import typing as t
 
-from flask import current_app, views, request
+from flask import Response, current_app, has_request_context, views, request
 from flask import abort
-from flask_crud_api.orm import Orm, Serializer
+from sqlalchemy import and_, func, or_, select
+from flask_crud_api import utils
+from flask_crud_api.models import State
+from flask_crud_api.orm import Orm, Serializer, column_coercer
+from flask_crud_api.orm import get_nested_options, view_nested_tree
 
 from flask_crud_api.response import ok_response
-from flask_crud_api.router import is_extra_action
-from flask_crud_api.filter import PageFilter, SearchFilter, OrderFilter
+from flask_crud_api.router import action, is_extra_action
+from flask_crud_api.filter import PageFilter, SearchFilter, OrderFilter, FullTextFilter
+from flask_crud_api.filter import coerce_value, in_condition, parse_in_values
+from flask_crud_api.regexp import compile_pattern
 
 
 class ViewRouterMixin:
@@ -56,9 +65,22 @@ class ViewMixin:
     pk = "pk"
     model = None
     view_order_fields = (("__order_pk", "asc"),)
-    view_filters = (SearchFilter, OrderFilter)
+    view_filters = (SearchFilter, OrderFilter, FullTextFilter)
     view_page = PageFilter
     serializer_hooks = ()
+    # parallel 批量钩子的并发线程数，小于等于 1 时顺序执行
+    serializer_hook_workers = 4
+    # 嵌套序列化的关系路径，如 ("books", "books.tags")
+    view_nested = ()
+    view_nested_depth = 2
+    # 每个父对象最多返回的子对象数，None 不限制
+    view_nested_limit = 100
+    # 反序列化时未知字段、只读字段返回 400
+    serializer_strict = False
+    # 默认响应格式，可通过 __format 参数切换: records 每行一个对象; columnar 字段名只出现一次
+    serializer_format = "records"
+    serializer_formats = ("records", "columnar")
+    serializer_format_arg = "__format"
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -78,6 +100,40 @@ class ViewMixin:
     def to_serializer(self, query, count=1, hooks=None, exclude=None):
         return self.serializer.to_serializer(query, count, hooks, exclude)
 
+    def get_serializer_format(self):
+        value = None
+        if has_request_context():
+            value = request.args.get(self.serializer_format_arg)
+        value = value or self.serializer_format
+        if value not in self.serializer_formats:
+            return abort(400, f"unknown format: {value}")
+        return value
+
+    def query_columns(self, stmt):
+        """columnar 格式且没有钩子、嵌套序列化时只查询输出的字段，不构建 ORM 对象"""
+        if self.get_serializer_format() != "columnar":
+            return None
+        if self.serializer_hooks or self.view_nested:
+            return None
+        descriptions = stmt.column_descriptions
+        if len(descriptions) != 1 or descriptions[0]["expr"] is not self.model:
+            return None
+
+        columns = self.serializer.model_columns()
+        if columns is None:
+            return None
+        table = self.model.__table__
+        return stmt.with_only_columns(*[table.c[column] for column in columns])
+
+    def get_request_data(self):
+        """请求体数据，支持 JSON 对象与表单"""
+        if request.is_json:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return abort(400, "a JSON object is required")
+            return data
+        return dict(request.form)
+
     def query_filter(self, stmt):
         if not self.view_filters:
             return stmt
@@ -86,6 +142,16 @@ class ViewMixin:
             stmt = view_filter().query_filter(stmt, self)
         return stmt
 
+    def query_search_filter(self, stmt):
+        """只应用 SearchFilter 及其子类的过滤条件，不排序、不分页"""
+        if not self.view_filters:
+            return stmt
+
+        for view_filter in self.view_filters:
+            if issubclass(view_filter, SearchFilter):
+                stmt = view_filter().query_filter(stmt, self)
+        return stmt
+
     def query_page_filter(self, stmt):
         if not self.view_page:
             return stmt
@@ -101,8 +167,28 @@ class ViewMixin:
 
     def get_queryset(self):
         stmt = self.orm.get_queryset(self.model)
+        stmt = self.query_nested(stmt)
         return stmt
 
+    def query_nested(self, stmt):
+        if not self.view_nested:
+            return stmt
+
+        tree = view_nested_tree(self)
+        return stmt.options(
+            *get_nested_options(self.model, tree, limit=self.get_nested_sql_limit())
+        )
+
+    def get_nested_sql_limit(self):
+        # 关联子查询中的 LIMIT，MySQL 等不支持时只在序列化时截取
+        if self.view_nested_limit is None:
+            return None
+        crud_api = current_app.extensions.get("flask_crud_api")
+        if crud_api is None:
+            return None
+        dialect = crud_api.engine_for(self.model).dialect.name
+        return self.view_nested_limit if dialect in ("sqlite", "postgresql") else None
+
     def get_pk(self, *args, **kwargs):
         if self.pk not in kwargs:
             return abort(404)
@@ -129,14 +215,18 @@ class ListViewMixin:
         stmt = self.get_queryset()
         stmt = self.query_filter(stmt)
         stmt = self.query_page_filter(stmt)
-        result = self.orm.execute_all(stmt)
+        columns_stmt = self.query_columns(stmt)
+        if columns_stmt is not None:
+            result = self.orm.execute_all(columns_stmt, scalers=False)
+        else:
+            result = self.orm.execute_all(stmt)
         return self.to_serializer(result, self.get_count())
 
 
 class CreateViewMixin:
 
     def create(self, *args, **kwargs):
-        data = dict(request.form)
+        data = self.get_request_data()
         instance = self.from_serializer(self.model, data)
         instance = self.orm.execute_add(instance)
         return self.to_serializer(instance)
@@ -154,7 +244,7 @@ class UpdateViewMixin:
     def update(self, *args, **kwargs):
         result = self.get_object_instance(*args, **kwargs)
 
-        data = dict(request.form)
+        data = self.get_request_data()
         instance = self.from_serializer(result, data)
         instance = self.orm.execute_add(instance)
         return self.to_serializer(instance)
@@ -168,6 +258,352 @@ class DestoryViewMixin:
         return ok_response("删除成功")
 
 
+class BatchRetrieveViewMixin:
+    """按主键批量获取: GET <rule>/batch?__pks=1,2,3，结果按请求顺序返回并给出不存在的主键"""
+
+    batch_pk_arg = "__pks"
+    batch_max_size = 1000
+
+    @action(url_path="batch")
+    def batch(self, *args, **kwargs):
+        column = getattr(self.model, self.pk)
+        pks = parse_in_values(column, request.args.getlist(self.batch_pk_arg))
+        if not pks:
+            return abort(400, f"{self.batch_pk_arg} is required")
+        if len(pks) > self.batch_max_size:
+            return abort(400, f"at most {self.batch_max_size} pks per request")
+
+        stmt = self.get_queryset()
+        stmt = stmt.where(in_condition(column, pks, SearchFilter.in_threshold))
+        stmt = self.query_filter(stmt)
+        instances = {
+            getattr(instance, self.pk): instance
+            for instance in self.orm.execute_all(stmt)
+        }
+
+        result = [instances[pk] for pk in pks if pk in instances]
+        response = self.to_serializer(result, len(result))
+        response["data"]["missing"] = [pk for pk in pks if pk not in instances]
+        return response
+
+
+class UpsertViewMixin:
+    """批量写入: POST <rule>/upsert，JSON 列表按 view_upsert_keys 新增或更新，?__revive 时恢复已软删除的数据"""
+
+    # 唯一键字段，数据库中需要有对应的唯一约束或唯一索引
+    view_upsert_keys = ()
+    view_upsert_revive = False
+    upsert_revive_arg = "__revive"
+    upsert_chunk_size = 500
+    upsert_max_size = 5000
+    # 不允许通过 upsert 写入的字段
+    upsert_readonly_fields = (
+        "pk",
+        "create_time",
+        "update_time",
+        "delete_time",
+        "state",
+    )
+
+    def make_upsert_row(self, item, now):
+        # 只读字段只能作为唯一键出现，不经过 from_serializer (会返回 400)
+        readonly = {}
+        for key in self.upsert_readonly_fields:
+            if key not in item:
+                continue
+            if key not in self.view_upsert_keys:
+                return abort(400, f"readonly field: {key}")
+            readonly[key] = item[key]
+        if readonly:
+            item = {k: v for k, v in item.items() if k not in readonly}
+
+        # 经过 from_serializer 转换，只取被赋值的字段
+        instance = self.from_serializer(self.model, item)
+        row = {
+            column.key: instance.__dict__[column.key]
+            for column in self.model.__table__.columns
+            if column.key in instance.__dict__
+            and column.key not in self.upsert_readonly_fields
+        }
+        for key, value in readonly.items():
+            coercer = column_coercer(self.model.__table__.columns[key])
+            try:
+                row[key] = value if coercer is None else coercer(value)
+            except (TypeError, ValueError, ArithmeticError):
+                return abort(400, f"invalid value for {key}: {value}")
+        for key in self.view_upsert_keys:
+            if row.get(key) is None:
+                return abort(400, f"upsert key {key} is required")
+        row.update(create_time=now, update_time=now, state=State.Valid)
+        return row
+
+    @action(methods=["post"], url_path="upsert")
+    def upsert(self, *args, **kwargs):
+        if not self.view_upsert_keys:
+            return abort(400, "upsert is not enabled")
+
+        data = request.get_json(silent=True)
+        if not isinstance(data, list) or not all(isinstance(i, dict) for i in data):
+            return abort(400, "a JSON list of objects is required")
+        if len(data) > self.upsert_max_size:
+            return abort(400, f"at most {self.upsert_max_size} rows per request")
+
+        # 同一唯一键出现多次时以最后一次为准
+        now = datetime.datetime.now()
+        rows = {}
+        for item in data:
+            row = self.make_upsert_row(item, now)
+            rows[tuple(row[key] for key in self.view_upsert_keys)] = row
+
+        revive = self.view_upsert_revive or self.upsert_revive_arg in request.args
+        created, updated, skipped = self.orm.execute_upsert(
+            self.model,
+            self.view_upsert_keys,
+            list(rows.values()),
+            revive=revive,
+            chunk_size=self.upsert_chunk_size,
+        )
+        return ok_response(
+            {
+                "count": len(rows),
+                "created": created,
+                "updated": updated,
+                "skipped": skipped,
+            }
+        )
+
+
+class AggregateViewMixin:
+    """分组聚合: GET <rule>/aggregate?__group_by=uid&__agg=sum:price,count:pk"""
+
+    # 允许分组的字段
+    view_group_by_fields = ()
+    # 允许的聚合，如 (("sum", "price"), ("count", "pk"))
+    view_aggregate_fields = ()
+    aggregate_max_groups = 1000
+    aggregate_functions = {
+        "count": func.count,
+        "sum": func.sum,
+        "avg": func.avg,
+        "min": func.min,
+        "max": func.max,
+    }
+
+    def get_aggregate_args(self, name):
+        values = []
+        for arg in request.args.getlist(name):
+            values.extend(value.strip() for value in arg.split(",") if value.strip())
+        return values
+
+    def make_aggregates(self):
+        aggregates = []
+        for item in self.get_aggregate_args("__agg") or [f"count:{self.pk}"]:
+            agg, _, field = item.partition(":")
+            if (
+                agg,
+                field,
+            ) not in self.view_aggregate_fields and item != f"count:{self.pk}":
+                return abort(400, f"aggregate not allowed: {item}")
+            if agg not in self.aggregate_functions or not hasattr(self.model, field):
+                return abort(400, f"invalid aggregate: {item}")
+            column = getattr(self.model, field)
+            aggregates.append(
+                self.aggregate_functions[agg](column).label(f"{agg}_{field}")
+            )
+        return aggregates
+
+    def make_group_by(self):
+        group_by = []
+        for field in self.get_aggregate_args("__group_by"):
+            if field not in self.view_group_by_fields or not hasattr(self.model, field):
+                return abort(400, f"group by not allowed: {field}")
+            group_by.append(getattr(self.model, field))
+        return group_by
+
+    @action(url_path="aggregate")
+    def aggregate(self, *args, **kwargs):
+        group_by = self.make_group_by()
+        aggregates = self.make_aggregates()
+
+        stmt = self.orm.get_queryset_columns(self.model, *group_by, *aggregates)
+        stmt = self.query_search_filter(stmt)
+        if group_by:
+            stmt = stmt.group_by(*group_by).order_by(*group_by)
+        stmt = stmt.limit(self.aggregate_max_groups)
+
+        result = self.orm.execute_all(stmt, scalers=False)
+        return self.to_serializer(result, len(result), hooks=())
+
+
+class ChangesViewMixin:
+    """增量同步: GET <rule>/changes?__since=<游标或时间>，返回之后新增、修改的数据及软删除的主键"""
+
+    changes_field = "update_time"
+    changes_page_size = 100
+    changes_max_page_size = 1000
+
+    def get_changes_since(self):
+        since = request.args.get("__since")
+        if not since:
+            return None, None
+        try:
+            return utils.str2datetime(since), None
+        except ValueError:
+            pass
+        try:
+            value, pk = utils.decode_cursor(since)
+            return datetime.datetime.fromisoformat(value), pk
+        except (ValueError, TypeError):
+            return abort(400, f"invalid cursor: {since}")
+
+    def get_changes_page_size(self):
+        try:
+            page_size = int(request.args.get("__page_size") or self.changes_page_size)
+        except ValueError:
+            return abort(400, "invalid __page_size")
+        return max(1, min(page_size, self.changes_max_page_size))
+
+    @action(url_path="changes")
+    def changes(self, *args, **kwargs):
+        field = getattr(self.model, self.changes_field)
+        pk_field = getattr(self.model, self.pk)
+        since, since_pk = self.get_changes_since()
+        page_size = self.get_changes_page_size()
+
+        # 包含软删除的数据，作为删除标记返回
+        stmt = select(self.model)
+        stmt = self.query_search_filter(stmt)
+        if since is not None and since_pk is None:
+            stmt = stmt.where(field >= since)
+        elif since is not None:
+            stmt = stmt.where(
+                or_(field > since, and_(field == since, pk_field > since_pk))
+            )
+        stmt = stmt.order_by(field, pk_field).limit(page_size + 1)
+
+        rows = self.orm.execute_all(stmt)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        changed = [row for row in rows if row.state == State.Valid]
+        deleted = [
+            {self.pk: getattr(row, self.pk), "delete_time": row.delete_time}
+            for row in rows
+            if row.state != State.Valid
+        ]
+        if rows:
+            last = rows[-1]
+            cursor = utils.encode_cursor(
+                getattr(last, self.changes_field), getattr(last, self.pk)
+            )
+        else:
+            cursor = request.args.get("__since")
+
+        response = self.to_serializer(changed, len(changed))
+        response["data"].update(
+            {"deleted": deleted, "cursor": cursor, "has_more": has_more}
+        )
+        return response
+
+
+class StreamViewMixin:
+    """SSE 变更推送: GET <rule>/stream，按视图声明的过滤字段在服务端筛选事件"""
+
+    stream_operators = {
+        "=": operator.eq,
+        "==": operator.eq,
+        "!=": operator.ne,
+        "<>": operator.ne,
+        ">": operator.gt,
+        ">=": operator.ge,
+        "<": operator.lt,
+        "<=": operator.le,
+        "in": lambda value, values: value in values,
+        "like": lambda value, pattern: pattern.fullmatch(str(value)) is not None,
+        "regexp": lambda value, pattern: pattern.search(str(value)) is not None,
+    }
+    # like / regexp 在订阅时编译，无效的正则直接返回 400
+    stream_patterns = {
+        "like": lambda arg: "(?is)"
+        + re.escape(arg).replace("%", ".*").replace("_", "."),
+        "regexp": lambda arg: arg,
+    }
+
+    def make_stream_match(self):
+        conditions = []
+        for field, op in getattr(self, "view_filter_fields", None) or ():
+            if field not in request.args or not hasattr(self.model, field):
+                continue
+            if op not in self.stream_operators:
+                return abort(400, f"operator {op} is not supported by stream")
+
+            column = getattr(self.model, field)
+            if op == "in":
+                value = set(parse_in_values(column, request.args.getlist(field)))
+            elif op in self.stream_patterns:
+                pattern = request.args[field]
+                try:
+                    value = compile_pattern(self.stream_patterns[op](pattern))
+                except re.error:
+                    return abort(400, f"invalid {op} pattern: {pattern}")
+            else:
+                value = coerce_value(column, request.args[field])
+            conditions.append((field, self.stream_operators[op], value))
+
+        if not conditions:
+            return None
+
+        def match(event):
+            data = event["data"]
+            try:
+                return all(
+                    data.get(field) is not None and compare(data[field], value)
+                    for field, compare, value in conditions
+                )
+            except TypeError:
+                return False
+
+        return match
+
+    @action(url_path="stream")
+    def stream(self, *args, **kwargs):
+        from flask_crud_api import api
+
+        crud_api = api.app_crud_api(current_app)
+        if crud_api.broker is None:
+            return abort(404)
+
+        config = current_app.config
+        heartbeat = config[f"{api.CONFIG_KEY_PREFIX}_STREAM_HEARTBEAT"]
+        json_dumps = current_app.json.dumps
+        # 在返回响应前订阅，避免遗漏建立连接期间的事件
+        subscription = crud_api.broker.subscribe(self.model, self.make_stream_match())
+
+        def generate():
+            try:
+                yield "retry: 3000\n\n"
+                while True:
+                    data = subscription.get(timeout=heartbeat)
+                    if subscription.dropped:
+                        yield "event: dropped\ndata: {}\n\n"
+                        return
+                    if data is None:
+                        yield ": heartbeat\n\n"
+                        continue
+                    yield (
+                        f"id: {data['id']}\nevent: {data['event']}\n"
+                        f"data: {json_dumps(data)}\n\n"
+                    )
+            finally:
+                subscription.close()
+
+        return Response(
+            generate(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+
 class CommonView(
     ListViewMixin, CreateViewMixin, ViewRouterMixin, ViewMixin, views.MethodView
 ):
@@ -0,0 +1,153 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError
+
+from sqlalchemy import event
+from sqlalchemy import inspect as sa_inspect
+
+logger = logging.getLogger(__name__)
+
+_stop = object()
+
+
+def _begin_transaction(session, transaction, connection):
+    # pysqlite 默认在第一条 INSERT/UPDATE 前才隐式 BEGIN，SAVEPOINT 不会开启事务，
+    # 每个 RELEASE 都会单独提交；显式 BEGIN 后整批写入在同一个事务中提交
+    if connection.dialect.name != "sqlite":
+        return
+    dbapi_connection = connection.connection.dbapi_connection
+    if not getattr(dbapi_connection, "in_transaction", True):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def get_writer():
+    from flask_crud_api import api
+
+    crud_api = api.current_crud_api()
+    if crud_api is None:
+        return None
+    return crud_api.writer
+
+
+class WriteCoordinator:
+    """合并并发的单行写入，由专用写线程按批提交
+
+    每个写入在批内使用独立的 SAVEPOINT，失败只影响该写入；结果或异常通过 Future 返回给请求线程。
+    """
+
+    def __init__(self, session_factory, max_batch=64, max_wait=0.002, timeout=30):
+        # scoped_session 需要使用其内部的 sessionmaker
+        self.session_factory = getattr(
+            session_factory, "session_factory", session_factory
+        )
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="crud_api_writer", daemon=True
+                )
+                self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self.queue.put(_stop)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, obj, func=None):
+        """提交写入，func(session, obj) 在写线程中执行，默认为 session.add(obj)"""
+        # 已关联到其他会话的对象先移出，保留未提交的修改
+        session = sa_inspect(obj).session
+        if session is not None:
+            session.expunge(obj)
+
+        future = Future()
+        self.start()
+        self.queue.put((obj, func, future))
+        return future
+
+    def add(self, obj, func=None):
+        future = self.submit(obj, func)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            # 尚未开始执行的写入取消，不会再提交；已在批次中执行的写入等待其提交结果
+            if future.cancel():
+                raise
+            return future.result()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _stop:
+                return
+            batch = [item]
+            stop = self._collect(batch)
+            try:
+                self._commit(batch)
+            except Exception as e:
+                # 写线程不能退出，批内未返回结果的写入都收到异常
+                logger.exception("crud_api writer failed to commit a batch")
+                self._fail(batch, e)
+            if stop:
+                return
+
+    @staticmethod
+    def _fail(batch, error):
+        for _, _, future in batch:
+            if future.done():
+                continue
+            if future.running() or future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def _collect(self, batch):
+        # 等待 max_wait 秒收集同一批的写入
+        while len(batch) < self.max_batch:
+            try:
+                item = self.queue.get(timeout=self.max_wait)
+            except queue.Empty:
+                return False
+            if item is _stop:
+                return True
+            batch.append(item)
+        return False
+
+    def _commit(self, batch):
+        done = []
+        session = self.session_factory(expire_on_commit=False)
+        event.listen(session, "after_begin", _begin_transaction)
+        try:
+            for obj, func, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with session.begin_nested():
+                        if func is None:
+                            session.add(obj)
+                        else:
+                            func(session, obj)
+                except Exception as e:
+                    if obj in session:
+                        session.expunge(obj)
+                    future.set_exception(e)
+                    continue
+                done.append((obj, future))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            for _, future in done:
+                future.set_exception(e)
+            return
+        finally:
+            session.close()
+
+        for obj, future in done:
+            future.set_result(obj)
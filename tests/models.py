@@ -1,4 +1,5 @@
 from sqlalchemy import Column, String, Text, Integer, DateTime, Float
+from sqlalchemy.orm import foreign, relationship
 from flask_crud_api.models import BaseModel, create_tables
 
 
@@ -16,3 +17,39 @@ class Book(BaseModel):
     name = Column(String(255), comment="书名")
     publish = Column(DateTime, comment="发布时间")
     price = Column(Float(asdecimal=True), comment="价格")
+
+
+# 测试用关系，不依赖外键约束
+User.books = relationship(
+    Book,
+    primaryjoin=User.pk == foreign(Book.uid),
+    order_by=Book.pk,
+    viewonly=True,
+)
+Book.user = relationship(User, primaryjoin=foreign(Book.uid) == User.pk, viewonly=True)
+
+
+class ShardBook(BaseModel):
+    __tablename__ = "test_shard_books"
+    __shard_key__ = "uid"
+
+    uid = Column(Integer(), comment="用户ID")
+    name = Column(String(255), comment="书名")
+    price = Column(Float(), comment="价格")
+
+
+class Visit(BaseModel):
+    __tablename__ = "test_visits"
+    __bind_key__ = "hot"
+
+    uid = Column(Integer(), comment="用户ID")
+    path = Column(String(255), comment="访问路径")
+
+
+class Product(BaseModel):
+    __tablename__ = "test_products"
+
+    sku = Column(String(64), unique=True, comment="商品编码")
+    name = Column(String(255), comment="名称")
+    price = Column(Float(), comment="价格")
+    publish = Column(DateTime, comment="上架时间")
@@ -0,0 +1,156 @@
+import json
+
+import pytest
+from flask import Blueprint, Flask
+from sqlalchemy import inspect, select
+
+from models import Book, Visit
+
+
+def _make_app(db_url, binds=None):
+    from flask_crud_api.api import CrudApi
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import CommonView
+
+    app = Flask(__name__)
+    app.config["FLASK_CRUD_API_DB_URL"] = db_url
+    app.config["FLASK_CRUD_API_DB_BINDS"] = binds
+    crud_api = CrudApi(app)
+    crud_api.create_tables()
+
+    class BookView(CommonView):
+        model = Book
+
+    class VisitView(CommonView):
+        model = Visit
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    router = Router(bp)
+    router.add_url_rule("/book", view_cls=BookView)
+    router.add_url_rule("/visit", view_cls=VisitView)
+    app.register_blueprint(bp)
+    return app
+
+
+def _data(response):
+    assert response.status_code == 200
+    return json.loads(response.data)["data"]
+
+
+@pytest.fixture
+def bind_app(tmp_path):
+    app = _make_app(
+        f"sqlite:///{tmp_path / 'main.db'}",
+        {"hot": f"sqlite:///{tmp_path / 'hot.db'}"},
+    )
+    yield app
+    for engine in app.extensions["flask_crud_api"].engines.values():
+        engine.dispose()
+
+
+def test_binds(bind_app: Flask):
+    from flask_crud_api.orm import Orm
+
+    crud_api = bind_app.extensions["flask_crud_api"]
+    main, hot = crud_api.get_engine(), crud_api.get_engine("hot")
+    assert crud_api.bind_names() == ["hot"]
+    assert crud_api.engine_for(Visit) is hot and crud_api.engine_for(Book) is main
+
+    # 建表按 bind 拆分
+    assert "test_visits" in inspect(hot).get_table_names()
+    assert "test_visits" not in inspect(main).get_table_names()
+    assert "test_books" not in inspect(hot).get_table_names()
+    assert set(crud_api.metadatas["hot"].tables) == {"test_visits"}
+
+    client = bind_app.test_client()
+    _data(client.post("/api/book", data={"uid": 1, "name": "book"}))
+    _data(client.post("/api/visit", data={"uid": 1, "path": "/book"}))
+    assert _data(client.get("/api/visit"))["count"] == 1
+    assert _data(client.get("/api/book"))["count"] == 1
+
+    with hot.connect() as conn:
+        assert conn.execute(select(Visit.path)).scalars().all() == ["/book"]
+
+    with bind_app.app_context():
+        orm = Orm()
+        orm.execute_add_all([Visit(uid=2, path="/a"), Visit(uid=2, path="/b")])
+        stmt = orm.get_queryset(Visit).where(Visit.uid == 2)
+        assert len(orm.execute_all(stmt)) == 2
+
+        stmt = select(Book).join(Visit, Visit.uid == Book.uid)
+        with pytest.raises(Exception, match="multiple binds"):
+            orm.execute_all(stmt)
+
+
+def test_multiple_apps():
+    from flask_crud_api.orm import Orm
+
+    first = _make_app("sqlite:///:memory:")
+    second = _make_app("sqlite:///:memory:")
+    assert first.extensions["flask_crud_api"].engine is not (
+        second.extensions["flask_crud_api"].engine
+    )
+
+    _data(first.test_client().post("/api/book", data={"uid": 1, "name": "first"}))
+    assert _data(second.test_client().get("/api/book"))["count"] == 0
+    assert _data(first.test_client().get("/api/book"))["count"] == 1
+
+    # 未配置的 bind key 使用默认库
+    _data(second.test_client().post("/api/visit", data={"uid": 1, "path": "/"}))
+    with second.app_context():
+        assert Orm().count(select(Visit.pk)) == 1
+    with first.app_context():
+        assert Orm().count(select(Visit.pk)) is None
+
+
+def test_binds_summary(bind_app: Flask):
+    from flask_crud_api.models import Base
+    from flask_crud_api.orm import Orm, session_scope
+    from flask_crud_api.summary import Summary, summaries
+
+    crud_api = bind_app.extensions["flask_crud_api"]
+    main, hot = crud_api.get_engine(), crud_api.get_engine("hot")
+    summary = Summary("visit_by_user", Visit, group_by=("uid",))
+    try:
+        summary.table.create(hot)
+        with bind_app.app_context():
+            Orm().execute_add(Visit(uid=1, path="/a"))
+            Orm().execute_add(Visit(uid=1, path="/b"))
+            with session_scope() as session:
+                assert summary.get(session, uid=1)["count"] == 2
+        # 汇总表写入原表所在的库
+        assert "crud_api_summary_visit_by_user" not in inspect(main).get_table_names()
+    finally:
+        summaries.pop(summary.name)
+        Base.metadata.remove(summary.table)
+
+
+def test_binds_indexes_cli(bind_app: Flask):
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import CommonView
+
+    class VisitPathView(CommonView):
+        model = Visit
+        view_filter_fields = (("path", "="),)
+
+    bp = Blueprint("v2", __name__, url_prefix="/api/v2")
+    Router(bp).add_url_rule("/visit", view_cls=VisitPathView)
+    bind_app.register_blueprint(bp)
+
+    crud_api = bind_app.extensions["flask_crud_api"]
+    main, hot = crud_api.get_engine(), crud_api.get_engine("hot")
+    runner = bind_app.test_cli_runner()
+    result = runner.invoke(args=["crud-api", "indexes"])
+    assert result.exit_code == 0, result.output
+    fields = json.loads(result.output)["fields"]
+    binds = {item["table"]: item["bind"] for item in fields}
+    assert binds["test_visits"] == "hot"
+
+    # 索引在模型所在的库中检查与创建
+    result = runner.invoke(args=["crud-api", "indexes", "--create"])
+    assert result.exit_code == 0, result.output
+    names = {index["name"] for index in inspect(hot).get_indexes("test_visits")}
+    assert "ix_test_visits_path_valid" in names
+    assert "test_visits" not in inspect(main).get_table_names()
+    result = runner.invoke(args=["crud-api", "indexes"])
+    assert json.loads(result.output)["missing"] == []
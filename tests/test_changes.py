@@ -0,0 +1,191 @@
+import json
+
+import pytest
+from flask import Blueprint, Flask
+from flask.testing import FlaskClient
+
+from models import Book
+
+
+@pytest.fixture
+def changes_client(app: Flask) -> FlaskClient:
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import ChangesViewMixin, CommonView
+    from test_view import _init_data
+
+    _init_data(app)
+
+    class BookView(ChangesViewMixin, CommonView):
+        model = Book
+        view_filter_fields = (("uid", "="),)
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    Router(bp).add_url_rule("/book", view_cls=BookView)
+    app.register_blueprint(bp)
+    return app.test_client()
+
+
+def _changes(client, query=""):
+    response = client.get(f"/api/book/changes{query}")
+    assert response.status_code == 200
+    return json.loads(response.data)["data"]
+
+
+def test_changes(app: Flask, changes_client: FlaskClient):
+    from flask_crud_api.orm import Orm
+
+    first = _changes(changes_client, "?__page_size=3")
+    assert [item["pk"] for item in first["result"]] == [1, 2, 3]
+    assert first["has_more"] is True
+
+    rest = _changes(changes_client, f"?__page_size=3&__since={first['cursor']}")
+    assert [item["pk"] for item in rest["result"]] == [4]
+    assert rest["has_more"] is False
+
+    with app.app_context():
+        orm = Orm()
+        book = orm.execute_one_or_none(orm.get_queryset(Book).where(Book.pk == 2))
+        book.name = "changed"
+        orm.execute_add(book)
+        book = orm.execute_one_or_none(orm.get_queryset(Book).where(Book.pk == 3))
+        orm.execute_delete(book)
+
+    changes = _changes(changes_client, f"?__since={rest['cursor']}")
+    assert [item["name"] for item in changes["result"]] == ["changed"]
+    assert [item["pk"] for item in changes["deleted"]] == [3]
+    assert changes["deleted"][0]["delete_time"]
+
+    empty = _changes(changes_client, f"?__since={changes['cursor']}")
+    assert empty["result"] == [] and empty["deleted"] == []
+    assert empty["cursor"] == changes["cursor"]
+
+    assert _changes(changes_client, "?uid=2")["result"] == []
+    assert changes_client.get("/api/book/changes?__since=bad").status_code == 400
+
+
+def test_changes_index():
+    from flask_crud_api.indexes import IndexPlanner
+    from flask_crud_api.view import ChangesViewMixin, CommonView
+
+    class BookView(ChangesViewMixin, CommonView):
+        model = Book
+
+    planner = IndexPlanner("sqlite").collect(BookView)
+    names = [plan.name for plan in planner.plans.values()]
+    assert "ix_test_books_update_time_pk" in names
+
+
+@pytest.fixture
+def stream_app():
+    from flask_crud_api.api import CrudApi
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import CommonView, StreamViewMixin
+
+    app = Flask(__name__)
+    app.config["FLASK_CRUD_API_DB_URL"] = "sqlite:///:memory:"
+    app.config["FLASK_CRUD_API_STREAM"] = True
+    app.config["FLASK_CRUD_API_STREAM_HEARTBEAT"] = 0.01
+    CrudApi(app)
+
+    from models import create_tables
+    from flask_crud_api.api import engine
+
+    create_tables(engine)
+
+    class BookView(StreamViewMixin, CommonView):
+        model = Book
+        view_filter_fields = (("uid", "="), ("name", "like"))
+
+    class BookRegexpView(StreamViewMixin, CommonView):
+        model = Book
+        view_filter_fields = (("name", "regexp"),)
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    router = Router(bp)
+    router.add_url_rule("/book", view_cls=BookView)
+    router.add_url_rule("/book_re", view_cls=BookRegexpView)
+    app.register_blueprint(bp)
+    return app
+
+
+def _events(response, count):
+    events = []
+    chunks = iter(response.response)
+    while len(events) < count:
+        chunk = next(chunks)
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith("id:"):
+            events.append(json.loads(chunk.split("data: ", 1)[1]))
+        elif chunk.startswith(": heartbeat"):
+            events.append(None)
+    return events
+
+
+def test_stream(stream_app: Flask):
+    from flask_crud_api.orm import Orm
+
+    client = stream_app.test_client()
+    response = client.get("/api/book/stream?uid=1&name=%25book%25", buffered=False)
+    assert response.mimetype == "text/event-stream"
+
+    with stream_app.app_context():
+        orm = Orm()
+        book = orm.execute_add(Book(uid=1, name="a book"))
+        orm.execute_add(Book(uid=2, name="other book"))
+        orm.execute_add(Book(uid=1, name="no match"))
+        book.price = 3
+        orm.execute_add(book)
+        orm.execute_delete(book)
+
+    events = _events(response, 4)
+    assert [event["event"] for event in events[:3]] == ["create", "update", "delete"]
+    assert events[0]["data"]["name"] == "a book"
+    assert events[3] is None
+    response.close()
+
+    broker = stream_app.extensions["flask_crud_api"].broker
+    assert not broker.wants(Book)
+
+
+def test_stream_slow_consumer():
+    from flask_crud_api.events import Broker
+
+    broker = Broker(maxsize=2)
+    slow = broker.subscribe(Book)
+    fast = broker.subscribe(Book, match=lambda event: event["pk"] == 1, maxsize=5)
+    for pk in range(3):
+        broker.publish(Book, {"event": "create", "pk": pk, "data": {}})
+
+    assert slow.dropped and not fast.dropped
+    assert broker.subscriptions[Book] == [fast]
+    # 过滤在订阅者读取时执行
+    assert fast.get(timeout=0)["pk"] == 1
+    assert fast.get(timeout=0) is None
+
+
+def test_stream_bad_subscriber(stream_app: Flask):
+    from flask_crud_api.orm import Orm
+
+    client = stream_app.test_client()
+    assert client.get("/api/book_re/stream?name=(unclosed").status_code == 400
+
+    broker = stream_app.extensions["flask_crud_api"].broker
+    bad = broker.subscribe(Book, match=lambda event: event["missing"])
+    good = broker.subscribe(Book)
+    with stream_app.app_context():
+        Orm().execute_add(Book(uid=1, name="a book"))
+    assert client.post("/api/book", data={"uid": 1, "name": "b"}).status_code == 200
+
+    assert bad.get(timeout=0) is None
+    assert [good.get(timeout=0)["data"]["name"] for _ in range(2)] == ["a book", "b"]
+
+
+def test_stream_disabled(app: Flask):
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import CommonView, StreamViewMixin
+
+    class BookView(StreamViewMixin, CommonView):
+        model = Book
+
+    Router(app).add_url_rule("/book", view_cls=BookView)
+    assert app.test_client().get("/book/stream").status_code == 404
@@ -0,0 +1,124 @@
+import json
+import time
+import threading
+
+import pytest
+from flask import Blueprint, Flask
+from sqlalchemy import event
+
+from models import Book
+
+
+@pytest.fixture
+def coalesce_app(tmp_path):
+    from flask_crud_api.api import CrudApi
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import CommonView
+
+    app = Flask(__name__)
+    app.config["FLASK_CRUD_API_DB_URL"] = f"sqlite:///{tmp_path / 'main.db'}"
+    app.config["FLASK_CRUD_API_DB_COALESCE"] = True
+    app.config["FLASK_CRUD_API_SQL_INSTRUMENT"] = True
+    app.config["FLASK_CRUD_API_METRICS"] = True
+    crud_api = CrudApi(app)
+    crud_api.create_tables()
+
+    class BookView(CommonView):
+        model = Book
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    Router(bp).add_url_rule("/book", view_cls=BookView)
+    app.register_blueprint(bp)
+
+    client = app.test_client()
+    for idx in range(5):
+        client.post("/api/book", data={"uid": idx, "name": f"book{idx}"})
+
+    yield app
+    crud_api.engine.dispose()
+
+
+def slow_selects(engine, delay):
+    selects = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if statement.startswith("SELECT"):
+            selects.append(statement)
+            time.sleep(delay)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    return selects
+
+
+def run_concurrently(target, count):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(idx):
+        barrier.wait()
+        results[idx] = target()
+
+    threads = [threading.Thread(target=run, args=(idx,)) for idx in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_coalesce(coalesce_app: Flask):
+    crud_api = coalesce_app.extensions["flask_crud_api"]
+    selects = slow_selects(crud_api.engine, 0.2)
+
+    responses = run_concurrently(
+        lambda: coalesce_app.test_client().get("/api/book"), 10
+    )
+    bodies = [json.loads(response.data)["data"] for response in responses]
+    assert all(body == bodies[0] for body in bodies)
+    assert bodies[0]["count"] == 5
+
+    stats = crud_api.coalescer.stats()
+    assert stats["shared"] > 0
+    assert stats["in_flight"] == 0
+    # 每个请求一次列表查询、一次计数查询
+    assert len(selects) == stats["executed"] + stats["fallback"] < 20
+
+    client = coalesce_app.test_client()
+    requests = json.loads(client.get("/_debug/requests").data)["data"]
+    assert sum(item["coalesced"] for item in requests) == stats["shared"]
+    assert "flask_crud_api_coalesced_reads_total" in client.get("/metrics").text
+
+
+def test_coalesce_fallback(coalesce_app: Flask):
+    from flask_crud_api.orm import Orm
+
+    crud_api = coalesce_app.extensions["flask_crud_api"]
+    crud_api.coalescer.timeout = 0.01
+    selects = slow_selects(crud_api.engine, 0.2)
+
+    def list_books():
+        with coalesce_app.app_context():
+            return Orm().execute_all(Orm().get_queryset(Book))
+
+    results = run_concurrently(list_books, 4)
+    assert all(len(result) == 5 for result in results)
+    # 每个请求得到独立的对象
+    assert len({id(result[0]) for result in results}) == 4
+    stats = crud_api.coalescer.stats()
+    assert stats["fallback"] > 0
+    assert len(selects) == 4
+
+
+def test_coalesce_pending_writes(coalesce_app: Flask):
+    from flask_crud_api.orm import get_session
+
+    crud_api = coalesce_app.extensions["flask_crud_api"]
+    with coalesce_app.test_request_context():
+        session = get_session()
+        session.add(Book(uid=9, name="pending"))
+        session.flush()
+        coalescer = crud_api.coalescer
+        assert not coalescer.eligible(session, Book.__table__.select(), "rows")
+        session.rollback()
+        assert coalescer.eligible(session, Book.__table__.select(), "rows")
+        session.close()
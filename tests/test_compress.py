@@ -0,0 +1,110 @@
+import gzip
+import json
+import zlib
+
+import pytest
+from flask import Blueprint, Flask, Response
+
+from models import Book
+
+
+@pytest.fixture
+def compress_app():
+    from flask_crud_api.api import CrudApi
+    from flask_crud_api.router import Router, action
+    from flask_crud_api.view import CommonView
+
+    app = Flask(__name__)
+    app.config["FLASK_CRUD_API_DB_URL"] = "sqlite:///:memory:"
+    app.config["FLASK_CRUD_API_COMPRESS"] = True
+    app.config["FLASK_CRUD_API_COMPRESS_MIN_SIZE"] = 200
+    CrudApi(app)
+
+    from models import create_tables
+    from flask_crud_api.api import engine
+    from test_view import _init_data
+
+    create_tables(engine)
+    _init_data(app)
+
+    class BookView(CommonView):
+        model = Book
+        view_filter_fields = (("uid", "="),)
+
+        @action(url_path="export")
+        def export(self, *args, **kwargs):
+            def generate():
+                for idx in range(3):
+                    yield json.dumps({"line": idx}) + "\n"
+
+            return Response(generate(), mimetype="application/x-ndjson")
+
+        @action(url_path="etag")
+        def etag(self, *args, **kwargs):
+            response = Response("x" * 500, mimetype="text/plain")
+            response.set_etag("abc")
+            return response
+
+        @action(url_path="events")
+        def events(self, *args, **kwargs):
+            return Response(iter(["data: 1\n\n"]), mimetype="text/event-stream")
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    Router(bp).add_url_rule("/book", view_cls=BookView)
+    app.register_blueprint(bp)
+    return app
+
+
+def test_compress(compress_app: Flask):
+    client = compress_app.test_client()
+    plain = client.get("/api/book")
+    assert "Content-Encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    response = client.get("/api/book", headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert int(response.headers["Content-Length"]) < len(plain.data)
+    assert gzip.decompress(response.data) == plain.data
+
+    response = client.get("/api/book", headers={"Accept-Encoding": "gzip;q=0, deflate"})
+    assert response.headers["Content-Encoding"] == "deflate"
+    assert zlib.decompress(response.data) == plain.data
+
+    # 小于阈值的响应不压缩
+    response = client.get("/api/book?uid=99", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert json.loads(response.data)["data"]["count"] == 0
+
+    # 压缩后强 ETag 改为弱 ETag
+    assert client.get("/api/book/etag").headers["ETag"] == '"abc"'
+    response = client.get("/api/book/etag", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["ETag"] == 'W/"abc"'
+
+
+def test_compress_stream(compress_app: Flask):
+    client = compress_app.test_client()
+    headers = {"Accept-Encoding": "gzip"}
+    response = client.get("/api/book/export", headers=headers, buffered=False)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+
+    # 小块累积到 flush_size 后才输出，不会每块都同步刷新
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = [decompressor.decompress(chunk) for chunk in response.response]
+    assert chunks[:-1] == [b""] * (len(chunks) - 1)
+    assert chunks[-1] == b"".join(b'{"line": %d}\n' % idx for idx in range(3))
+    response.close()
+
+    # 达到 flush_size 的块可以立即解压
+    compress_app.extensions["flask_crud_api"].compression.flush_size = 1
+    response = client.get("/api/book/export", headers=headers, buffered=False)
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = iter(response.response)
+    assert decompressor.decompress(next(chunks)) == b'{"line": 0}\n'
+    rest = b"".join(decompressor.decompress(chunk) for chunk in chunks)
+    assert rest == b'{"line": 1}\n{"line": 2}\n'
+    response.close()
+
+    response = client.get("/api/book/events", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert response.data == b"data: 1\n\n"
@@ -0,0 +1,288 @@
+import json
+
+import pytest
+from flask import Blueprint, Flask
+from flask.testing import FlaskClient
+
+from models import Book, User
+
+
+def _join_view():
+    from flask_crud_api.filter import OrderFilter, SearchJoinFilter
+    from flask_crud_api.view import CommonView
+
+    class BookView(CommonView):
+        model = Book
+        view_filters = (SearchJoinFilter, OrderFilter)
+        view_join_model = (User,)
+        view_join_model_key = (("pk", "uid"),)
+        view_join_filter_fields = ((("__join_username", "="),),)
+
+    return BookView
+
+
+def _sql(app, view, url, count=False):
+    with app.test_request_context(url):
+        if count:
+            stmt = view.orm.get_queryset_count(view.model)
+        else:
+            stmt = view.get_queryset()
+        return str(view.query_filter(stmt))
+
+
+def test_join_on_demand(app: Flask):
+    view = _join_view()()
+
+    assert "JOIN" not in _sql(app, view, "/api/book")
+    assert "JOIN" not in _sql(app, view, "/api/book", count=True)
+    assert "LEFT OUTER JOIN test_users" in _sql(
+        app, view, "/api/book?__join_username=user1"
+    )
+
+
+def test_join_projected_fields(app: Flask):
+    class BookUserView(_join_view()):
+
+        def get_queryset(self):
+            return self.orm.get_queryset(self.model, User)
+
+    view = BookUserView()
+    assert "LEFT OUTER JOIN test_users" in _sql(app, view, "/api/book")
+    # User.pk 唯一，计数查询不需要关联
+    assert "JOIN" not in _sql(app, view, "/api/book", count=True)
+
+
+@pytest.fixture
+def join_client(app: Flask) -> FlaskClient:
+    from flask_crud_api.router import Router
+    from test_view import _init_data
+
+    _init_data(app)
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    Router(bp).add_url_rule("/book", view_cls=_join_view())
+    app.register_blueprint(bp)
+    return app.test_client()
+
+
+def test_join_filter(join_client: FlaskClient):
+    data = json.loads(join_client.get("/api/book?__join_username=user1").data)
+    assert data["data"]["count"] == 4
+    assert len(data["data"]["result"]) == 4
+
+    data = json.loads(join_client.get("/api/book?__join_username=user2").data)
+    assert data["data"]["count"] == 0
+    assert data["data"]["result"] == []
+
+
+@pytest.fixture
+def batch_client(app: Flask) -> FlaskClient:
+    from flask_crud_api.filter import SearchFilter
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import BatchRetrieveViewMixin, CommonView
+    from test_view import _init_data
+
+    _init_data(app)
+
+    class BookView(BatchRetrieveViewMixin, CommonView):
+        model = Book
+        view_filter_fields = (("pk", "in"), ("price", "in"))
+
+    class SmallInFilter(SearchFilter):
+        in_threshold = 2
+
+    class BookJsonView(BookView):
+        view_filters = (SmallInFilter,)
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    Router(bp).add_url_rule("/book", view_cls=BookView)
+    Router(bp).add_url_rule("/book_json", view_cls=BookJsonView)
+    app.register_blueprint(bp)
+    return app.test_client()
+
+
+def _pks(response):
+    return [item["pk"] for item in json.loads(response.data)["data"]["result"]]
+
+
+def test_in_filter(batch_client: FlaskClient):
+    assert _pks(batch_client.get("/api/book?pk=1,3")) == [1, 3]
+    assert _pks(batch_client.get("/api/book?pk=1&pk=2,4")) == [1, 2, 4]
+    assert batch_client.get("/api/book?pk=1,x").status_code == 400
+
+
+def test_in_filter_json(app: Flask, batch_client: FlaskClient):
+    assert _pks(batch_client.get("/api/book_json?pk=1,2,4")) == [1, 2, 4]
+
+    from flask_crud_api.filter import in_condition
+
+    with app.test_request_context():
+        sql = str(in_condition(Book.pk, [1, 2, 3], threshold=2))
+    assert "json_each" in sql
+
+
+def test_batch_retrieve(batch_client: FlaskClient):
+    response = batch_client.get("/api/book/batch?__pks=3,1,99")
+    data = json.loads(response.data)["data"]
+    assert [item["pk"] for item in data["result"]] == [3, 1]
+    assert data["count"] == 2
+    assert data["missing"] == [99]
+
+    assert batch_client.get("/api/book/batch").status_code == 400
+
+
+def _fulltext_view(tokenize="unicode61"):
+    from flask_crud_api.view import CommonView
+
+    class BookSearchView(CommonView):
+        model = Book
+        view_fulltext_fields = ("name",)
+        view_fulltext_tokenize = tokenize
+
+    return BookSearchView
+
+
+def _names(response):
+    return [item["name"] for item in json.loads(response.data)["data"]["result"]]
+
+
+def test_fulltext(app: Flask):
+    from flask_crud_api.orm import Orm
+    from flask_crud_api.router import Router
+    from test_view import _init_data
+
+    _init_data(app)
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    Router(bp).add_url_rule("/book", view_cls=_fulltext_view("trigram"))
+    app.register_blueprint(bp)
+    client = app.test_client()
+
+    view = _fulltext_view()()
+    assert "MATCH" in _sql(app, view, "/api/book?__q=书本")
+    assert "ORDER BY" not in _sql(app, view, "/api/book?__q=书本", count=True)
+
+    response = client.get("/api/book?__q=书本1")
+    assert _names(response) == ["书本1"]
+    assert json.loads(response.data)["data"]["count"] == 1
+    assert len(_names(client.get("/api/book?__q=书本"))) == 4
+
+    # 触发器同步新增与修改
+    with app.app_context():
+        Orm().execute_add(Book(uid=1, name="新书本9"))
+        book = Orm().execute_one_or_none(Orm().get_queryset(Book).limit(1))
+        book.name = "改名"
+        Orm().execute_add(book)
+    assert _names(client.get("/api/book?__q=书本9")) == ["新书本9"]
+    assert _names(client.get("/api/book?__q=书本0")) == []
+    assert client.get('/api/book?__q="').status_code == 200
+
+
+def test_fulltext_like_fallback(app: Flask):
+    from test_view import _init_data
+
+    _init_data(app)
+    # 未注册(未建立索引)时退化为 LIKE
+    view = _fulltext_view()()
+    sql = _sql(app, view, "/api/book?__q=书本1")
+    assert "MATCH" not in sql and "LIKE" in sql
+
+
+@pytest.mark.parametrize(
+    "pattern, hints",
+    [
+        ("^book-12", ("book-12", "book-12")),
+        ("book-1[0-9]+x", (None, "book-1")),
+        ("^ab*cd", ("a", "cd")),
+        ("(?i)^book", (None, None)),
+        ("(?m)^book", (None, "book")),
+        ("a|b", (None, None)),
+        ("[", (None, None)),
+    ],
+)
+def test_regexp_hints(pattern, hints):
+    from flask_crud_api.regexp import regexp_hints
+
+    assert regexp_hints(pattern) == hints
+
+
+def test_regexp_filter(app: Flask):
+    from flask_crud_api.regexp import compile_pattern
+    from flask_crud_api.view import CommonView
+
+    class BookView(CommonView):
+        model = Book
+        view_filter_fields = (("name", "regexp"),)
+
+    view = BookView()
+    sql = _sql(app, view, "/api/book?name=^book-1[0-9]")
+    assert "test_books.name >=" in sql and "instr" not in sql
+    assert "instr(test_books.name" in _sql(app, view, "/api/book?name=ok-1[0-9]")
+
+    from test_view import _init_data
+
+    _init_data(app)
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    from flask_crud_api.router import Router
+
+    Router(bp).add_url_rule("/book", view_cls=BookView)
+    app.register_blueprint(bp)
+    client = app.test_client()
+
+    compile_pattern.cache_clear()
+    assert _names(client.get("/api/book?name=^书本[12]")) == ["书本1", "书本2"]
+    assert _names(client.get("/api/book?name=本[03]$")) == ["书本0", "书本3"]
+    assert compile_pattern.cache_info().currsize == 2
+    # sqlite 执行的是带缓存的 REGEXP 函数
+    assert compile_pattern.cache_info().hits >= 4
+    assert client.get("/api/book?name=[").status_code == 400
+
+
+@pytest.fixture
+def aggregate_client(app: Flask) -> FlaskClient:
+    from flask_crud_api.orm import Orm
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import AggregateViewMixin, CommonView
+    from test_view import _init_data
+
+    _init_data(app)
+    with app.app_context():
+        Orm().execute_add(Book(uid=2, name="other", price=5))
+        book = Orm().execute_add(Book(uid=2, name="deleted", price=100))
+        Orm().execute_delete(book)
+
+    class BookView(AggregateViewMixin, CommonView):
+        model = Book
+        view_filter_fields = (("name", "regexp"),)
+        view_group_by_fields = ("uid",)
+        view_aggregate_fields = (("sum", "price"), ("max", "price"))
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    Router(bp).add_url_rule("/book", view_cls=BookView)
+    app.register_blueprint(bp)
+    return app.test_client()
+
+
+def test_aggregate(aggregate_client: FlaskClient):
+    response = aggregate_client.get(
+        "/api/book/aggregate?__group_by=uid&__agg=sum:price,count:pk"
+    )
+    data = json.loads(response.data)["data"]
+    assert data["count"] == 2
+    user1, user2 = data["result"]
+    assert user1["uid"] == 1 and user1["count_pk"] == 4
+    assert float(user1["sum_price"]) == pytest.approx(31.8)
+    # 软删除的数据不参与聚合
+    assert user2["count_pk"] == 1
+    assert float(user2["sum_price"]) == pytest.approx(5)
+
+    data = json.loads(aggregate_client.get("/api/book/aggregate?name=^书").data)["data"]
+    assert data["result"] == [{"count_pk": 4}]
+
+
+def test_aggregate_not_allowed(aggregate_client: FlaskClient):
+    assert (
+        aggregate_client.get("/api/book/aggregate?__group_by=name").status_code == 400
+    )
+    assert (
+        aggregate_client.get("/api/book/aggregate?__agg=avg:price").status_code == 400
+    )
+    assert aggregate_client.get("/api/book/aggregate?__agg=sum:name").status_code == 400
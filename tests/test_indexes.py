@@ -0,0 +1,75 @@
+import pytest
+from flask import Blueprint, Flask
+from sqlalchemy import inspect
+
+from models import Book
+
+
+def _book_view():
+    from flask_crud_api.view import CommonView
+
+    class BookView(CommonView):
+        model = Book
+
+        view_order_fields = (
+            ("__order_pk", "desc"),
+            ("__order_publish", "desc"),
+        )
+        view_filter_fields = (
+            ("name", "regexp"),
+            ("publish", "between"),
+        )
+
+    return BookView
+
+
+def test_index_planner():
+    from flask_crud_api.indexes import IndexPlanner
+
+    planner = IndexPlanner("sqlite").collect(_book_view())
+    plans = {plan.name: plan for plan in planner.plans.values()}
+    assert "ix_test_books_publish_valid" in plans
+    assert "ix_test_books_publish_pk_valid" in plans
+    assert plans["ix_test_books_publish_pk_valid"].partial
+
+    unindexed = {item["field"]: item for item in planner.unindexed()}
+    assert "regexp" in unindexed["name"]["reason"]
+    assert "pk" not in unindexed
+
+    planner = IndexPlanner("mysql").collect(_book_view())
+    assert ("state", "publish", "pk") in [p.columns for p in planner.plans.values()]
+
+
+def test_index_planner_migration():
+    from flask_crud_api.indexes import IndexPlanner
+
+    planner = IndexPlanner("sqlite").collect(_book_view())
+    script = planner.render_migration("abc123", "def456")
+    assert "down_revision = 'def456'" in script
+    assert "op.create_index('ix_test_books_publish_pk_valid', 'test_books'" in script
+    assert "op.drop_index('ix_test_books_publish_pk_valid'" in script
+    compile(script, "migration.py", "exec")
+
+
+def test_auto_index_create(app: Flask):
+    from flask_crud_api.api import engine
+    from flask_crud_api.models import Base, schema_fingerprint
+    from flask_crud_api.router import Router
+
+    fingerprint = schema_fingerprint(Base.metadata, engine.dialect)
+    app.config["FLASK_CRUD_API_DB_AUTO_INDEX"] = "create"
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    Router(bp).add_url_rule("/book", view_cls=_book_view())
+    app.register_blueprint(bp)
+
+    names = {index["name"] for index in inspect(engine).get_indexes("test_books")}
+    assert "ix_test_books_publish_pk_valid" in names
+    assert "ix_test_books_publish_valid" in names
+    # 模型元数据不变，表结构指纹与迁移自动生成不受影响
+    assert "ix_test_books_publish_valid" not in {i.name for i in Book.__table__.indexes}
+    assert schema_fingerprint(Base.metadata, engine.dialect) == fingerprint
+
+    other = Flask(__name__)
+    other.config["FLASK_CRUD_API_DB_AUTO_INDEX"] = "report"
+    with pytest.raises(Exception, match="not initialized"):
+        Router(other).add_url_rule("/book", view_cls=_book_view())
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+from flask import Blueprint, Flask
+from flask.testing import FlaskClient
+
+from models import Book, User
+
+
+@pytest.fixture
+def instrument_app():
+    from flask_crud_api.api import CrudApi
+
+    app = Flask(__name__)
+    app.config["FLASK_CRUD_API_DB_URL"] = "sqlite:///:memory:"
+    app.config["FLASK_CRUD_API_SQL_INSTRUMENT"] = True
+    CrudApi(app)
+
+    from models import create_tables
+    from flask_crud_api.api import engine
+    from test_view import _init_data
+
+    create_tables(engine)
+    _init_data(app)
+    return app
+
+
+@pytest.fixture
+def instrument_client(instrument_app: Flask) -> FlaskClient:
+    from flask_crud_api.orm import Orm
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import CommonView
+
+    def user_hook(data, exclude):
+        stmt = Orm().get_queryset(User).where(User.pk == data["uid"])
+        user = Orm().execute_one_or_none(stmt)
+        data["username"] = user.username if user else None
+        return data
+
+    class BookView(CommonView):
+        model = Book
+        serializer_hooks = (user_hook,)
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    Router(bp).add_url_rule("/book", view_cls=BookView)
+    instrument_app.register_blueprint(bp)
+    return instrument_app.test_client()
+
+
+def test_server_timing(instrument_client: FlaskClient):
+    response = instrument_client.get("/api/book")
+    assert response.status_code == 200
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+    assert "statements" in response.headers["Server-Timing"]
+
+
+def test_debug_requests(instrument_client: FlaskClient):
+    instrument_client.get("/api/book")
+    response = instrument_client.get("/_debug/requests")
+    data = json.loads(response.data)["data"]
+    assert len(data) == 1
+    stats = data[0]
+    assert stats["path"] == "/api/book"
+    assert stats["statements"] >= 6
+    assert stats["rows"] >= 4
+    assert stats["repeated"][0]["count"] == 4
+
+
+def test_instrument_disabled(app: Flask, client: FlaskClient):
+
+    @app.route("/")
+    def index():
+        return "ok"
+
+    response = client.get("/")
+    assert "Server-Timing" not in response.headers
+    assert client.get("/_debug/requests").status_code == 404
@@ -0,0 +1,163 @@
+import json
+import os
+
+import pytest
+from flask import Blueprint, Flask
+from flask.testing import FlaskClient
+
+from models import Book
+
+
+@pytest.fixture
+def metrics_app(tmp_path):
+    from flask_crud_api.api import CrudApi
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import CommonView
+
+    app = Flask(__name__)
+    app.config["FLASK_CRUD_API_DB_URL"] = "sqlite:///:memory:"
+    app.config["FLASK_CRUD_API_METRICS"] = True
+    app.config["FLASK_CRUD_API_METRICS_DIR"] = str(tmp_path)
+    CrudApi(app)
+
+    from models import create_tables
+    from flask_crud_api.api import engine
+
+    create_tables(engine)
+
+    class BookView(CommonView):
+        model = Book
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    Router(bp).add_url_rule("/book", view_cls=BookView)
+    app.register_blueprint(bp)
+    return app
+
+
+def test_metrics_endpoint(metrics_app: Flask):
+    client: FlaskClient = metrics_app.test_client()
+    client.get("/api/book")
+    client.get("/api/book")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+    text = response.data.decode()
+    assert "# TYPE flask_crud_api_request_duration_seconds histogram" in text
+    assert (
+        'flask_crud_api_request_duration_seconds_count{endpoint="v1.BookView",method="GET"} 2'
+        in text
+    )
+    assert (
+        'flask_crud_api_db_duration_seconds_bucket{endpoint="v1.BookView",method="GET",le="+Inf"} 2'
+        in text
+    )
+    assert "flask_crud_api_serialize_duration_seconds_sum" in text
+    assert (
+        'flask_crud_api_requests_total{endpoint="v1.BookView",method="GET",status="200"} 2'
+        in text
+    )
+
+
+def test_metrics_multiprocess(tmp_path):
+    from flask_crud_api.metrics import Metrics
+
+    labels = (("endpoint", "v1.BookView"), ("method", "GET"))
+    worker = Metrics(multiprocess_dir=str(tmp_path))
+    worker.observe("request_duration_seconds", labels, 0.02)
+    worker.flush()
+    os.replace(
+        tmp_path / f"crud_api_metrics_{os.getpid()}.json",
+        tmp_path / "crud_api_metrics_1.json",
+    )
+
+    metrics = Metrics(multiprocess_dir=str(tmp_path))
+    metrics.observe("request_duration_seconds", labels, 0.2)
+    text = metrics.render()
+    assert (
+        'flask_crud_api_request_duration_seconds_count{endpoint="v1.BookView",method="GET"} 2'
+        in text
+    )
+    assert (
+        'flask_crud_api_request_duration_seconds_bucket{endpoint="v1.BookView",method="GET",le="0.025"} 1'
+        in text
+    )
+
+
+def test_metrics_thread_shards():
+    import threading
+
+    from flask_crud_api.metrics import Metrics
+
+    metrics = Metrics()
+    labels = (("endpoint", "v1.BookView"), ("method", "GET"))
+
+    def observe():
+        metrics.observe("request_duration_seconds", labels, 0.02)
+        metrics.inc("requests_total", labels)
+
+    for _ in range(50):
+        thread = threading.Thread(target=observe)
+        thread.start()
+        thread.join()
+
+    # 已结束线程的分片合并到基础分片中
+    assert len(metrics._shards) <= 2
+    histograms, counters = metrics.snapshot()
+    assert counters[("requests_total", labels)] == 50
+    assert sum(histograms[("request_duration_seconds", labels)][:-1]) == 50
+
+
+def test_metrics_dead_worker(tmp_path):
+    import subprocess
+    import sys
+
+    from flask_crud_api.metrics import Metrics
+
+    labels = [["endpoint", "v1.BookView"], ["method", "GET"]]
+    for _ in range(2):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        stale = tmp_path / f"crud_api_metrics_{process.pid}.json"
+        stale.write_text(
+            json.dumps(
+                {
+                    "histograms": [],
+                    "counters": [["requests_total", labels, 3]],
+                    "gauges": [["pool_size", [], 5]],
+                }
+            )
+        )
+        text = Metrics(multiprocess_dir=str(tmp_path)).render()
+        assert not stale.exists()
+
+    # 已退出 worker 的计数器保留，汇总值不会减少；连接池等 gauge 丢弃
+    assert "pool_size" not in text
+    counter = 'flask_crud_api_requests_total{endpoint="v1.BookView",method="GET"}'
+    assert f"{counter} 6" in text
+    assert f"{counter} 6" in Metrics(multiprocess_dir=str(tmp_path)).render()
+    assert (tmp_path / "crud_api_metrics_dead.json").exists()
+
+
+def test_metrics_idle_flush(tmp_path):
+    import time
+
+    from flask_crud_api.instrument import RequestStats
+    from flask_crud_api.metrics import Metrics
+
+    metrics = Metrics(multiprocess_dir=str(tmp_path), flush_interval=0.05)
+    stats = RequestStats("GET", "/api/book", "v1.BookView")
+    stats.status = 200
+    metrics.observe_request(stats)
+    metrics.observe_request(stats)
+
+    # 之后没有请求时由后台线程写入快照，最后一次记录不会遗漏
+    path = tmp_path / f"crud_api_metrics_{os.getpid()}.json"
+    counters = []
+    for _ in range(50):
+        time.sleep(0.02)
+        if path.exists():
+            counters = json.loads(path.read_text())["counters"]
+            if counters and counters[0][2] == 2:
+                break
+    assert counters[0][0] == "requests_total" and counters[0][2] == 2
@@ -0,0 +1,75 @@
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.orm import sessionmaker
+
+from models import User
+
+gevent = pytest.importorskip("gevent")
+
+
+def test_greenlet_queue_pool_timeout(tmp_path):
+    from flask_crud_api.pool import GreenletQueuePool
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=GreenletQueuePool,
+        pool_size=2,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    first, second = engine.connect(), engine.connect()
+    assert engine.pool.checkedout() == 2
+
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+
+    def waiter():
+        with engine.connect() as conn:
+            return conn.execute(text("select 1")).scalar()
+
+    pending = gevent.spawn(waiter)
+    gevent.sleep(0)
+    first.close()
+    assert pending.get(timeout=1) == 1
+    second.close()
+    assert engine.pool.checkedout() == 0
+
+
+def test_greenlet_scoped_session(tmp_path):
+    from flask_crud_api.pool import greenlet_scoped_session
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'scoped.db'}")
+    session = greenlet_scoped_session(sessionmaker(bind=engine))
+
+    def get():
+        return session(), session()
+
+    a, b = gevent.spawn(get), gevent.spawn(get)
+    gevent.joinall([a, b])
+    assert a.value[0] is a.value[1]
+    assert a.value[0] is not b.value[0]
+
+
+def test_gevent_config_outside_request(tmp_path):
+    from flask_crud_api.api import CrudApi
+    from flask_crud_api.orm import Orm, session_scope
+    from flask_crud_api.pool import GreenletQueuePool
+
+    app = Flask(__name__)
+    app.config["FLASK_CRUD_API_DB_URL"] = f"sqlite:///{tmp_path / 'gevent.db'}"
+    app.config["FLASK_CRUD_API_DB_GEVENT"] = True
+    app.config["FLASK_CRUD_API_DB_POOL_SIZE"] = 2
+    CrudApi(app)
+
+    from flask_crud_api.api import engine
+
+    assert isinstance(engine.pool, GreenletQueuePool)
+
+    with session_scope() as session:
+        session.add(User(username="job", password="job"))
+
+    with app.app_context():
+        users = Orm().execute_all(Orm().get_queryset(User))
+    assert [user.username for user in users] == ["job"]
+    assert engine.pool.checkedout() == 0
@@ -0,0 +1,287 @@
+import json
+import threading
+
+import pytest
+from flask import Blueprint, Flask
+from flask.testing import FlaskClient
+
+from models import Book, User
+
+
+@pytest.fixture
+def serializer_app():
+    from flask_crud_api.api import CrudApi
+
+    app = Flask(__name__)
+    app.config["FLASK_CRUD_API_DB_URL"] = "sqlite:///:memory:"
+    app.config["FLASK_CRUD_API_SQL_INSTRUMENT"] = True
+    CrudApi(app)
+
+    from models import create_tables
+    from flask_crud_api.api import engine
+    from test_view import _init_data
+
+    create_tables(engine)
+    _init_data(app)
+    return app
+
+
+def _register(app, view_cls, url="/book"):
+    from flask_crud_api.router import Router
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    Router(bp).add_url_rule(url, view_cls=view_cls)
+    app.register_blueprint(bp)
+    return app.test_client()
+
+
+def test_batch_hook(serializer_app: Flask):
+    from flask_crud_api.orm import Orm, batch_hook
+    from flask_crud_api.view import CommonView
+
+    calls = []
+
+    @batch_hook
+    def user_hook(results, instances, exclude):
+        calls.append(len(results))
+        uids = {book.uid for book in instances}
+        stmt = Orm().get_queryset(User).where(User.pk.in_(uids))
+        users = {user.pk: user.username for user in Orm().execute_all(stmt)}
+        for data in results:
+            data["username"] = users.get(data["uid"])
+
+    def price_hook(data, exclude):
+        data["price_text"] = str(data["price"])
+        return data
+
+    class BookView(CommonView):
+        model = Book
+        serializer_hooks = (user_hook, price_hook)
+
+    client = _register(serializer_app, BookView)
+    response = client.get("/api/book")
+    result = json.loads(response.data)["data"]["result"]
+    assert calls == [4]
+    assert {data["username"] for data in result} == {"user1"}
+    assert all("price_text" in data for data in result)
+
+    stats = json.loads(client.get("/_debug/requests").data)["data"][0]
+    assert stats["repeated"] == []
+
+
+def test_parallel_batch_hooks(serializer_app: Flask):
+    from flask_crud_api.orm import batch_hook
+    from flask_crud_api.view import CommonView
+
+    threads = set()
+
+    @batch_hook(parallel=True)
+    def name_hook(results, instances, exclude):
+        threads.add(threading.get_ident())
+        for data in results:
+            data["name_upper"] = data["name"].upper()
+
+    @batch_hook(parallel=True)
+    def index_hook(results, instances, exclude):
+        threads.add(threading.get_ident())
+        for idx, data in enumerate(results):
+            data["index"] = idx
+
+    class BookView(CommonView):
+        model = Book
+        serializer_hooks = (name_hook, index_hook)
+
+    client: FlaskClient = _register(serializer_app, BookView)
+    result = json.loads(client.get("/api/book").data)["data"]["result"]
+    assert [data["index"] for data in result] == [0, 1, 2, 3]
+    assert all(data["name_upper"] == data["name"].upper() for data in result)
+    assert threading.get_ident() not in threads
+
+
+def test_nested(serializer_app: Flask):
+    from flask_crud_api.view import CommonView
+
+    class UserView(CommonView):
+        model = User
+        view_nested = ("books", "books.user")
+        view_nested_limit = 3
+
+    client = _register(serializer_app, UserView, "/user")
+    data = json.loads(client.get("/api/user").data)["data"]
+    assert data["count"] == 2
+    user1, user2 = data["result"]
+    assert len(user1["books"]) == 3
+    assert user1["books"][0]["user"]["username"] == "user1"
+    assert "password" in user1
+    assert user2["books"] == []
+
+    stats = json.loads(client.get("/_debug/requests").data)["data"][0]
+    # 用户分页查询 + count + books + books.user
+    assert stats["statements"] == 4
+
+
+def test_nested_sql_limit(serializer_app: Flask):
+    from flask_crud_api.orm import Orm
+    from flask_crud_api.view import CommonView
+
+    class UserView(CommonView):
+        model = User
+        view_nested = ("books",)
+        view_nested_limit = 2
+
+    with serializer_app.test_request_context():
+        # 子对象数量在 SQL 中限制，而不是加载全部后截取
+        stmt = UserView().get_queryset().order_by(User.pk)
+        users = Orm().execute_all(stmt)
+        assert [len(user.books) for user in users] == [2, 0]
+        assert [book.pk for book in users[0].books] == [1, 2]
+
+    UserView.view_nested_depth = 0
+    with serializer_app.test_request_context():
+        with pytest.raises(Exception, match="too deep"):
+            UserView().to_serializer([User(username="x")])
+
+
+def test_nested_skip_invalid(serializer_app: Flask):
+    from flask_crud_api.orm import Orm
+    from flask_crud_api.view import CommonView
+
+    with serializer_app.app_context():
+        book = Orm().execute_one_or_none(Orm().get_queryset(Book).limit(1))
+        pk = book.pk
+        Orm().execute_delete(book)
+
+    class UserView(CommonView):
+        model = User
+        view_nested = ("books",)
+
+    client = _register(serializer_app, UserView, "/user")
+    user1 = json.loads(client.get("/api/user").data)["data"]["result"][0]
+    assert len(user1["books"]) == 3
+    assert pk not in [item["pk"] for item in user1["books"]]
+
+
+def test_nested_depth(serializer_app: Flask):
+    from flask_crud_api.view import CommonView
+
+    class UserView(CommonView):
+        model = User
+        view_nested = ("books.user.books",)
+
+    client = _register(serializer_app, UserView, "/user")
+    assert client.get("/api/user").status_code == 500
+
+
+def test_deserializer(serializer_app: Flask):
+    import datetime
+    import decimal
+
+    from flask_crud_api.orm import Deserializer
+    from flask_crud_api.view import CommonView
+
+    deserializer = Deserializer.for_model(Book)
+    assert Deserializer.for_model(Book) is deserializer
+
+    book = deserializer.load(
+        Book(),
+        {
+            "uid": "3",
+            "price": "1.50",
+            "publish": "2024-05-01T08:30:00",
+            "name": 12,
+            "unknown": "x",
+        },
+    )
+    assert book.uid == 3 and book.name == "12"
+    assert book.price == decimal.Decimal("1.50")
+    assert book.publish == datetime.datetime(2024, 5, 1, 8, 30)
+
+    class BookView(CommonView):
+        model = Book
+        serializer_strict = True
+
+    client = _register(serializer_app, BookView)
+    response = client.post(
+        "/api/book", json={"uid": 7, "name": "json", "publish": "2024-05-01 08:30:00"}
+    )
+    data = json.loads(response.data)["data"]["result"][0]
+    assert (data["uid"], data["name"], data["publish"]) == (
+        7,
+        "json",
+        "2024-05-01 08:30:00",
+    )
+
+    assert client.post("/api/book", data={"uid": "x"}).status_code == 400
+    assert client.post("/api/book", json={"title": "x"}).status_code == 400
+    assert client.post("/api/book", json={"pk": 1}).status_code == 400
+    assert client.post("/api/book", json=[{"uid": 1}]).status_code == 400
+    # 类型不符
+    assert client.post("/api/book", json={"publish": 123}).status_code == 400
+    assert client.post("/api/book", json={"price": {"a": 1}}).status_code == 400
+    assert client.post("/api/book", json={"uid": [1]}).status_code == 400
+    assert client.post("/api/book", json={"name": {"a": 1}}).status_code == 400
+
+    # 非 strict 时忽略未知字段，只读字段仍然返回 400
+    BookView.serializer_strict = False
+    assert client.post("/api/book", json={"title": "x"}).status_code == 200
+    for key in ("pk", "state", "delete_time"):
+        assert client.post("/api/book", json={key: 1}).status_code == 400
+
+
+def test_columnar(serializer_app: Flask):
+    from flask_crud_api.orm import batch_hook
+    from flask_crud_api.response import decode_columnar
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import CommonView
+
+    @batch_hook
+    def name_hook(results, instances, exclude):
+        for data in results:
+            data["title"] = data["name"].upper()
+
+    class BookView(CommonView):
+        model = Book
+        view_filter_fields = (("uid", "="),)
+
+    class HookBookView(CommonView):
+        model = Book
+        serializer_format = "columnar"
+        serializer_hooks = (name_hook,)
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    router = Router(bp)
+    router.add_url_rule("/book", view_cls=BookView)
+    router.add_url_rule("/hook_book", view_cls=HookBookView)
+    serializer_app.register_blueprint(bp)
+    client = serializer_app.test_client()
+
+    records = json.loads(client.get("/api/book").data)["data"]
+    payload = json.loads(client.get("/api/book?__format=columnar").data)
+    data = payload["data"]
+    assert data["count"] == records["count"] == 4
+    assert "result" not in data and "state" not in data["columns"]
+    assert data["columns"][:2] == ["uid", "name"]
+    assert decode_columnar(payload) == decode_columnar(data) == records["result"]
+
+    empty = json.loads(client.get("/api/book?uid=99&__format=columnar").data)
+    assert empty["data"]["rows"] == [] and empty["data"]["columns"]
+    assert client.get("/api/book?__format=xml").status_code == 400
+
+    # 有钩子时先生成字典再转换，视图默认 columnar 格式
+    data = json.loads(client.get("/api/hook_book").data)["data"]
+    assert data["columns"][-1] == "title"
+    assert [row[-1] for row in data["rows"]] == ["书本0", "书本1", "书本2", "书本3"]
+    records = json.loads(client.get("/api/hook_book?__format=records").data)["data"]
+    assert records["result"][0]["title"] == "书本0"
+
+    # 查询结果为 Row 时同样排除 state、delete_time
+    for fmt in ("columnar", "records"):
+        with serializer_app.test_request_context(f"/?__format={fmt}"):
+            view = BookView()
+            columns = (Book.pk, Book.name, Book.state, Book.delete_time)
+            stmt = view.orm.get_queryset_columns(Book, *columns)
+            rows = view.orm.execute_all(stmt, scalers=False)
+            payload = view.to_serializer(rows, len(rows))
+        data = payload["data"]
+        result = decode_columnar(payload) if fmt == "columnar" else data["result"]
+        assert [set(item) for item in result] == [{"pk", "name"}] * 4
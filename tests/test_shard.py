@@ -0,0 +1,152 @@
+import json
+
+import pytest
+from flask import Blueprint, Flask
+from sqlalchemy import event, select, text
+
+from models import ShardBook
+
+
+@pytest.fixture
+def shard_app(tmp_path):
+    from flask_crud_api import api
+    from flask_crud_api.api import CrudApi
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import CommonDetailView, CommonView
+
+    app = Flask(__name__)
+    app.config["FLASK_CRUD_API_DB_URL"] = "sqlite:///:memory:"
+    app.config["FLASK_CRUD_API_DB_SHARDS"] = [
+        f"sqlite:///{tmp_path / f'shard{idx}.db'}" for idx in range(3)
+    ]
+    CrudApi(app)
+    api.shards.create_tables()
+
+    class ShardBookView(CommonView):
+        model = ShardBook
+        view_order_fields = (("__order_price", "desc"), ("__order_pk", "asc"))
+        view_filter_fields = (("uid", "="), ("uid", "in"))
+
+    class ShardBookDetailView(CommonDetailView):
+        model = ShardBook
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    router = Router(bp)
+    router.add_url_rule("/book", view_cls=ShardBookView)
+    router.add_url_rule("/book/<pk>", view_cls=ShardBookDetailView)
+    app.register_blueprint(bp)
+
+    yield app
+    for shard_engine in api.shards.engines:
+        shard_engine.dispose()
+
+
+def _data(response):
+    assert response.status_code == 200
+    return json.loads(response.data)["data"]
+
+
+def _count_statements(engines):
+    counts = [0] * len(engines)
+
+    for idx, shard_engine in enumerate(engines):
+
+        def count(*args, idx=idx):
+            counts[idx] += 1
+
+        event.listen(shard_engine, "before_cursor_execute", count)
+    return counts
+
+
+def test_shard_crud(shard_app: Flask):
+    from flask_crud_api import api
+
+    client = shard_app.test_client()
+    for idx in range(12):
+        _data(
+            client.post(
+                "/api/book",
+                data={"uid": idx % 6, "name": f"book{idx}", "price": idx},
+            )
+        )
+
+    # 数据只写入分片键所在的分片，主键携带分片序号
+    for idx, shard_engine in enumerate(api.shards.engines):
+        with shard_engine.connect() as conn:
+            rows = conn.execute(text("select pk, uid from test_shard_books")).all()
+        assert len(rows) == 4
+        assert all(pk % 3 == idx and uid % 3 == idx for pk, uid in rows)
+
+    page = _data(client.get("/api/book?__order_price=desc&__page_size=5&__page=2"))
+    assert page["count"] == 12
+    assert [item["name"] for item in page["result"]] == [
+        f"book{idx}" for idx in (6, 5, 4, 3, 2)
+    ]
+
+    counts = _count_statements(api.shards.engines)
+    result = _data(client.get("/api/book?uid=4&__order_price=desc"))
+    assert [item["name"] for item in result["result"]] == ["book10", "book4"]
+    assert result["count"] == 2
+    assert counts == [0, 2, 0]
+
+    result = _data(client.get("/api/book?uid=0,3&__order_pk=asc"))
+    assert result["count"] == 4
+    assert counts == [2, 2, 0]
+
+    pk = result["result"][0]["pk"]
+    assert _data(client.get(f"/api/book/{pk}"))["result"][0]["name"] == "book0"
+    assert counts == [3, 2, 0]
+
+    updated = _data(client.put(f"/api/book/{pk}", data={"name": "changed"}))
+    assert updated["result"][0]["name"] == "changed"
+    assert client.put(f"/api/book/{pk}", data={"uid": 1}).status_code == 409
+
+    client.delete(f"/api/book/{pk}")
+    assert client.get(f"/api/book/{pk}").status_code == 404
+    # 非整数主键无法定位分片，查询所有分片后返回 404
+    assert client.get("/api/book/abc").status_code == 404
+    for where in (ShardBook.pk == "abc", ShardBook.pk.in_(["abc", 1])):
+        stmt = select(ShardBook).where(where)
+        assert api.shards.target_shards(ShardBook, stmt) == [0, 1, 2]
+    assert _data(client.get("/api/book"))["count"] == 11
+
+
+def test_shard_errors_and_stats(shard_app: Flask):
+    from sqlalchemy import func
+    from werkzeug.exceptions import HTTPException
+
+    from flask_crud_api import api
+    from flask_crud_api.instrument import RequestStats, SQLInstrument, _current_stats
+    from flask_crud_api.orm import Orm
+
+    shards = api.shards
+    with shard_app.test_request_context():
+        stmt = select(ShardBook.uid, func.count()).group_by(ShardBook.uid)
+        with pytest.raises(HTTPException) as e:
+            Orm().execute_all(stmt, scalers=False)
+        assert e.value.code == 400
+        with pytest.raises(HTTPException) as e:
+            Orm().execute_add(ShardBook(name="no uid"))
+        assert e.value.code == 400
+
+    # 序列行已存在时插入被忽略，主键继续递增
+    with shards.session_factories[0]() as session:
+        shards.ensure_sequence(session, "test_shard_books")
+        shards.ensure_sequence(session, "test_shard_books")
+        first = shards.next_pk(session, 0, ShardBook)
+        second = shards.next_pk(session, 0, ShardBook)
+        session.commit()
+    assert (first, second) == (3, 6)
+
+    # 各分片线程使用独立的统计对象，完成后合并
+    instrument = SQLInstrument()
+    for shard_engine in shards.engines:
+        instrument.init_engine(shard_engine)
+    stats = RequestStats("GET", "/", None)
+    token = _current_stats.set(stats)
+    try:
+        count = shards.count(ShardBook, select(func.count(ShardBook.pk)))
+    finally:
+        _current_stats.reset(token)
+    assert count == 0
+    assert stats.statements == 3
@@ -0,0 +1,47 @@
+import json
+import subprocess
+import sys
+
+from flask import Flask
+
+
+def test_lazy_optional_imports():
+    code = (
+        "import sys, flask_crud_api.view, flask_crud_api.api;"
+        "print(','.join(m for m in ('openpyxl', 'flask_migrate') if m in sys.modules))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env={"PYTHONPATH": ":".join(sys.path)},
+        check=True,
+    )
+    assert proc.stdout.strip() == ""
+
+
+def test_create_tables_fingerprint(tmp_path):
+    from sqlalchemy import create_engine
+    from flask_crud_api.models import create_tables_if_changed
+    import models  # noqa: F401
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'fingerprint.db'}")
+    assert create_tables_if_changed(engine) is True
+    assert create_tables_if_changed(engine) is False
+
+
+def test_lazy_migrate_command(app: Flask):
+    assert "migrate" not in app.extensions
+
+    result = app.test_cli_runner().invoke(args=["db", "--help"])
+    assert result.exit_code == 0
+    assert "upgrade" in result.output
+    assert "migrate" in app.extensions
+
+
+def test_startup_profile_command(app: Flask):
+    result = app.test_cli_runner().invoke(args=["crud-api", "profile"])
+    assert result.exit_code == 0
+    report = json.loads(result.output)
+    names = [phase["name"] for phase in report["phases"]]
+    assert "init_db_tools.create_tables" in names
@@ -0,0 +1,156 @@
+import pytest
+from flask import Flask
+from sqlalchemy import insert, update
+
+from models import Book
+
+
+@pytest.fixture
+def summary(app: Flask):
+    from flask_crud_api.api import engine
+    from flask_crud_api.models import Base
+    from flask_crud_api.summary import Summary, summaries
+
+    summary = Summary("book_by_user", Book, group_by=("uid",), sums=("price",))
+    summary.table.create(engine)
+    yield summary
+    summaries.pop(summary.name)
+    Base.metadata.remove(summary.table)
+
+
+def _get(app, summary, uid):
+    from flask_crud_api.orm import session_scope
+
+    with app.app_context(), session_scope() as session:
+        result = summary.get(session, uid=uid)
+    return result["count"], float(result["sum_price"])
+
+
+def test_summary_deltas(app: Flask, summary):
+    from flask_crud_api.orm import Orm
+    from test_view import _init_data
+
+    _init_data(app)
+    assert _get(app, summary, 1) == (4, pytest.approx(31.8))
+    assert _get(app, summary, 2) == (0, 0)
+
+    with app.app_context():
+        orm = Orm()
+        book = orm.execute_add(Book(uid=2, name="b", price=5))
+        orm.execute_add(Book(uid=None, name="no user", price=1))
+        assert _get(app, summary, 2) == (1, 5)
+
+        book = orm.execute_one_or_none(orm.get_queryset(Book).where(Book.pk == book.pk))
+        book.uid = 1
+        book.price = 6
+        orm.execute_add(book)
+        assert _get(app, summary, 1) == (5, pytest.approx(37.8))
+        assert _get(app, summary, 2) == (0, 0)
+
+        orm.execute_delete(book)
+        assert _get(app, summary, 1) == (4, pytest.approx(31.8))
+
+
+def test_summary_bulk_and_rebuild(app: Flask, summary):
+    from flask_crud_api.orm import session_scope
+    from test_view import _init_data
+
+    _init_data(app)
+    with app.app_context():
+        with session_scope() as session:
+            session.execute(
+                insert(Book), [{"uid": 3, "price": 1}, {"uid": 3, "price": 2}]
+            )
+        assert _get(app, summary, 3) == (2, 3)
+
+        # 绕过 ORM 的批量更新会造成偏差，重建后恢复
+        with session_scope() as session:
+            session.execute(update(Book.__table__).values(price=1))
+        assert _get(app, summary, 1) == (4, pytest.approx(31.8))
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["crud-api", "summaries", "--rebuild"])
+        assert "book_by_user" in result.output
+        assert _get(app, summary, 1) == (4, 4)
+        assert _get(app, summary, 3) == (2, 2)
+
+
+def test_summary_upsert(app: Flask):
+    import datetime
+
+    from flask_crud_api.api import engine
+    from flask_crud_api.events import Broker
+    from flask_crud_api.models import Base, State
+    from flask_crud_api.orm import Orm, session_scope
+    from flask_crud_api.summary import Summary, summaries
+    from models import Product
+
+    summary = Summary("product_by_name", Product, group_by=("name",), sums=("price",))
+    summary.table.create(engine)
+    crud_api = app.extensions["flask_crud_api"]
+    crud_api.broker = broker = Broker()
+    broker.init_session_factory(crud_api.session_factory)
+    subscription = broker.subscribe(Product)
+    try:
+        with app.app_context():
+            now = datetime.datetime.now()
+
+            def rows(*items):
+                return [
+                    dict(item, create_time=now, update_time=now, state=State.Valid)
+                    for item in items
+                ]
+
+            orm = Orm()
+            result = orm.execute_upsert(
+                Product,
+                ("sku",),
+                rows(
+                    {"sku": "a", "name": "x", "price": 1},
+                    {"sku": "b", "name": "x", "price": 2},
+                ),
+            )
+            assert result == (2, 0, 0)
+            result = orm.execute_upsert(
+                Product,
+                ("sku",),
+                rows(
+                    {"sku": "a", "name": "y", "price": 3},
+                    {"sku": "c", "name": "y", "price": 4},
+                ),
+            )
+            assert result == (1, 1, 0)
+
+            with session_scope() as session:
+                assert summary.get(session, name="x")["count"] == 1
+                assert summary.get(session, name="x")["sum_price"] == 2
+                assert summary.get(session, name="y")["count"] == 2
+                assert summary.get(session, name="y")["sum_price"] == 7
+
+            events = [subscription.get(timeout=0) for _ in range(4)]
+            assert [(e["event"], e["data"]["sku"]) for e in events] == [
+                ("create", "a"),
+                ("create", "b"),
+                ("update", "a"),
+                ("create", "c"),
+            ]
+    finally:
+        crud_api.broker = None
+        summaries.pop(summary.name)
+        Base.metadata.remove(summary.table)
+
+
+def test_summary_bulk_statements(app: Flask, summary):
+    from flask_crud_api.orm import session_scope
+
+    # ORM 批量 update 语句与 Core insert(table) 不经过 flush，不更新汇总表
+    with app.app_context():
+        with session_scope() as session:
+            session.execute(insert(Book.__table__), [{"uid": 4, "price": 1}])
+            session.execute(insert(Book), [{"uid": 5, "price": 1}])
+        assert _get(app, summary, 4) == (0, 0)
+        assert _get(app, summary, 5) == (1, 1)
+
+        with session_scope() as session:
+            session.execute(update(Book).where(Book.uid == 5).values(price=3))
+        assert _get(app, summary, 5) == (1, 1)
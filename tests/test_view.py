@@ -206,3 +206,58 @@ def test_common_view_detail_delete(book_by_commondetailview_api, client: FlaskCl
     assert response.status_code == 200
     data = json.loads(response.data)
     assert data["code"] == 200
+
+
+def test_upsert(app: Flask, client: FlaskClient):
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import CommonView, UpsertViewMixin
+    from models import Product
+
+    class ProductView(UpsertViewMixin, CommonView):
+        model = Product
+        view_upsert_keys = ("sku",)
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    Router(bp).add_url_rule("/product", view_cls=ProductView)
+    app.register_blueprint(bp)
+
+    def upsert(data, query=""):
+        response = client.post(f"/api/product/upsert{query}", json=data)
+        assert response.status_code == 200
+        return json.loads(response.data)["data"]
+
+    result = upsert(
+        [
+            {"sku": "a", "name": "A", "price": 1, "publish": "2024-01-01 00:00:00"},
+            {"sku": "b", "name": "B", "price": 2},
+        ]
+    )
+    assert (result["created"], result["updated"]) == (2, 0)
+
+    result = upsert([{"sku": "a", "price": 3}, {"sku": "c", "name": "C"}])
+    assert (result["created"], result["updated"]) == (1, 1)
+
+    products = json.loads(client.get("/api/product?__order_pk=asc").data)["data"]
+    assert products["count"] == 3
+    a, b, c = products["result"]
+    assert (a["name"], a["price"], a["publish"]) == ("A", 3, "2024-01-01 00:00:00")
+
+    with app.app_context():
+        from flask_crud_api.orm import Orm
+
+        orm = Orm()
+        stmt = orm.get_queryset(Product).where(Product.pk == b["pk"])
+        orm.execute_delete(orm.execute_one_or_none(stmt))
+
+    result = upsert([{"sku": "b", "price": 5}])
+    assert (result["created"], result["updated"], result["skipped"]) == (0, 0, 1)
+    result = upsert([{"sku": "b", "price": 5}, {"sku": "b", "price": 6}], "?__revive")
+    assert (result["count"], result["updated"]) == (1, 1)
+    products = json.loads(client.get("/api/product").data)["data"]
+    assert products["count"] == 3
+    assert [p["price"] for p in products["result"] if p["sku"] == "b"] == [6]
+
+    assert client.post("/api/product/upsert", json={"sku": "a"}).status_code == 400
+    assert client.post("/api/product/upsert", json=[{"name": "x"}]).status_code == 400
+    response = client.post("/api/product/upsert", json=[{"sku": "d", "pk": 100}])
+    assert response.status_code == 400
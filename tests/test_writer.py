@@ -0,0 +1,181 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+from flask import Blueprint, Flask
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from models import Book, User
+
+
+@pytest.fixture
+def writer_app(tmp_path):
+    from flask_crud_api.api import CrudApi
+    from flask_crud_api.router import Router
+    from flask_crud_api.view import CommonDetailView, CommonView
+
+    app = Flask(__name__)
+    app.config["FLASK_CRUD_API_DB_URL"] = f"sqlite:///{tmp_path / 'main.db'}"
+    app.config["FLASK_CRUD_API_DB_WRITE_QUEUE"] = True
+    app.config["FLASK_CRUD_API_DB_WRITE_QUEUE_WAIT"] = 0.05
+    crud_api = CrudApi(app)
+    crud_api.create_tables()
+
+    class BookView(CommonView):
+        model = Book
+
+    class BookDetailView(CommonDetailView):
+        model = Book
+
+    bp = Blueprint("v1", __name__, url_prefix="/api")
+    router = Router(bp)
+    router.add_url_rule("/book", view_cls=BookView)
+    router.add_url_rule("/book/<pk>", view_cls=BookDetailView)
+    app.register_blueprint(bp)
+
+    yield app
+    crud_api.writer.close()
+    crud_api.engine.dispose()
+
+
+def _visible(crud_api, table):
+    # 另一个连接只能看到已提交的数据
+    with sqlite3.connect(crud_api.engine.url.database) as conn:
+        return conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+
+def test_write_queue(writer_app: Flask):
+    crud_api = writer_app.extensions["flask_crud_api"]
+    visible = []
+
+    def before_insert(conn, cursor, statement, *args):
+        if statement.startswith("INSERT INTO test_books"):
+            visible.append(_visible(crud_api, "test_books"))
+
+    event.listen(crud_api.engine, "before_cursor_execute", before_insert)
+
+    responses = []
+
+    def create(idx):
+        response = writer_app.test_client().post(
+            "/api/book", data={"uid": 1, "name": f"book{idx}"}
+        )
+        responses.append(response)
+
+    threads = [threading.Thread(target=create, args=(idx,)) for idx in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(response.status_code == 200 for response in responses)
+    pks = {json.loads(r.data)["data"]["result"][0]["pk"] for r in responses}
+    assert len(pks) == 20
+    # 同一批的写入在一个事务中提交: 逐行提交时每次插入前看到的行数都不同
+    assert len(visible) == 20 and len(set(visible)) < 20
+
+    client = writer_app.test_client()
+    pk = pks.pop()
+    response = client.put(f"/api/book/{pk}", data={"name": "changed"})
+    assert json.loads(response.data)["data"]["result"][0]["name"] == "changed"
+    client.delete(f"/api/book/{pk}")
+    assert json.loads(client.get("/api/book").data)["data"]["count"] == 19
+
+
+def test_write_queue_errors(writer_app: Flask):
+    writer = writer_app.extensions["flask_crud_api"].writer
+    futures = [
+        writer.submit(User(username="ok1", password="x")),
+        writer.submit(User(username=None, password="x")),
+        writer.submit(User(username="ok2", password="x")),
+    ]
+    assert futures[0].result(5).pk is not None
+    with pytest.raises(IntegrityError):
+        futures[1].result(5)
+    assert futures[2].result(5).username == "ok2"
+
+
+def test_write_queue_transaction(writer_app: Flask):
+    crud_api = writer_app.extensions["flask_crud_api"]
+    writer = crud_api.writer
+    visible = []
+
+    def add(session, obj):
+        session.add(obj)
+        session.flush()
+        visible.append(_visible(crud_api, "test_users"))
+
+    def fail(session, obj):
+        # 提交失败时整批回滚，已执行的写入不会被提交
+        event.listen(session, "before_commit", broken_commit)
+
+    def broken_commit(session):
+        raise RuntimeError("commit failed")
+
+    futures = [
+        writer.submit(User(username=f"u{i}", password="x"), add) for i in range(4)
+    ]
+    futures.append(writer.submit(User(username="last", password="x"), fail))
+    for future in futures:
+        with pytest.raises(RuntimeError, match="commit failed"):
+            future.result(5)
+    assert visible == [0, 0, 0, 0]
+    assert _visible(crud_api, "test_users") == 0
+
+    futures = [
+        writer.submit(User(username=f"u{i}", password="x"), add) for i in range(4)
+    ]
+    assert [future.result(5).username for future in futures] == ["u0", "u1", "u2", "u3"]
+    assert visible[4:] == [0, 0, 0, 0]
+    assert _visible(crud_api, "test_users") == 4
+
+
+def test_write_queue_timeout(writer_app: Flask):
+    from concurrent.futures import TimeoutError
+
+    from flask_crud_api.orm import Orm
+
+    writer = writer_app.extensions["flask_crud_api"].writer
+    writer.max_batch = 1
+    writer.timeout = 0.1
+    release = threading.Event()
+
+    def blocked(session, obj):
+        release.wait(5)
+        session.add(obj)
+
+    first = writer.submit(User(username="first", password="x"), blocked)
+    # 超时前未开始执行的写入被取消，之后不会再提交
+    with pytest.raises(TimeoutError):
+        writer.add(User(username="late", password="x"))
+    release.set()
+    assert first.result(5).pk is not None
+
+    # 已在批次中执行的写入等待其提交结果
+    release.clear()
+    threading.Timer(0.3, release.set).start()
+    assert writer.add(User(username="slow", password="x"), blocked).pk is not None
+
+    writer.close()
+    with writer_app.app_context():
+        users = Orm().execute_all(Orm().get_queryset(User))
+        assert {user.username for user in users} == {"first", "slow"}
+
+
+def test_write_queue_commit_failure(writer_app: Flask):
+    writer = writer_app.extensions["flask_crud_api"].writer
+    session_factory = writer.session_factory
+
+    def broken(**kwargs):
+        raise RuntimeError("no session")
+
+    writer.session_factory = broken
+    future = writer.submit(User(username="lost", password="x"))
+    with pytest.raises(RuntimeError, match="no session"):
+        future.result(5)
+
+    # 写线程继续处理之后的写入
+    writer.session_factory = session_factory
+    assert writer.add(User(username="ok", password="x")).pk is not None